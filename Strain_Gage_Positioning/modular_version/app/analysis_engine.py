@@ -1,39 +1,82 @@
 # File: app/analysis_engine.py
 
+import os
+import threading
+from collections import OrderedDict
+
 import numpy as np
-from PyQt5.QtCore import QObject, pyqtSignal
-from sklearn.cluster import KMeans
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 
 # Import our computation and selection modules
 from . import computation
+from . import instrumentation
+from . import pipeline
 from . import selection_strategies
 
 
-def _load_and_combine_data(filepaths):
-    """
-    Loads data from multiple files and combines their strain tensors.
-    Assumes nodes and coordinates are identical across all files.
-    """
-    if not filepaths:
-        raise ValueError("No input files provided.")
+# ---- Result caches (module-level, shared by all engine instances) ----------------------
+# Loaded input data, keyed by the input files. Only the most recent data set is kept.
+_DATA_CACHE = OrderedDict()
+_DATA_CACHE_SIZE = 1
+# Aggregated quality results, keyed by the input files and every parameter that affects them.
+_QUALITY_CACHE = OrderedDict()
+_QUALITY_CACHE_SIZE = 4
+_CACHE_LOCK = threading.Lock()
+
+
+def clear_result_cache():
+    """Drops all cached input data and quality results."""
+    with _CACHE_LOCK:
+        _DATA_CACHE.clear()
+        _QUALITY_CACHE.clear()
+
+
+def _cache_get(cache, key):
+    with _CACHE_LOCK:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    return None
 
-    # Load the first file to get the base node and coordinate data
-    nodes, coords, _ = computation.load_data(filepaths[0])
 
-    combined_strain_tensors = {}
-    measurement_idx = 0
+def _cache_put(cache, key, value, max_size):
+    with _CACHE_LOCK:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
 
+
+def _files_key(filepaths):
+    """Identifies the input files by path, size and modification time, so edited files are reloaded."""
+    key = []
     for fpath in filepaths:
-        # Load data from each file
-        # We assume nodes and coords are the same, so we discard them after the first file
-        _, _, strain_tensors = computation.load_data(fpath)
+        stat = os.stat(fpath)
+        key.append((os.path.abspath(fpath), stat.st_size, stat.st_mtime_ns))
+    return tuple(key)
+
+
+def _quality_key(files_key, params):
+    """
+    Cache key for the aggregated quality DataFrame. Only parameters used before candidate
+    selection are included, so strategy-only changes hit the cache.
+    """
+    return (files_key,) + pipeline.quality_key(params)
+
+
+class AnalysisCancelled(Exception):
+    """Raised inside the engine when the user cancels a running analysis."""
 
-        # Append the strain tensors from the current file to the combined dictionary
-        for i in range(len(strain_tensors)):
-            combined_strain_tensors[measurement_idx] = strain_tensors[i]
-            measurement_idx += 1
 
-    return nodes, coords, combined_strain_tensors
+# Progress stages reported by AnalysisEngine.run: key -> (status text, percent at stage start)
+ANALYSIS_STAGES = {
+    "load": ("Loading strain data...", 0),
+    "normals": ("Computing normal strains...", 20),
+    "neighborhoods": ("Building neighborhoods...", 35),
+    "aggregation": ("Aggregating quality metrics...", 60),
+    "validation": ("Validating single precision against float64...", 75),
+    "selection": ("Selecting candidates...", 90),
+}
 
 
 class AnalysisEngine(QObject):
@@ -41,6 +84,11 @@ class AnalysisEngine(QObject):
     Performs the core analysis, completely decoupled from the UI. This class is
     the "Model" in the MVC pattern. It takes parameters, runs calculations, and
     emits signals with the results or errors.
+
+    The engine is meant to be moved to a worker QThread: run() is a slot that can be
+    connected to QThread.started, progress is reported through the progress signal,
+    and cancel() may be called from the GUI thread at any time. Cancellation is
+    cooperative and takes effect at the next stage or load-case boundary.
     """
     # Signal emitted on successful completion of a full analysis run.
     # Carries the final data needed for visualization and reporting.
@@ -54,13 +102,63 @@ class AnalysisEngine(QObject):
     # Carries a string with the error message.
     analysis_failed = pyqtSignal(str)
 
+    # Signal emitted when a run stops because cancel() was requested.
+    analysis_cancelled = pyqtSignal()
+
+    # Signal emitted at each stage of the run.
+    progress = pyqtSignal(str, int)  # status text, percent complete
+
+    # Signal emitted after a single precision run when float64 validation is enabled.
+    precision_report = pyqtSignal(str)  # deviation report
+
+    # Signal emitted when a stage ends: wall time, RSS and array sizes of that stage.
+    stage_profiled = pyqtSignal(object)  # stage record (dict), see instrumentation.PipelineTrace
+
+    # Signal emitted once per run, before finished, with the complete trace of all stages.
+    profile_ready = pyqtSignal(object)  # trace (dict)
+
+    # Signal emitted when run() returns, whatever the outcome. Used to stop the worker thread.
+    finished = pyqtSignal()
+
     def __init__(self, filepaths, params, display_in_strain, is_continued_kmeans=False, parent=None):
         super().__init__(parent)
         self.filepaths = filepaths if isinstance(filepaths, list) else [filepaths]
         self.params = params
         self.display_in_strain = display_in_strain
         self.is_continued_kmeans = is_continued_kmeans
-
+        self._cancel_event = threading.Event()
+        self._quiet_stages = False
+        self.trace = instrumentation.PipelineTrace(
+            files=[os.path.abspath(f) for f in self.filepaths],
+            strategy=params.get("strategy"), measurement_mode=params.get("measurement_mode"),
+            precision=params.get("precision"), params=dict(params))
+
+    def cancel(self):
+        """Requests cancellation of the running analysis. Safe to call from any thread."""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def _check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise AnalysisCancelled()
+
+    def _report_stage(self, stage, fraction=0.0):
+        """Checks for cancellation and emits the progress of a stage (fraction is 0..1 within the stage)."""
+        self._check_cancelled()
+        if self._quiet_stages:
+            return
+        finished_stage = self.trace.enter(stage)
+        if finished_stage is not None:
+            self.stage_profiled.emit(finished_stage)
+        keys = list(ANALYSIS_STAGES)
+        text, start = ANALYSIS_STAGES[stage]
+        idx = keys.index(stage)
+        stop = ANALYSIS_STAGES[keys[idx + 1]][1] if idx + 1 < len(keys) else 100
+        self.progress.emit(text, int(start + (stop - start) * min(max(fraction, 0.0), 1.0)))
+
+    @pyqtSlot()
     def run(self):
         """The main entry point to start the analysis workflow."""
         try:
@@ -70,23 +168,49 @@ class AnalysisEngine(QObject):
             except Exception:
                 pass
 
-            nodes, coords, strain_tensors = _load_and_combine_data(self.filepaths)
+            self._report_stage("load")
+            dtype = computation.PRECISIONS[self.params.get("precision", "Double (float64)")]
+            files_key = _files_key(self.filepaths)
+            data = self._load_data(files_key, dtype)
+            nodes, coords, strain_tensors = data
+            self.trace.record_arrays(coords=coords, strain_tensors=strain_tensors)
+            self.trace.meta.update(n_nodes=len(nodes), n_load_cases=len(strain_tensors))
 
             # Special handling for the two-step K-Means strategy
             if self.params["strategy"] == "Max Coverage (K-Means)" and not self.is_continued_kmeans:
                 # This is the first step: generate and show the clusters.
+                self._report_stage("selection")
                 candidate_count = self.params["candidate_count"]
                 if len(coords) < candidate_count:
                     candidate_count = len(coords)
 
-                kmeans = KMeans(n_clusters=candidate_count, random_state=42, n_init='auto').fit(coords)
-                self.kmeans_preview_ready.emit(coords, kmeans.labels_)
+                # The fit is cached, so the "Continue" step reuses these labels
+                labels, _ = selection_strategies.fit_kmeans(
+                    coords, candidate_count, self.params.get("kmeans_backend", "Full K-Means"))
+                self._check_cancelled()
+                self.trace.record_arrays(cluster_labels=labels)
+                self.trace.meta["outcome"] = "kmeans_preview"
+                self.progress.emit("K-Means preview ready.", 100)
+                self.kmeans_preview_ready.emit(coords, labels)
                 return  # Stop execution here until user clicks "Continue"
 
-            # Proceed with the full analysis for all other cases
-            agg_quality_df, current_scalars = self._compute_quality(nodes, coords, strain_tensors)
+            # Proceed with the full analysis for all other cases.
+            # Selection-only parameter changes reuse the cached quality results.
+            quality_key = _quality_key(files_key, self.params)
+            cached = _cache_get(_QUALITY_CACHE, quality_key)
+            self.trace.meta["quality_cache_hit"] = cached is not None
+            if cached is None:
+                cached = self._compute_quality(nodes, coords, strain_tensors)
+                _cache_put(_QUALITY_CACHE, quality_key, cached, _QUALITY_CACHE_SIZE)
+            agg_quality_df, current_scalars, kept_rows = cached
+
+            reference = None
+            if dtype != np.float64 and self.params.get("precision_validation", False):
+                reference = self._compute_reference(files_key, coords)
 
-            candidates_df = self._select_candidates(agg_quality_df, coords)
+            self._report_stage("selection")
+            candidates_df = self._select_candidates(agg_quality_df, coords, strain_tensors, kept_rows)
+            self.trace.record_arrays(candidates=candidates_df)
 
             # Report k-NN fallback usage (console; escalate if >5%)
             try:
@@ -95,125 +219,71 @@ class AnalysisEngine(QObject):
                     ratio = 100.0 * used / float(total)
                     msg = f"Local_Std k-NN fallback used for {used}/{total} nodes ({ratio:.1f}%)."
                     print(msg)
+                    self.trace.meta["knn_fallback"] = {"nodes": used, "total": total}
             except Exception:
                 pass
 
+            self._check_cancelled()
+            self.trace.meta["outcome"] = "complete"
+            self.progress.emit("Analysis complete.", 100)
             self.analysis_complete.emit(coords, current_scalars, candidates_df)
+            if reference is not None:
+                self.precision_report.emit(pipeline.precision_deviation(*reference, cached, candidates_df))
+
+        except AnalysisCancelled:
+            self.trace.meta["outcome"] = "cancelled"
+            self.analysis_cancelled.emit()
 
         except Exception as e:
             import traceback
             print(traceback.format_exc())  # For debugging
+            self.trace.meta["outcome"] = "failed"
             self.analysis_failed.emit(f"An unexpected error occurred: {e}")
 
+        finally:
+            finished_stage = self.trace.finish()
+            if finished_stage is not None:
+                self.stage_profiled.emit(finished_stage)
+            self.profile_ready.emit(self.trace.to_dict())
+            self.finished.emit()
+
+    def _load_data(self, files_key, dtype):
+        """Loads (or reuses) the combined input data in the requested precision."""
+        data_key = (files_key, np.dtype(dtype).name)
+        data = _cache_get(_DATA_CACHE, data_key)
+        self.trace.annotate(cache_hit=data is not None)
+        if data is None:
+            data = pipeline.load_and_combine_data(self.filepaths, dtype)
+            _cache_put(_DATA_CACHE, data_key, data, _DATA_CACHE_SIZE)
+        return data
+
+    def _compute_reference(self, files_key, coords):
+        """
+        Repeats the quality computation and selection in float64 for the same inputs and
+        parameters. The float64 data is loaded without replacing the cached single precision data.
+
+        Returns:
+            tuple: (reference quality result, reference candidates_df).
+        """
+        self._report_stage("validation")
+        data = _cache_get(_DATA_CACHE, (files_key, np.dtype(np.float64).name))
+        if data is None:
+            data = pipeline.load_and_combine_data(self.filepaths, np.float64)
+        nodes, _, strain_tensors = data
+
+        # The inner stages would move the progress bar backwards; only check for cancellation
+        self._quiet_stages = True
+        try:
+            reference = self._compute_quality(nodes, coords, strain_tensors)
+            reference_candidates = self._select_candidates(reference[0], coords, strain_tensors, reference[2])
+        finally:
+            self._quiet_stages = False
+        return reference, reference_candidates
+
     def _compute_quality(self, nodes, coords, strain_tensors):
-        """Private helper to run the core strain and quality computations."""
-        quality_dfs = []
-        threshold_metric = None
-
-        if self.params["measurement_mode"] == "Rosette":
-            angles = [0]
-            strains_list = []
-            for tensor in strain_tensors.values():
-                # All internal calculations use microstrain
-                strain_data = tensor
-                # von Mises equivalent strain calculation
-                vm_strains = np.sqrt(
-                    strain_data[:, 0] ** 2 - strain_data[:, 0] * strain_data[:, 1] + strain_data[:, 1] ** 2 + 3 * (
-                                strain_data[:, 2] ** 2)
-                )
-                strains_list.append(vm_strains)
-                df = computation.compute_quality_metrics(
-                    nodes, coords, vm_strains.reshape(-1, 1), angles,
-                    self.params["quality_mode"], self.params["uniformity_radius"]
-                )
-                quality_dfs.append(df)
-
-            strains_stack = np.column_stack(strains_list)
-            agg_method = self.params["agg_method"]
-            current_scalars = np.max(strains_stack, axis=1) if agg_method == "Max" else np.mean(strains_stack, axis=1)
-            
-            # Threshold metric across load cases
-            thresh_agg = self.params.get("strain_threshold_agg", "Max")
-            if thresh_agg == "Average":
-                threshold_metric = np.mean(strains_stack, axis=1)
-            else:
-                threshold_metric = np.max(strains_stack, axis=1)
-
-        else:  # Uniaxial
-            interval = 15
-            angles = [0] + list(range(interval, 180, interval))
-            strains_list = []
-            for tensor in strain_tensors.values():
-                strain_data = tensor
-                strains_i = computation.compute_normal_strains(strain_data, angles)
-                strains_list.append(strains_i)
-                df = computation.compute_quality_metrics(
-                    nodes, coords, strains_i, angles,
-                    self.params["quality_mode"], self.params["uniformity_radius"]
-                )
-                quality_dfs.append(df)
-
-            strains_stack = np.stack([np.max(np.abs(s), axis=1) for s in strains_list], axis=1)
-            agg_method = self.params["agg_method"]
-            current_scalars = np.max(strains_stack, axis=1) if agg_method == "Max" else np.mean(strains_stack, axis=1)
-            
-            # Threshold metric across load cases
-            thresh_agg = self.params.get("strain_threshold_agg", "Max")
-            if thresh_agg == "Average":
-                threshold_metric = np.mean(strains_stack, axis=1)
-            else:
-                threshold_metric = np.max(strains_stack, axis=1)
-
-        agg_quality_df = computation.aggregate_quality_metrics(quality_dfs, self.params["agg_method"])
-
-        # Apply microstrain threshold filtering if enabled
-        if self.params.get("strain_threshold_enabled", False) and threshold_metric is not None:
-            # threshold_metric is in the same unit as input tensors after conversion depending on display mode
-            # Convert user-provided microstrain threshold into the working unit
-            user_thresh_micro = float(self.params.get("strain_threshold_value_microstrain", 0.0))
-            threshold_value = user_thresh_micro  # compare in microstrain
-
-            # Filter DataFrame rows where the metric is below threshold
-            mask = threshold_metric >= threshold_value
-            if not np.all(mask):
-                agg_quality_df = agg_quality_df.loc[mask].reset_index(drop=True)
-
-        return agg_quality_df, current_scalars
-
-    def _select_candidates(self, agg_quality_df, coords):
+        """Runs the strain and quality computations, reporting progress and checking for cancellation."""
+        return pipeline.compute_quality(nodes, coords, strain_tensors, self.params, self._report_stage, self.trace)
+
+    def _select_candidates(self, agg_quality_df, coords, strain_tensors=None, kept_rows=None):
         """Private helper to dispatch to the correct selection strategy."""
-        strategy = self.params["strategy"]
-        candidate_count = self.params["candidate_count"]
-
-        # A dispatch dictionary maps the strategy string to the correct function call
-        strategy_functions = {
-            "Max Quality (Greedy Search)":
-                lambda: selection_strategies.select_candidates_quality_greedy(
-                    agg_quality_df, self.params["min_distance"], candidate_count
-                ),
-            "Max Coverage (K-Means)":
-                lambda: selection_strategies.select_candidates_kmeans(
-                    agg_quality_df, agg_quality_df[["X", "Y", "Z"]].values, candidate_count
-                ),
-            "Greedy Gradient Search":
-                lambda: selection_strategies.select_candidates_gradient_greedy(
-                    agg_quality_df,
-                    self.params["min_distance"],
-                    candidate_count,
-                    True if self.params.get("gradient_mode", "Max Local Std").startswith("Max") else False
-                ),
-            "Quality-Filtered K-Means":
-                lambda: selection_strategies.select_candidates_filtered_kmeans(
-                    agg_quality_df, candidate_count, self.params["quality_percentile"]
-                ),
-            "Region of Interest (ROI) Search":
-                lambda: selection_strategies.select_candidates_roi(
-                    agg_quality_df, self.params["roi_center"], self.params["roi_radius"],
-                    self.params["min_distance"], candidate_count
-                )
-        }
-
-        if strategy in strategy_functions:
-            return strategy_functions[strategy]()
-        else:
-            raise ValueError(f"Unknown selection strategy: {strategy}")
\ No newline at end of file
+        return pipeline.select_candidates(agg_quality_df, coords, self.params, strain_tensors, kept_rows)
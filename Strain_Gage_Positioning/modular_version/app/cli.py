@@ -0,0 +1,332 @@
+# File: app/cli.py
+"""
+Headless (Qt-free) batch runner for the strain gage positioning pipeline.
+
+Sweeps a parameter grid over one or more models and writes a combined results store:
+runs.csv (one row per model and parameter combination) and candidates.csv (all selected
+candidates, keyed by run_id). With --trace, traces.json holds the per-stage wall time,
+memory and array sizes of every group.
+
+Usage (from Strain_Gage_Positioning/modular_version):
+    python -m app.cli --model bracket_lc1.txt bracket_lc2.txt --model housing.txt \\
+        --grid uniformity_radius 5 10 20 \\
+        --grid strategy "Max Quality (Greedy Search)" "Greedy Gradient Search" \\
+        --set candidate_count 12 --output-dir sweep_results --workers 4
+
+    python -m app.cli --config sweep.json
+
+A config file has the same content as the options:
+    {
+      "models": {"bracket": ["bracket_lc1.txt", "bracket_lc2.txt"], "housing": ["housing.txt"]},
+      "parameters": {"candidate_count": 12, "measurement_mode": "Uniaxial"},
+      "grid": {"uniformity_radius": [5, 10, 20], "quality_mode": ["Default: |ε|/(1+σ)"]}
+    }
+
+Parameter names and values are the same as in the GUI (see pipeline.DEFAULT_PARAMETERS).
+Values are read as JSON where possible (numbers, true/false, [x, y, z]), otherwise as text.
+
+Every model is loaded once per precision in the main process and handed to the workers as
+read-only memory-mapped arrays, so all workers share one copy of the strain tensors. Sweep
+points that only differ in selection parameters share one quality computation.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from . import computation
+from . import instrumentation
+from . import pipeline
+
+# Arrays attached by a worker process, keyed by their directory (one entry per model/precision).
+_SHARED_ARRAYS = {}
+
+
+def _parse_value(text):
+    """Reads a parameter value as JSON (numbers, booleans, lists) or, failing that, as text."""
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return text
+
+
+def _model_name(filepaths, taken):
+    """Derives a unique model name from the first file name."""
+    base = os.path.splitext(os.path.basename(filepaths[0]))[0]
+    name, index = base, 2
+    while name in taken:
+        name = f"{base}_{index}"
+        index += 1
+    return name
+
+
+def expand_grid(fixed, grid):
+    """
+    Expands the parameter grid into the full list of parameter dictionaries.
+
+    Args:
+        fixed (dict): Parameters applied to every sweep point.
+        grid (dict): Parameter name -> list of values; every combination is run.
+
+    Returns:
+        list: (swept_values, params) tuples, swept_values holding only the grid parameters.
+    """
+    for key in list(fixed) + list(grid):
+        if key not in pipeline.DEFAULT_PARAMETERS:
+            raise ValueError(f"Unknown parameter '{key}'. Known parameters: {', '.join(pipeline.DEFAULT_PARAMETERS)}")
+
+    keys = list(grid)
+    points = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        swept = dict(zip(keys, values))
+        params = dict(pipeline.DEFAULT_PARAMETERS)
+        params.update(fixed)
+        params.update(swept)
+        params["roi_center"] = np.asarray(params["roi_center"], dtype=float)
+        points.append((swept, params))
+    return points
+
+
+def _share_model(filepaths, dtype, directory):
+    """Loads a model and stores it as .npy files that workers memory-map read-only."""
+    nodes, coords, strain_tensors = pipeline.load_and_combine_data(filepaths, dtype)
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "nodes.npy"), nodes)
+    np.save(os.path.join(directory, "coords.npy"), coords)
+    tensors = list(strain_tensors.values())
+    strains = np.lib.format.open_memmap(
+        os.path.join(directory, "strains.npy"), mode="w+", dtype=tensors[0].dtype,
+        shape=(len(tensors),) + tensors[0].shape)
+    for i, tensor in enumerate(tensors):
+        strains[i] = tensor
+    strains.flush()
+    del strains
+    return len(nodes), len(tensors)
+
+
+def _attach_model(directory):
+    """Returns (nodes, coords, strain_tensors) backed by the shared files of a model."""
+    if directory not in _SHARED_ARRAYS:
+        nodes = np.load(os.path.join(directory, "nodes.npy"))
+        coords = np.load(os.path.join(directory, "coords.npy"))
+        strains = np.load(os.path.join(directory, "strains.npy"), mmap_mode="r")
+        _SHARED_ARRAYS[directory] = (nodes, coords, {i: strains[i] for i in range(len(strains))})
+    return _SHARED_ARRAYS[directory]
+
+
+def run_group(directory, runs, model="", trace=False):
+    """
+    Runs sweep points of one model that share the same quality parameters: the quality
+    result is computed once and every point runs its own candidate selection.
+
+    Args:
+        directory (str): Shared arrays of the model (see _share_model).
+        runs (list): (run_id, params) tuples.
+        model (str): Model name, recorded in the trace.
+        trace (bool): Record a per-stage timing/memory trace of the group.
+
+    Returns:
+        tuple: (results, trace_dict) where results holds one dict per run with status,
+        timings and the candidates DataFrame, and trace_dict is None unless trace is True.
+    """
+    nodes, coords, strain_tensors = _attach_model(directory)
+    results = []
+    group_trace = instrumentation.PipelineTrace(
+        model=model, run_ids=[run_id for run_id, _ in runs], n_nodes=len(nodes),
+        n_load_cases=len(strain_tensors)) if trace else instrumentation.NULL_TRACE
+
+    def report_stage(stage, fraction=0.0):
+        group_trace.enter(stage)
+
+    computation.reset_knn_counters()
+    start = time.perf_counter()
+    try:
+        agg_quality_df, _, kept_rows = pipeline.compute_quality(
+            nodes, coords, strain_tensors, runs[0][1], report_stage, group_trace)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        return [{"run_id": run_id, "status": "failed", "error": error, "candidates": None} for run_id, _ in runs], None
+    quality_seconds = time.perf_counter() - start
+    knn_fallback, _ = computation.get_knn_counters()
+
+    for run_id, params in runs:
+        group_trace.enter(f"selection (run {run_id})")
+        start = time.perf_counter()
+        result = {"run_id": run_id, "quality_seconds": quality_seconds, "knn_fallback_nodes": knn_fallback,
+                  "nodes_after_threshold": len(agg_quality_df)}
+        try:
+            candidates_df = pipeline.select_candidates(agg_quality_df, coords, params, strain_tensors, kept_rows)
+            result.update(status="ok", error="", candidates=candidates_df, n_candidates=len(candidates_df))
+        except Exception as e:
+            result.update(status="failed", error=f"{type(e).__name__}: {e}", candidates=None, n_candidates=0)
+            traceback.print_exc()
+        result["selection_seconds"] = time.perf_counter() - start
+        group_trace.record_arrays(candidates=result["candidates"] if result["candidates"] is not None else [])
+        results.append(result)
+
+    group_trace.finish()
+    return results, (group_trace.to_dict() if trace else None)
+
+
+def _format_param(value):
+    if isinstance(value, np.ndarray):
+        return " ".join(f"{v:g}" for v in value)
+    return value
+
+
+def run_sweep(models, fixed, grid, output_dir, workers=1, trace=False):
+    """
+    Runs every model with every grid point and writes runs.csv and candidates.csv.
+
+    Args:
+        models (dict): Model name -> list of input files (load cases).
+        fixed (dict): Parameters applied to every run.
+        grid (dict): Parameter name -> list of values.
+        output_dir (str): Directory of the results store.
+        workers (int): Worker processes; 1 runs everything in this process.
+        trace (bool): Also write traces.json with the per-stage timing/memory of every group.
+
+    Returns:
+        pd.DataFrame: The runs table.
+    """
+    points = expand_grid(fixed, grid)
+    os.makedirs(output_dir, exist_ok=True)
+
+    run_rows = {}
+    groups = []
+    run_id = 0
+    with tempfile.TemporaryDirectory(prefix="sg_positioning_") as shared_root:
+        # --- Load every model once per precision and group the runs ---
+        for model_index, (model, filepaths) in enumerate(models.items()):
+            grouped = {}
+            for swept, params in points:
+                run_id += 1
+                run_rows[run_id] = {"run_id": run_id, "model": model, "files": ";".join(filepaths),
+                                    **{key: _format_param(params[key]) for key in pipeline.DEFAULT_PARAMETERS}}
+                grouped.setdefault(pipeline.quality_key(params), []).append((run_id, params))
+
+            shared = {}
+            for key, runs in grouped.items():
+                precision = runs[0][1]["precision"]
+                if precision not in shared:
+                    directory = os.path.join(shared_root, f"model_{model_index}_{len(shared)}")
+                    print(f"Loading {model} ({precision})...", flush=True)
+                    n_nodes, n_cases = _share_model(filepaths, computation.PRECISIONS[precision], directory)
+                    print(f"  {n_nodes} nodes, {n_cases} load cases", flush=True)
+                    shared[precision] = directory
+                groups.append((shared[precision], runs, model))
+
+        print(f"Running {run_id} sweep points in {len(groups)} groups on {workers} worker(s)...", flush=True)
+
+        # --- Execute ---
+        results = []
+        traces = []
+        if workers <= 1:
+            for i, (directory, runs, model) in enumerate(groups, start=1):
+                group_results, group_trace = run_group(directory, runs, model, trace)
+                results.extend(group_results)
+                traces.append(group_trace)
+                print(f"  [{i}/{len(groups)}] done", flush=True)
+            _SHARED_ARRAYS.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(run_group, directory, runs, model, trace) for directory, runs, model in groups]
+                for i, future in enumerate(as_completed(futures), start=1):
+                    group_results, group_trace = future.result()
+                    results.extend(group_results)
+                    traces.append(group_trace)
+                    print(f"  [{i}/{len(groups)}] done", flush=True)
+
+    # --- Combined results store ---
+    candidate_frames = []
+    for result in results:
+        candidates_df = result.pop("candidates")
+        run_rows[result["run_id"]].update(result)
+        if candidates_df is not None and not candidates_df.empty:
+            frame = candidates_df.copy()
+            frame.insert(0, "Rank", np.arange(1, len(frame) + 1))
+            frame.insert(0, "model", run_rows[result["run_id"]]["model"])
+            frame.insert(0, "run_id", result["run_id"])
+            candidate_frames.append(frame)
+
+    runs_df = pd.DataFrame([run_rows[i] for i in sorted(run_rows)])
+    runs_df.to_csv(os.path.join(output_dir, "runs.csv"), index=False)
+    candidates_all = pd.DataFrame()
+    if candidate_frames:
+        candidates_all = pd.concat(candidate_frames, ignore_index=True).sort_values(["run_id", "Rank"])
+    candidates_all.to_csv(os.path.join(output_dir, "candidates.csv"), index=False)
+
+    if trace:
+        traces = sorted((t for t in traces if t is not None), key=lambda t: t["meta"]["run_ids"][0])
+        with open(os.path.join(output_dir, "traces.json"), "w", encoding="utf-8") as f:
+            json.dump(traces, f, indent=2, ensure_ascii=False, default=str)
+    return runs_df
+
+
+def _load_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    models = config.get("models", {})
+    if isinstance(models, list):
+        named = {}
+        for filepaths in models:
+            filepaths = [filepaths] if isinstance(filepaths, str) else list(filepaths)
+            named[_model_name(filepaths, named)] = filepaths
+        models = named
+    return models, config.get("parameters", {}), config.get("grid", {})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Headless strain gage positioning: sweep parameters over models and collect the candidates.")
+    parser.add_argument("--config", help="JSON file with models, parameters and grid.")
+    parser.add_argument("--model", nargs="+", action="append", default=[], metavar="FILE",
+                        help="Input files of one model (one file per load case set). Repeat for more models.")
+    parser.add_argument("--set", nargs=2, action="append", default=[], metavar=("NAME", "VALUE"),
+                        help="Fixed parameter for all runs.")
+    parser.add_argument("--grid", nargs="+", action="append", default=[], metavar="NAME VALUE",
+                        help="Parameter name followed by the values to sweep.")
+    parser.add_argument("--output-dir", default="positioning_sweep", help="Results directory (default: positioning_sweep).")
+    parser.add_argument("--trace", action="store_true",
+                        help="Write traces.json with wall time, RSS and array sizes of every stage.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count; 1 runs in-process).")
+    args = parser.parse_args(argv)
+
+    models, fixed, grid = _load_config(args.config) if args.config else ({}, {}, {})
+    for filepaths in args.model:
+        models[_model_name(filepaths, models)] = filepaths
+    fixed.update({name: _parse_value(value) for name, value in args.set})
+    for entry in args.grid:
+        if len(entry) < 2:
+            parser.error(f"--grid {entry[0]} needs at least one value.")
+        grid[entry[0]] = [_parse_value(value) for value in entry[1:]]
+
+    if not models:
+        parser.error("No models given (use --model or a config file).")
+    for filepaths in models.values():
+        for fpath in filepaths:
+            if not os.path.isfile(fpath):
+                parser.error(f"Input file not found: {fpath}")
+
+    try:
+        runs_df = run_sweep(models, fixed, grid, args.output_dir, max(1, args.workers), args.trace)
+    except ValueError as e:
+        parser.error(str(e))
+
+    failed = int((runs_df["status"] != "ok").sum())
+    print(f"\n{len(runs_df)} runs, {failed} failed. Results written to {os.path.abspath(args.output_dir)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
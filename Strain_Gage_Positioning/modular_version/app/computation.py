@@ -4,11 +4,41 @@ import numpy as np
 import pandas as pd
 from scipy.spatial import cKDTree
 
+from . import geodesic
+
 # ---- Local Std fallback tracking (module-level) ---------------------------------------
 _KNN_FALLBACK_COUNT = 0
 _TOTAL_LOCAL_STD_POINTS = 0
 _MIN_NEIGHBORS = 4  # minimum neighbors desired for a stable local std estimate
 
+# ---- Uniaxial gauge angle search --------------------------------------------------------
+# Closed-form methods solve for the principal direction directly; the stepped variants snap
+# it to the angular resolution a gauge can realistically be mounted at.
+ANGLE_METHODS = {
+    "Closed-Form (Exact)": None,
+    "Closed-Form (1° Steps)": 1.0,
+    "Closed-Form (5° Steps)": 5.0,
+    "15° Grid (Legacy)": "grid",
+}
+LEGACY_ANGLE_INTERVAL = 15
+
+# ---- Floating point precision of the strain pipeline -----------------------------------
+# Single precision halves the memory and bandwidth of the strain arrays; coordinates stay
+# in double precision so neighbourhood searches are unaffected.
+PRECISIONS = {
+    "Double (float64)": np.float64,
+    "Single (float32)": np.float32,
+}
+
+
+# ---- Distance measure of neighbourhoods and exclusion zones ------------------------------
+# Geodesic distances follow the part surface (see geodesic.py), so the neighbourhoods of
+# thin-walled or folded parts do not reach through the wall to the opposite face.
+NEIGHBORHOOD_METRICS = {
+    "Euclidean (Straight Line)": "euclidean",
+    "Geodesic (Along Surface)": "geodesic",
+}
+
 
 def reset_knn_counters():
     global _KNN_FALLBACK_COUNT, _TOTAL_LOCAL_STD_POINTS
@@ -20,9 +50,11 @@ def get_knn_counters():
     return _KNN_FALLBACK_COUNT, _TOTAL_LOCAL_STD_POINTS
 
 
-def load_data(input_filename):
+def load_data(input_filename, dtype=np.float64):
     """Reads the input file and returns nodes, coords (in mm), and strain tensors.
 
+    The strain tensors are returned in the requested floating point dtype (see PRECISIONS).
+
     Unit handling:
     - Detects coordinate units from the header's location fields:
       "X Location (m)"/"Y Location (m)"/"Z Location (m)" => coordinates in meters → converted to mm
@@ -50,7 +82,7 @@ def load_data(input_filename):
 
     nodes = df.iloc[:, 0].astype(int).values
     coords = df.iloc[:, 1:4].values * coord_scale_to_mm
-    conversion_factor = 1e6  # Convert from strain to microstrain
+    conversion_factor = dtype(1e6)  # Convert from strain to microstrain
 
     # Determine the number of measurements based on columns available
     num_measurements = (df.shape[1] - 4) // 4
@@ -65,11 +97,11 @@ def load_data(input_filename):
             print(f"Warning: Incomplete strain tensor columns for measurement set {i + 1}. Skipping.")
             continue
 
-        exx = df.iloc[:, base_col_idx].values * conversion_factor
-        eyy = df.iloc[:, base_col_idx + 1].values * conversion_factor
+        exx = df.iloc[:, base_col_idx].to_numpy(dtype) * conversion_factor
+        eyy = df.iloc[:, base_col_idx + 1].to_numpy(dtype) * conversion_factor
         # The input convention is [Exx, Eyy, Ezz, Exy, (optional Eyz, Exz)] per measurement block
         # We only need Exx, Eyy, and engineering shear Exy for normal strain transform.
-        exy = df.iloc[:, base_col_idx + 3].values * conversion_factor  # 4th component of tensor is Exy
+        exy = df.iloc[:, base_col_idx + 3].to_numpy(dtype) * conversion_factor  # 4th component of tensor is Exy
         strain_tensors[i] = np.column_stack((exx, eyy, exy))
 
     return nodes, coords, strain_tensors
@@ -84,9 +116,10 @@ def compute_normal_strains(strain_data, angles):
         angles (list or np.ndarray): Angles in degrees to compute strain for.
 
     Returns:
-        np.ndarray: Array of shape (n_nodes, n_angles) with normal strains.
+        np.ndarray: Array of shape (n_nodes, n_angles) with normal strains, in the dtype of strain_data.
     """
-    angles_rad = np.radians(angles)
+    # Keep the angle factors in the strain dtype so float32 input is not upcast by broadcasting
+    angles_rad = np.radians(np.asarray(angles, dtype=strain_data.dtype))
     cos_t = np.cos(angles_rad)
     sin_t = np.sin(angles_rad)
 
@@ -104,7 +137,154 @@ def compute_normal_strains(strain_data, angles):
     return normal_strains
 
 
-def compute_quality_metrics(nodes, coords, strains, angles, quality_mode, uniformity_radius):
+def compute_principal_direction(strain_data, resolution=None):
+    """
+    Finds, per node, the gauge direction with the largest absolute normal strain.
+
+    Writing ε(θ) = c + R·cos(2(θ - θp)) with c = (εxx + εyy)/2 and R = √(((εxx - εyy)/2)² + (γxy/2)²),
+    the extremes are the principal strains c ± R at θp = ½·atan2(γxy, εxx - εyy) and θp + 90°.
+    The one with the larger magnitude is returned, so no angle grid is needed.
+
+    Args:
+        strain_data (np.ndarray): Array of shape (n_nodes, 3) with columns [exx, eyy, exy].
+        resolution (float, optional): Mounting resolution in degrees. If given, the direction is
+            snapped to the nearest multiple and the strain is evaluated at the snapped angle.
+
+    Returns:
+        tuple: (best_strains, best_angles) arrays of shape (n_nodes,), angles in [0, 180).
+    """
+    exx = strain_data[:, 0]
+    eyy = strain_data[:, 1]
+    exy = strain_data[:, 2]
+
+    center = 0.5 * (exx + eyy)
+    radius = np.hypot(0.5 * (exx - eyy), 0.5 * exy)
+    theta_p = 0.5 * np.degrees(np.arctan2(exy, exx - eyy))
+
+    # c + R is the larger magnitude exactly when c >= 0; otherwise use the perpendicular direction
+    use_max = center >= 0
+    best_angles = np.where(use_max, theta_p, theta_p + 90.0) % 180.0
+    best_strains = np.where(use_max, center + radius, center - radius)
+
+    if resolution:
+        # Since |c - R| <= c + R (and symmetrically for c < 0), the mounting angle closest to the
+        # chosen principal direction is also the best one on that grid.
+        best_angles = (np.round(best_angles / resolution) * resolution) % 180.0
+        angles_rad = np.radians(best_angles)
+        cos_t = np.cos(angles_rad)
+        sin_t = np.sin(angles_rad)
+        best_strains = exx * cos_t ** 2 + eyy * sin_t ** 2 + exy * sin_t * cos_t
+
+    return best_strains, best_angles
+
+
+def compute_gauge_sensitivities(strain_tensors, angles, rows=None):
+    """
+    Builds the gauge sensitivity tensor used by observability-based selection.
+
+    Entry [i, a, j] is the normal strain a gauge at node i oriented at angles[a] would read
+    under load case j, i.e. one row of the gauge-to-load-case sensitivity matrix.
+
+    Args:
+        strain_tensors (dict): Load case index -> (n_nodes, 3) array [exx, eyy, exy].
+        angles (list or np.ndarray): Candidate gauge angles in degrees.
+        rows (np.ndarray, optional): Node rows to keep (e.g. after threshold filtering).
+
+    Returns:
+        np.ndarray: Array of shape (n_nodes, n_angles, n_load_cases).
+    """
+    tensors = list(strain_tensors.values())
+    n_nodes = len(tensors[0]) if rows is None else len(rows)
+    sensitivities = np.empty((n_nodes, len(angles), len(tensors)))
+    for j, tensor in enumerate(tensors):
+        strain_data = tensor if rows is None else tensor[rows]
+        sensitivities[:, :, j] = compute_normal_strains(strain_data, angles)
+    return sensitivities
+
+
+def compute_gauge_sensitivity_basis(strain_tensors, rows=None):
+    """
+    Builds the orientation basis of the gauge sensitivities.
+
+    A gauge at angle θ reads ε(θ) = c + a·cos 2θ + b·sin 2θ with c = (εxx + εyy)/2,
+    a = (εxx - εyy)/2 and b = γxy/2, so entry [i, :, j] = (c, a, b) of node i under load
+    case j gives the gauge row of any orientation as (1, cos 2θ, sin 2θ) @ basis[i].
+
+    Args:
+        strain_tensors (dict): Load case index -> (n_nodes, 3) array [exx, eyy, exy].
+        rows (np.ndarray, optional): Node rows to keep (e.g. after threshold filtering).
+
+    Returns:
+        np.ndarray: Array of shape (n_nodes, 3, n_load_cases).
+    """
+    tensors = list(strain_tensors.values())
+    n_nodes = len(tensors[0]) if rows is None else len(rows)
+    basis = np.empty((n_nodes, 3, len(tensors)))
+    for j, tensor in enumerate(tensors):
+        strain_data = tensor if rows is None else tensor[rows]
+        exx, eyy, exy = strain_data[:, 0], strain_data[:, 1], strain_data[:, 2]
+        basis[:, 0, j] = 0.5 * (exx + eyy)
+        basis[:, 1, j] = 0.5 * (exx - eyy)
+        basis[:, 2, j] = 0.5 * exy
+    return basis
+
+
+def compute_neighborhoods(coords, uniformity_radius, metric="Euclidean (Straight Line)"):
+    """
+    Finds the neighbourhood used for the local standard deviation of every node.
+
+    The neighbourhood is the set of nodes within uniformity_radius. Nodes with fewer than
+    _MIN_NEIGHBORS neighbours fall back to their k nearest neighbours (tracked by the
+    k-NN fallback counters). The result only depends on the geometry, so it can be
+    computed once and shared by all load cases.
+
+    Args:
+        coords (np.ndarray): N-D array of node coordinates.
+        uniformity_radius (float): The search radius for calculating local standard deviation.
+        metric (str): One of NEIGHBORHOOD_METRICS. With the geodesic metric, distances are
+            measured along the surface and the k-NN fallback uses the surface graph links.
+
+    Returns:
+        list: One array/list of neighbour indices per node.
+    """
+    if NEIGHBORHOOD_METRICS[metric] == "geodesic":
+        graph = geodesic.get_surface_graph(coords)
+        tree = graph.tree
+        neighbors_list = geodesic.geodesic_neighborhoods(coords, uniformity_radius)
+    else:
+        graph = None
+        # Use cKDTree for efficient spatial queries
+        tree = cKDTree(coords)
+
+        # Query all points at once for better performance
+        neighbors_list = tree.query_ball_point(coords, uniformity_radius)
+
+    global _KNN_FALLBACK_COUNT, _TOTAL_LOCAL_STD_POINTS
+    k = min(_MIN_NEIGHBORS, len(coords))
+    for i, indices in enumerate(neighbors_list):
+        # Track total attempts
+        _TOTAL_LOCAL_STD_POINTS += 1
+
+        # Standard deviation requires at least 2 points; prefer >= _MIN_NEIGHBORS
+        if len(indices) < _MIN_NEIGHBORS and k >= 2:
+            # Closest surface neighbours first; nodes without links use the k-NN fallback
+            if graph is not None:
+                ring = graph.nearest(i, k)
+                if len(ring) > len(indices):
+                    neighbors_list[i] = ring
+                    _KNN_FALLBACK_COUNT += 1
+                    continue
+            # k-NN fallback to stabilize estimate in sparse/edge regions
+            _, knn_idx = tree.query(coords[i], k=k)
+            # Ensure array of indices
+            neighbors_list[i] = np.atleast_1d(knn_idx)
+            _KNN_FALLBACK_COUNT += 1
+
+    return neighbors_list
+
+
+def compute_quality_metrics(nodes, coords, strains, angles, quality_mode, uniformity_radius, neighbors=None,
+                            best_angles=None, metric="Euclidean (Straight Line)"):
     """
     Computes the best strain, best angle, local standard deviation, and a quality metric.
 
@@ -115,6 +295,13 @@ def compute_quality_metrics(nodes, coords, strains, angles, quality_mode, unifor
         angles (list or np.ndarray): Angles in degrees.
         quality_mode (str): The formula to use for the quality metric.
         uniformity_radius (float): The search radius for calculating local standard deviation.
+        neighbors (list, optional): Precomputed output of compute_neighborhoods. Computed
+            here if not given.
+        best_angles (np.ndarray, optional): Per-node angles already resolved by the caller (e.g.
+            compute_principal_direction). strains must then hold one column, the strain at
+            that angle, and angles is ignored.
+        metric (str): Distance measure of the neighbourhoods (see NEIGHBORHOOD_METRICS), used
+            when neighbors is not given.
 
     Returns:
         pd.DataFrame: A DataFrame with comprehensive metrics for each node.
@@ -122,44 +309,23 @@ def compute_quality_metrics(nodes, coords, strains, angles, quality_mode, unifor
     if strains.ndim == 1:
         strains = strains[:, np.newaxis]
 
-    best_idx = np.argmax(np.abs(strains), axis=1)
-    best_strains = strains[np.arange(len(strains)), best_idx]
-    best_angles = np.array(angles)[best_idx]
-
-    if len(angles) == 1:
-        # For modes like von Mises, there is no "best angle"
-        best_angles = np.full(len(nodes), np.nan)
-
-    # Use cKDTree for efficient spatial queries
-    tree = cKDTree(coords)
-    local_std = np.zeros(len(nodes))
+    if best_angles is not None:
+        best_strains = strains[:, 0]
+    else:
+        best_idx = np.argmax(np.abs(strains), axis=1)
+        best_strains = strains[np.arange(len(strains)), best_idx]
+        best_angles = np.array(angles)[best_idx]
 
-    # Query all points at once for better performance
-    neighbors_list = tree.query_ball_point(coords, uniformity_radius)
+        if len(angles) == 1:
+            # For modes like von Mises, there is no "best angle"
+            best_angles = np.full(len(nodes), np.nan)
 
-    global _KNN_FALLBACK_COUNT, _TOTAL_LOCAL_STD_POINTS
-    for i, indices in enumerate(neighbors_list):
-        # Track total attempts
-        _TOTAL_LOCAL_STD_POINTS += 1
+    if neighbors is None:
+        neighbors = compute_neighborhoods(coords, uniformity_radius, metric)
 
-        # Standard deviation requires at least 2 points; prefer >= _MIN_NEIGHBORS
-        use_fallback = len(indices) < _MIN_NEIGHBORS
-        if use_fallback:
-            # k-NN fallback to stabilize estimate in sparse/edge regions
-            k = min(_MIN_NEIGHBORS, len(coords))
-            if k >= 2:
-                _, knn_idx = tree.query(coords[i], k=k)
-                # Ensure array of indices
-                knn_idx = np.atleast_1d(knn_idx)
-                local_std[i] = np.std(best_strains[knn_idx])
-                _KNN_FALLBACK_COUNT += 1
-            elif len(indices) > 1:
-                local_std[i] = np.std(best_strains[indices])
-            else:
-                local_std[i] = 0.0
-        else:
-            # Enough neighbors within radius
-            local_std[i] = np.std(best_strains[indices]) if len(indices) > 1 else 0.0
+    local_std = np.zeros(len(nodes), dtype=best_strains.dtype)
+    for i, indices in enumerate(neighbors):
+        local_std[i] = np.std(best_strains[indices]) if len(indices) > 1 else 0.0
 
     abs_strain = np.abs(best_strains)
 
@@ -171,7 +337,7 @@ def compute_quality_metrics(nodes, coords, strains, angles, quality_mode, unifor
     eps0 = max(1.0, 0.01 * sigma_ref)
     # Auto-k for exponential: set attenuation A at sigma_ref
     A = 0.5
-    k_exp = (0.0 if sigma_ref <= 0 else -np.log(A) / sigma_ref)
+    k_exp = (0.0 if sigma_ref <= 0 else float(-np.log(A) / sigma_ref))
 
     if quality_mode == "Default: |ε|/(1+σ)":
         quality = abs_strain / (1.0 + local_std)
@@ -0,0 +1,48 @@
+# File: app/export_tasks.py
+"""
+Background export of analysis results, so writing large files never blocks the GUI.
+"""
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class ExportSignals(QObject):
+    """Signals of an ExportTask (QRunnable cannot emit signals itself)."""
+    finished = pyqtSignal(str)  # output path
+    failed = pyqtSignal(str, str)  # output path, error message
+
+
+class CsvExportTask(QRunnable):
+    """Writes a DataFrame to CSV on a pool thread."""
+
+    def __init__(self, df, output_path, float_format="%.6e"):
+        super().__init__()
+        self.df = df
+        self.output_path = output_path
+        self.float_format = float_format
+        self.signals = ExportSignals()
+
+    def run(self):
+        try:
+            self.df.to_csv(self.output_path, index=False, float_format=self.float_format)
+        except Exception as e:
+            self.signals.failed.emit(self.output_path, str(e))
+        else:
+            self.signals.finished.emit(self.output_path)
+
+
+class ExportQueue:
+    """
+    Runs export tasks one at a time, in submission order, on a dedicated thread pool.
+    Serializing the writes keeps two quick successive runs from writing the same file at once.
+    """
+
+    def __init__(self):
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+
+    def submit(self, task):
+        self.pool.start(task)
+
+    def wait(self, msecs=-1):
+        """Blocks until all queued exports are written (used on shutdown)."""
+        return self.pool.waitForDone(msecs)
@@ -0,0 +1,271 @@
+# File: app/geodesic.py
+"""
+Surface (geodesic) distances between the nodes of a model.
+
+The input files hold surface nodes without element connectivity, so the surface is
+reconstructed as a sparse graph: every node is linked to its nearest neighbours, except where
+a link leaves the local tangent plane (estimated by PCA of the neighbourhood) or is much longer
+than the local node spacing. On thin-walled or folded parts this removes the
+through-thickness and across-gap links, so distances follow the surface instead of cutting
+through the material.
+
+Distances are computed with Dijkstra's algorithm bounded by the search radius. Any path
+shorter than the radius stays inside the straight-line ball of that radius, so every search
+only runs on the small subgraph around its sources.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+# ---- Surface graph construction ---------------------------------------------------------
+_GRAPH_NEIGHBORS = 16          # nearest neighbours of a node: its tangent plane and link candidates
+_MAX_EDGE_ELEVATION_DEG = 20.0  # max angle between a link and the tangent planes of its nodes
+_MAX_EDGE_SPACING_FACTOR = 2.5  # max link length, relative to the nearest-neighbour distance
+_NORMAL_BLOCK_SIZE = 200000     # nodes per block in the normal estimation (bounds memory)
+
+# ---- Bounded Dijkstra searches -----------------------------------------------------------
+_SOURCE_BATCH_SIZE = 256  # sources solved together on one subgraph
+
+# ---- Caches (module-level) ---------------------------------------------------------------
+_GRAPH_CACHE_SIZE = 2
+_GRAPH_CACHE = OrderedDict()  # coords digest -> SurfaceGraph
+_NEIGHBORHOOD_CACHE_SIZE = 2
+_NEIGHBORHOOD_CACHE = OrderedDict()  # (coords digest, radius) -> list of neighbour index arrays
+# A cancelled run can still be computing while a new one starts, so both threads may use the caches
+_CACHE_LOCK = threading.Lock()
+_GRAPH_BUILD_LOCK = threading.Lock()  # concurrent runs on the same model build its graph once
+
+
+def clear_geodesic_cache():
+    with _CACHE_LOCK:
+        _GRAPH_CACHE.clear()
+        _NEIGHBORHOOD_CACHE.clear()
+
+
+def _coords_digest(coords):
+    return hashlib.sha1(np.ascontiguousarray(coords, dtype=np.float64).tobytes()).hexdigest()
+
+
+def _cache_get(cache, key):
+    with _CACHE_LOCK:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    return None
+
+
+def _cache_put(cache, key, value, max_size):
+    with _CACHE_LOCK:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+
+class SurfaceGraph:
+    """
+    Sparse surface graph of a node cloud, with bounded geodesic distance queries.
+
+    Attributes:
+        coords (np.ndarray): (n, 3) node coordinates.
+        adjacency (scipy.sparse.csr_matrix): Symmetric (n, n) link lengths.
+        normals (np.ndarray): (n, 3) unit normals of the local tangent planes (unoriented).
+        tree (cKDTree): KD-tree of coords.
+    """
+
+    def __init__(self, coords, adjacency, normals, tree):
+        self.coords = coords
+        self.adjacency = adjacency
+        self.normals = normals
+        self.tree = tree
+
+    @property
+    def n_edges(self):
+        return self.adjacency.nnz // 2
+
+    def rows_of(self, points):
+        """Returns the graph rows of the nodes at the given (m, 3) coordinates."""
+        _, rows = self.tree.query(np.asarray(points, dtype=float), k=1)
+        return np.atleast_1d(rows)
+
+    def bounded_distances(self, sources, radius):
+        """
+        Geodesic distances from the sources to every node within `radius` of them.
+
+        Args:
+            sources (np.ndarray): Graph rows of the source nodes (should lie close together).
+            radius (float): Search radius in mm.
+
+        Returns:
+            tuple: (region, distances) where region holds the graph rows of the searched
+            subgraph and distances is (len(sources), len(region)), np.inf beyond the radius.
+        """
+        sources = np.atleast_1d(np.asarray(sources, dtype=int))
+        points = self.coords[sources]
+        center = 0.5 * (points.min(axis=0) + points.max(axis=0))
+        reach = float(np.max(np.linalg.norm(points - center, axis=1))) + radius
+        region = np.sort(np.asarray(self.tree.query_ball_point(center, reach), dtype=int))
+
+        subgraph = self.adjacency[region][:, region]
+        local_sources = np.searchsorted(region, sources)
+        distances = dijkstra(subgraph, directed=False, indices=local_sources, limit=radius)
+        return region, np.atleast_2d(distances)
+
+    def ball(self, row, radius):
+        """Returns (rows, distances) of the nodes within geodesic `radius` of node `row`."""
+        region, distances = self.bounded_distances([row], radius)
+        inside = np.isfinite(distances[0])
+        return region[inside], distances[0][inside]
+
+    def nearest(self, row, k):
+        """
+        Returns the node itself and up to k - 1 of its closest linked neighbours (used
+        when a geodesic neighbourhood holds too few nodes).
+        """
+        start, stop = self.adjacency.indptr[row], self.adjacency.indptr[row + 1]
+        linked = self.adjacency.indices[start:stop]
+        order = np.argsort(self.adjacency.data[start:stop], kind='stable')
+        return np.concatenate(([row], linked[order][:k - 1]))
+
+
+def build_surface_graph(coords, n_neighbors=_GRAPH_NEIGHBORS):
+    """
+    Reconstructs the surface graph of a node cloud.
+
+    Args:
+        coords (np.ndarray): (n, 3) node coordinates in mm.
+        n_neighbors (int): Nearest neighbours considered for links of every node.
+
+    Returns:
+        SurfaceGraph: The graph; see the module docstring for the link filters.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    n_nodes = len(coords)
+    tree = cKDTree(coords)
+    k = min(n_neighbors + 1, n_nodes)
+    if k < 2:
+        return SurfaceGraph(coords, coo_matrix((n_nodes, n_nodes)).tocsr(), np.zeros((n_nodes, 3)), tree)
+
+    distances, indices = tree.query(coords, k=k)
+    distances, indices = distances.reshape(n_nodes, k), indices.reshape(n_nodes, k)
+
+    # Tangent plane normals: smallest principal axis of every k-neighbourhood. A generous k
+    # keeps the plane level on regular grids, where ties among the nearest few neighbours
+    # would tilt it, and leaves enough in-plane links where the wall's far face takes up
+    # some of the nearest neighbours.
+    normals = np.empty((n_nodes, 3))
+    for start in range(0, n_nodes, _NORMAL_BLOCK_SIZE):
+        stop = min(start + _NORMAL_BLOCK_SIZE, n_nodes)
+        points = coords[indices[start:stop]]
+        centered = points - points.mean(axis=1, keepdims=True)
+        covariance = np.einsum('nki,nkj->nij', centered, centered)
+        _, eigvecs = np.linalg.eigh(covariance)
+        normals[start:stop] = eigvecs[:, :, 0]
+
+    # Candidate links i -> j (column 0 is the node itself)
+    source = np.repeat(np.arange(n_nodes), k - 1)
+    target = indices[:, 1:].ravel()
+    length = distances[:, 1:].ravel()
+    keep = target != source
+
+    # Links must run within the tangent planes of both end nodes...
+    direction = (coords[target] - coords[source]) / np.maximum(length, np.finfo(float).tiny)[:, None]
+    elevation = np.maximum(np.abs(np.einsum('ij,ij->i', direction, normals[source])),
+                           np.abs(np.einsum('ij,ij->i', direction, normals[target])))
+    keep &= (elevation <= np.sin(np.radians(_MAX_EDGE_ELEVATION_DEG))) | (length == 0.0)
+
+    # ...and must not bridge gaps much wider than the local node spacing. Across a thin wall
+    # the nearest node is the one opposite, which also rejects long, shallow links through
+    # the wall that the tangent plane test alone would let pass.
+    spacing = distances[:, 1]
+    keep &= length <= _MAX_EDGE_SPACING_FACTOR * np.maximum(spacing[source], spacing[target])
+
+    # Coincident nodes get a tiny positive length, since zero entries are not links
+    weight = np.maximum(length[keep], 1e-12 * max(float(np.ptp(coords, axis=0).max()), 1.0))
+    adjacency = coo_matrix((weight, (source[keep], target[keep])), shape=(n_nodes, n_nodes)).tocsr()
+    adjacency = adjacency.maximum(adjacency.T).tocsr()
+    return SurfaceGraph(coords, adjacency, normals, tree)
+
+
+def get_surface_graph(coords):
+    """Returns the (cached) surface graph of the given coordinates."""
+    key = _coords_digest(coords)
+    graph = _cache_get(_GRAPH_CACHE, key)
+    if graph is not None:
+        return graph
+    with _GRAPH_BUILD_LOCK:
+        # Another run may have built it while this one waited
+        graph = _cache_get(_GRAPH_CACHE, key)
+        if graph is None:
+            graph = build_surface_graph(coords)
+            _cache_put(_GRAPH_CACHE, key, graph, _GRAPH_CACHE_SIZE)
+    return graph
+
+
+def _cell_groups(coords, cell_size):
+    """Returns the node rows of every occupied cubic cell of the given size."""
+    cells = np.floor((coords - coords.min(axis=0)) / cell_size).astype(np.int64)
+    order = np.lexsort(cells.T[::-1])
+    boundaries = np.flatnonzero(np.any(np.diff(cells[order], axis=0) != 0, axis=1)) + 1
+    return np.split(order, boundaries)
+
+
+def _spatial_batches(coords, radius, batch_size):
+    """
+    Groups node rows into batches of nearby nodes, one batch per cubic cell.
+
+    The cell size is adapted to the node density, so that a cell holds about batch_size
+    nodes (surface nodes fill cells in proportion to the cell area), but never drops below
+    the radius: smaller cells would make the searched subgraphs mostly margin.
+    """
+    cell_size = 2.0 * radius
+    for _ in range(3):
+        groups = _cell_groups(coords, cell_size)
+        scale = np.sqrt(batch_size / (len(coords) / len(groups)))
+        if 0.7 < scale < 1.4 or (scale < 1.0 and cell_size <= radius):
+            break
+        cell_size = max(radius, cell_size * scale)
+    else:
+        groups = _cell_groups(coords, cell_size)
+
+    for group in groups:
+        for start in range(0, len(group), 2 * batch_size):
+            yield group[start:start + 2 * batch_size]
+
+
+def geodesic_neighborhoods(coords, radius):
+    """
+    Finds, for every node, the nodes within geodesic distance `radius` (the node included).
+
+    The surface graph and the result are cached, so later runs on the same model (and the
+    greedy exclusion zones, see SurfaceGraph.ball) reuse them.
+
+    Args:
+        coords (np.ndarray): (n, 3) node coordinates in mm.
+        radius (float): Search radius in mm.
+
+    Returns:
+        list: One array of neighbour indices per node, like computation.compute_neighborhoods.
+    """
+    key = (_coords_digest(coords), float(radius))
+    cached = _cache_get(_NEIGHBORHOOD_CACHE, key)
+    if cached is not None:
+        return list(cached)
+
+    graph = get_surface_graph(coords)
+    neighbors = [None] * len(coords)
+    for sources in _spatial_batches(graph.coords, radius, _SOURCE_BATCH_SIZE):
+        region, distances = graph.bounded_distances(sources, radius)
+        reached, columns = np.nonzero(np.isfinite(distances))
+        split = np.searchsorted(reached, np.arange(1, len(sources)))
+        for source, found in zip(sources, np.split(region[columns], split)):
+            neighbors[source] = found
+
+    _cache_put(_NEIGHBORHOOD_CACHE, key, neighbors, _NEIGHBORHOOD_CACHE_SIZE)
+    return list(neighbors)
@@ -0,0 +1,235 @@
+# File: app/instrumentation.py
+"""
+Lightweight per-stage instrumentation of the positioning pipeline: wall time, resident
+memory (current and peak RSS) and the size of the arrays each stage produced.
+
+The pipeline reports into a PipelineTrace; NULL_TRACE is used when nothing is recorded.
+No Qt dependency, so the same trace works in the GUI engine and the CLI.
+"""
+
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+_MB = 1024.0 * 1024.0
+
+# Lists longer than this (e.g. one neighbour index array per node) are sized from a sample.
+_LIST_SAMPLE_SIZE = 1000
+
+
+def memory_usage():
+    """
+    Returns (current_rss_bytes, peak_rss_bytes) of this process. Either value is None when
+    the platform does not provide it.
+    """
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize, counters.PeakWorkingSetSize
+        except Exception:
+            pass
+        return None, None
+
+    current = peak = None
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    return current, peak
+
+
+def describe_array(value):
+    """
+    Returns {"shape", "dtype", "bytes"} for an array-like stage result: NumPy arrays,
+    DataFrames, and dicts or lists of those (summed).
+    """
+    if isinstance(value, np.ndarray):
+        return {"shape": list(value.shape), "dtype": str(value.dtype), "bytes": int(value.nbytes)}
+    if isinstance(value, pd.DataFrame):
+        return {"shape": list(value.shape), "dtype": "DataFrame",
+                "bytes": int(value.memory_usage(index=True, deep=False).sum())}
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return {"shape": [0], "dtype": None, "bytes": 0}
+        items = value
+        if len(value) > _LIST_SAMPLE_SIZE:
+            step = len(value) // _LIST_SAMPLE_SIZE
+            items = value[::step][:_LIST_SAMPLE_SIZE]
+        parts = [describe_array(item) for item in items]
+        total = sum(part["bytes"] for part in parts) * len(value) / len(items)
+        return {"shape": [len(value)] + parts[0]["shape"], "dtype": parts[0]["dtype"],
+                "bytes": int(total), "estimated": len(items) < len(value)}
+    return {"shape": [], "dtype": type(value).__name__, "bytes": int(sys.getsizeof(value))}
+
+
+class PipelineTrace:
+    """
+    Collects one record per pipeline stage.
+
+    Stages are sequential: enter() closes the running stage and opens the next one, and
+    finish() closes the last. Arrays and annotations always attach to the running stage.
+    """
+
+    def __init__(self, **meta):
+        self.meta = dict(meta)
+        self.records = []
+        self._current = None
+        self._started = time.perf_counter()
+        self._started_at = datetime.datetime.now().isoformat(timespec="seconds")
+
+    def enter(self, stage):
+        """
+        Starts `stage` unless it is already running.
+
+        Returns:
+            dict or None: The record of the stage that just ended, if any.
+        """
+        if self._current is not None and self._current["stage"] == stage:
+            return None
+        finished = self._close()
+        current, peak = memory_usage()
+        self._current = {"stage": stage, "_start": time.perf_counter(), "rss_start_mb": _to_mb(current),
+                         "_peak_start": peak, "arrays": {}}
+        return finished
+
+    def finish(self):
+        """Closes the running stage. Returns its record, or None."""
+        return self._close()
+
+    def record_arrays(self, **arrays):
+        """Attaches the sizes of the given stage results to the running stage."""
+        if self._current is not None:
+            for name, value in arrays.items():
+                self._current["arrays"][name] = describe_array(value)
+
+    def annotate(self, **values):
+        """Attaches extra values (e.g. cache hits) to the running stage."""
+        if self._current is not None:
+            self._current.update(values)
+
+    def _close(self):
+        record = self._current
+        if record is None:
+            return None
+        self._current = None
+        current, peak = memory_usage()
+        record["wall_s"] = time.perf_counter() - record.pop("_start")
+        record["rss_end_mb"] = _to_mb(current)
+        record["peak_rss_mb"] = _to_mb(peak)
+        peak_start = record.pop("_peak_start")
+        # Growth of the process high-water mark during this stage
+        record["peak_rss_growth_mb"] = _to_mb(peak - peak_start) if peak is not None and peak_start is not None else None
+        record["array_mb"] = _to_mb(sum(a["bytes"] for a in record["arrays"].values()))
+        self.records.append(record)
+        return record
+
+    @property
+    def total_wall_s(self):
+        return time.perf_counter() - self._started
+
+    def to_dict(self):
+        _, peak = memory_usage()
+        return {
+            "started": self._started_at,
+            "total_wall_s": self.total_wall_s,
+            "peak_rss_mb": _to_mb(peak),
+            "meta": self.meta,
+            "stages": list(self.records),
+        }
+
+    def to_json(self, path):
+        """Writes the trace to a JSON file."""
+        self.write_json(self.to_dict(), path)
+
+    @staticmethod
+    def write_json(trace_dict, path):
+        """Writes a trace dictionary (see to_dict) to a JSON file."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace_dict, f, indent=2, ensure_ascii=False, default=_json_default)
+            f.write("\n")
+
+
+class _NullTrace:
+    """Trace that records nothing; the default for pipeline callers that do not profile."""
+
+    def enter(self, stage):
+        return None
+
+    def finish(self):
+        return None
+
+    def record_arrays(self, **arrays):
+        pass
+
+    def annotate(self, **values):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def summarize(trace_dict):
+    """One-line summary of a trace for the status bar, e.g. '2.41 s | peak RSS 512 MB'."""
+    text = f"{trace_dict['total_wall_s']:.2f} s"
+    if trace_dict.get("peak_rss_mb") is not None:
+        text += f" | peak RSS {trace_dict['peak_rss_mb']:.0f} MB"
+    return text
+
+
+def format_stages(trace_dict):
+    """Multi-line per-stage breakdown of a trace (used for tooltips and the console)."""
+    lines = []
+    width = max((len(record["stage"]) for record in trace_dict["stages"]), default=0)
+    for record in trace_dict["stages"]:
+        line = f"{record['stage']:<{width}s} {record['wall_s']:8.3f} s"
+        if record.get("rss_end_mb") is not None:
+            line += f"   RSS {record['rss_end_mb']:8.1f} MB"
+        if record.get("peak_rss_growth_mb"):
+            line += f" (peak +{record['peak_rss_growth_mb']:.1f} MB)"
+        if record["arrays"]:
+            line += f"   arrays {record['array_mb']:.1f} MB"
+        if record.get("cache_hit"):
+            line += "   [cached]"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _to_mb(value):
+    return None if value is None else value / _MB
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
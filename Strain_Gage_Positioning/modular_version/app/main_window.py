@@ -2,22 +2,27 @@
 
 import os
 import sys
-import pandas as pd
+import datetime
 import numpy as np
-import pyvista as pv
 from pathlib import Path
 
 from PyQt5.QtWidgets import (QMainWindow, QHBoxLayout, QWidget, QFileDialog,
-                             QMessageBox, QDockWidget, QTableWidget, QTableWidgetItem,
-                             QAction, QVBoxLayout, QHeaderView)
-from PyQt5.QtCore import Qt, QCoreApplication
+                             QMessageBox, QDockWidget, QTableView, QAbstractItemView,
+                             QAction, QVBoxLayout, QHeaderView, QProgressBar, QLabel)
+from PyQt5.QtCore import Qt, QThread
 from pyvistaqt import MainWindow as PyVistaMainWindow
 
-from .ui_components import ControlPanel, VisualizationPanel, InputDataPanel
+from .ui_components import ControlPanel, VisualizationPanel, InputDataPanel, CandidateTableModel
 from .ui_tools import DistanceMeasureUI
+from .scene_model import StrainSceneModel
+from .export_tasks import CsvExportTask, ExportQueue
 from .analysis_engine import AnalysisEngine
+from . import instrumentation
 from . import tooltips as tips
 
+# How long starting a new run waits for a cancelled one to exit before leaving it to finish on its own
+ENGINE_STOP_TIMEOUT_MS = 200
+
 
 class MainWindow(QMainWindow):
     """
@@ -37,8 +42,11 @@ class MainWindow(QMainWindow):
         self.project_dir = os.getcwd()
         self.input_file = None
         self.display_in_strain = False
+        self.engine = None
         self.engine_thread = None
+        self.stopping_threads = []  # Cancelled runs still winding down
         self.last_results = {}  # Cache for visualization refreshes
+        self.export_queue = ExportQueue()  # Background CSV writes
 
         # --- UI Setup ---
         self._setup_ui()
@@ -70,9 +78,14 @@ class MainWindow(QMainWindow):
         # Attach the distance measurement UI tool to the plotter
         self.distance_tool = DistanceMeasureUI(self.visualization_panel.vtk_widget, units="mm")
 
+        # Persistent strain scene: actors are kept alive and updated in place between redraws
+        self.scene = StrainSceneModel(self.visualization_panel.vtk_widget)
+        self.distance_tool.snap_function = self.scene.snap_to_node
+
         # Create other UI elements like menus and docks
         self._create_menu_bar()
         self._create_candidate_table_dock()
+        self._create_status_bar()
 
     def _create_menu_bar(self):
         menubar = self.menuBar()
@@ -90,21 +103,35 @@ class MainWindow(QMainWindow):
 
     def _create_candidate_table_dock(self):
         self.candidate_table_dock = QDockWidget("Candidate Points", self)
-        self.candidate_table = QTableWidget()
+        self.candidate_model = CandidateTableModel(self)
+        self.candidate_table = QTableView()
+        self.candidate_table.setModel(self.candidate_model)
         self.candidate_table.setAlternatingRowColors(True)
         header = self.candidate_table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.ResizeToContents)
         header.setStretchLastSection(True)
         self.candidate_table.horizontalHeader().setStyleSheet(
             "QHeaderView::section { background-color: lightgray; font-weight: bold; }")
-        self.candidate_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.candidate_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.candidate_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.candidate_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.candidate_table_dock.setWidget(self.candidate_table)
         self.addDockWidget(Qt.RightDockWidgetArea, self.candidate_table_dock)
         self.candidate_table_dock.hide()
 
         # Camera fly-to on row click
-        self.candidate_table.cellClicked.connect(self.on_candidate_table_cell_clicked)
+        self.candidate_table.clicked.connect(self.on_candidate_table_cell_clicked)
+
+    def _create_status_bar(self):
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setMaximumWidth(220)
+        self.progress_bar.setVisible(False)
+        self.statusBar().addPermanentWidget(self.progress_bar)
+
+        # Timing / memory of the last run; the per-stage breakdown is in the tooltip
+        self.profile_label = QLabel()
+        self.profile_label.setToolTip(tips.PROFILE_LABEL)
+        self.statusBar().addPermanentWidget(self.profile_label)
 
     def _apply_tooltips(self):
         """Applies all tooltips to the main window's widgets."""
@@ -117,6 +144,7 @@ class MainWindow(QMainWindow):
         """Connect the Model, View, and Controller components."""
         # --- Control Panel (View) -> MainWindow (Controller) ---
         self.control_panel.analysis_requested.connect(self.run_analysis)
+        self.control_panel.cancel_requested.connect(self.cancel_analysis)
         self.input_panel.file_load_requested.connect(self.load_strain_data)
 
         # --- Menu Actions (View) -> MainWindow (Controller) ---
@@ -154,21 +182,120 @@ class MainWindow(QMainWindow):
             self.run_analysis(is_continued_kmeans=False)
 
     def run_analysis(self, is_continued_kmeans=False):
-        """Slot to create and start the analysis engine."""
+        """Slot to create the analysis engine and start it on a worker thread."""
         if not self.input_file:
             QMessageBox.warning(self, "Input Error", "Please load a strain data file first.")
             return
 
+        # Only one analysis at a time: stop a run that is still in progress
+        self._stop_engine_thread()
+
         params = self.control_panel.get_parameters()
         self.control_panel.set_button_state_running()
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+
+        self.engine = AnalysisEngine(self.input_file, params, self.display_in_strain, is_continued_kmeans)
+        self.engine_thread = QThread(self)
+        self.engine.moveToThread(self.engine_thread)
+
+        self.engine.analysis_complete.connect(self.on_analysis_complete)
+        self.engine.analysis_failed.connect(self.on_analysis_failed)
+        self.engine.analysis_cancelled.connect(self.on_analysis_cancelled)
+        self.engine.kmeans_preview_ready.connect(self.on_kmeans_preview_ready)
+        self.engine.progress.connect(self.on_analysis_progress)
+        self.engine.precision_report.connect(self.on_precision_report)
+        self.engine.stage_profiled.connect(self.on_stage_profiled)
+        self.engine.profile_ready.connect(self.on_profile_ready)
+
+        # Thread lifecycle: run on start, quit and clean up when the engine is done
+        self.engine_thread.started.connect(self.engine.run)
+        self.engine.finished.connect(self.engine_thread.quit)
+        self.engine.finished.connect(self.engine.deleteLater)
+        self.engine_thread.finished.connect(self.engine_thread.deleteLater)
+        self.engine_thread.finished.connect(self._on_engine_thread_finished)
+
+        self.engine_thread.start()
+
+    def cancel_analysis(self):
+        """Slot to request cooperative cancellation of the running analysis."""
+        if self.engine is not None:
+            self.engine.cancel()
+            self.control_panel.set_button_state_cancelling()
+            self.statusBar().showMessage("Cancelling...")
+
+    def _stop_engine_thread(self, timeout_ms=ENGINE_STOP_TIMEOUT_MS):
+        """
+        Cancels the running analysis (if any) and waits up to timeout_ms for its thread to exit.
+        A thread still busy in a numpy stage is left to reach its next cancellation checkpoint;
+        its finished signal then quits and deletes it, so the GUI thread is never blocked.
+        """
+        if self.engine_thread is not None and self.engine_thread.isRunning():
+            if self.engine is not None:
+                # Results of the abandoned run must not reach the UI
+                for signal in (self.engine.analysis_complete, self.engine.analysis_failed,
+                               self.engine.analysis_cancelled, self.engine.kmeans_preview_ready,
+                               self.engine.progress, self.engine.precision_report,
+                               self.engine.stage_profiled, self.engine.profile_ready):
+                    try:
+                        signal.disconnect()
+                    except TypeError:
+                        pass
+                self.engine.cancel()
+            # Tracked before waiting, so a thread that exits right after the timeout is still released
+            self.stopping_threads.append(self.engine_thread)
+            self.engine_thread.finished.connect(self._on_stopping_thread_finished)
+            self.engine_thread.quit()
+            if self.engine_thread.wait(timeout_ms):
+                self.stopping_threads.remove(self.engine_thread)
+        self.engine = None
+        self.engine_thread = None
 
-        self.engine_thread = AnalysisEngine(self.input_file, params, self.display_in_strain, is_continued_kmeans)
-        self.engine_thread.analysis_complete.connect(self.on_analysis_complete)
-        self.engine_thread.analysis_failed.connect(self.on_analysis_failed)
-        self.engine_thread.kmeans_preview_ready.connect(self.on_kmeans_preview_ready)
-
-        QCoreApplication.processEvents()  # Allow UI to update before long computation
-        self.engine_thread.run()
+    def _on_engine_thread_finished(self):
+        # Ignore the finished signal of a thread that was already replaced
+        if self.sender() is self.engine_thread:
+            self.engine = None
+            self.engine_thread = None
+            self.progress_bar.setVisible(False)
+
+    def _on_stopping_thread_finished(self):
+        # A cancelled run has wound down; its thread deletes itself
+        if self.sender() in self.stopping_threads:
+            self.stopping_threads.remove(self.sender())
+
+    def on_analysis_progress(self, message, percent):
+        """Slot to show the engine's stage progress in the status bar."""
+        self.statusBar().showMessage(message)
+        self.progress_bar.setValue(percent)
+
+    def on_stage_profiled(self, record):
+        """Slot to show the timing of each finished stage while the analysis runs."""
+        text = f"{record['stage']}: {record['wall_s']:.2f} s"
+        if record.get("rss_end_mb") is not None:
+            text += f" | RSS {record['rss_end_mb']:.0f} MB"
+        self.profile_label.setText(text)
+
+    def on_profile_ready(self, trace):
+        """Slot to show the timing summary of a run and optionally save its JSON trace."""
+        breakdown = instrumentation.format_stages(trace)
+        self.profile_label.setText(f"Last run: {instrumentation.summarize(trace)}")
+        self.profile_label.setToolTip(f"<pre>{breakdown}</pre>")
+        print(f"Analysis timing ({trace['meta'].get('outcome', 'unknown')}):\n{breakdown}")
+
+        if trace["meta"].get("params", {}).get("write_trace"):
+            stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = os.path.join(self.project_dir, f"analysis_trace_{stamp}.json")
+            try:
+                instrumentation.PipelineTrace.write_json(trace, output_path)
+                self.statusBar().showMessage(f"Timing trace saved to {output_path}", 5000)
+            except OSError as e:
+                print(f"Error writing timing trace '{output_path}': {e}")
+                self.statusBar().showMessage(f"Could not save {os.path.basename(output_path)}: {e}", 10000)
+
+    def on_analysis_cancelled(self):
+        """Slot to restore the controls after a cancelled run."""
+        self.control_panel.set_button_state_ready()
+        self.statusBar().showMessage("Analysis cancelled.", 5000)
 
     def on_analysis_complete(self, coords, scalars, candidates_df):
         """Slot to receive results from the engine and update the view."""
@@ -177,9 +304,6 @@ class MainWindow(QMainWindow):
         if candidates_df.empty and self.control_panel.get_parameters()["strategy"] == "Region of Interest (ROI) Search":
             QMessageBox.warning(self, "ROI Empty", "No data points found within the specified Region of Interest.")
 
-        output_path = os.path.join(self.project_dir, "strain_candidate_points.csv")
-        candidates_df.to_csv(output_path, index=False, float_format="%.6e")
-
         # Decide whether to preserve camera based on whether we have a prior scene
         preserve_camera = bool(self.last_results)
         self.last_results = {'coords': coords, 'scalars': scalars, 'candidates_df': candidates_df}
@@ -191,7 +315,27 @@ class MainWindow(QMainWindow):
         # Draw directly, resetting camera on the first render to fit the data bounds
         self.display_strain_with_candidates(coords, scalars, candidates_df, preserve_camera=preserve_camera)
 
-        self.update_candidate_table(output_path)
+        # The table is backed by the result DataFrame; the CSV copy is written in the background
+        self.update_candidate_table(candidates_df)
+        self.export_candidates(candidates_df)
+
+    def on_precision_report(self, report):
+        """Slot to show how far the single precision run deviates from float64."""
+        print(f"Precision validation:\n{report}")
+        QMessageBox.information(self, "Precision Validation (float32 vs float64)", report)
+
+    def export_candidates(self, candidates_df):
+        """Writes strain_candidate_points.csv to the project directory on a background thread."""
+        output_path = os.path.join(self.project_dir, "strain_candidate_points.csv")
+        task = CsvExportTask(candidates_df, output_path)
+        task.signals.finished.connect(
+            lambda path: self.statusBar().showMessage(f"Candidates saved to {path}", 5000))
+        task.signals.failed.connect(self.on_export_failed)
+        self.export_queue.submit(task)
+
+    def on_export_failed(self, output_path, error_message):
+        print(f"Error writing candidate CSV '{output_path}': {error_message}")
+        self.statusBar().showMessage(f"Could not save {os.path.basename(output_path)}: {error_message}", 10000)
 
     def on_kmeans_preview_ready(self, coords, cluster_labels):
         """Slot to handle the K-Means preview step."""
@@ -200,6 +344,7 @@ class MainWindow(QMainWindow):
 
     def on_analysis_failed(self, error_message):
         """Slot to handle errors reported by the engine."""
+        self.statusBar().showMessage("Analysis failed.", 5000)
         QMessageBox.critical(self, "Analysis Failed", error_message)
         self.control_panel.set_button_state_ready()
 
@@ -207,62 +352,51 @@ class MainWindow(QMainWindow):
         plotter = self.visualization_panel.vtk_widget
         camera = plotter.camera.copy() if preserve_camera else None
         plotter.clear()
+        self.scene.reset()
         if camera:
             plotter.camera = camera
         else:
             plotter.reset_camera()
 
     def refresh_visualization(self):
-        """Redraws the main plot using cached data and current graphical settings."""
-        if not self.last_results:
+        """Applies the current graphical settings to the existing scene (no geometry rebuild)."""
+        if not self.last_results or not self.scene.has_cloud():
             return
 
-        self.display_strain_with_candidates(
-            self.last_results['coords'],
-            self.last_results['scalars'],
-            self.last_results['candidates_df'],
-            preserve_camera=True
-        )
+        self.scene.apply_settings(self.visualization_panel.get_settings())
+        self.scene.update_lod()
+        self.visualization_panel.vtk_widget.render()
 
     def display_strain_with_candidates(self, coords, scalars, candidates_df, preserve_camera=False):
-        self.clear_visualization(preserve_camera=preserve_camera)
         plotter = self.visualization_panel.vtk_widget
         viz_settings = self.visualization_panel.get_settings()
-
-        cloud = pv.PolyData(coords)
-        cloud["Scalars"] = scalars
         scalar_title = "Strain (mm/mm)" if self.display_in_strain else "Microstrain (με)"
 
-        plotter.add_mesh(
-            cloud, scalars="Scalars", cmap="jet",
-            point_size=viz_settings['cloud_point_size'],
-            render_points_as_spheres=True,
-            clim=(viz_settings['clim_min'], viz_settings['clim_max']),
-            below_color=viz_settings['below_color'],
-            above_color=viz_settings['above_color'],
-            scalar_bar_args={'title': scalar_title}
-        )
-
+        labels = []
+        candidate_coords = np.empty((0, 3))
         if not candidates_df.empty:
-            candidate_points = pv.PolyData(candidates_df[['X', 'Y', 'Z']].values)
-            plotter.add_mesh(candidate_points, color="magenta",
-                             point_size=viz_settings['candidate_point_size'],
-                             render_points_as_spheres=True)
+            candidate_coords = candidates_df[['X', 'Y', 'Z']].values
 
             strategy = self.control_panel.get_parameters()["strategy"]
             if "Gradient" in strategy:
                 values = candidates_df['Local_Std'].values
                 labels = [f"P{i + 1}\nStd: {v:.2e}" for i, v in enumerate(values)]
+            elif "Info_Gain" in candidates_df.columns:
+                values = candidates_df['Info_Gain'].values
+                if "Gauge_Angle" in candidates_df.columns:
+                    angles = candidates_df['Gauge_Angle'].values
+                    labels = [f"P{i + 1} ({a:.0f}°)\nΔlogdet: {v:.2f}" for i, (v, a) in enumerate(zip(values, angles))]
+                else:
+                    labels = [f"P{i + 1}\nΔlogdet: {v:.2f}" for i, v in enumerate(values)]
             else:
                 values = candidates_df['Quality'].values
                 max_val = values.max() if len(values) > 0 and values.max() > 0 else 1.0
                 labels = [f"P{i + 1}\nQ: {v / max_val * 100:.1f}%" for i, v in enumerate(values)]
 
-            plotter.add_point_labels(candidate_points, labels,
-                                     font_size=viz_settings['label_font_size'],
-                                     shape_color="#E9E1D4", always_visible=True, shadow=True)
+        self.scene.show(coords, scalars, candidate_coords, labels, viz_settings, scalar_title)
 
         if not preserve_camera: plotter.reset_camera()
+        self.scene.update_lod()
         plotter.render()
 
     def display_kmeans_preview(self, coords, cluster_labels):
@@ -270,44 +404,16 @@ class MainWindow(QMainWindow):
         plotter = self.visualization_panel.vtk_widget
         viz_settings = self.visualization_panel.get_settings()
 
-        cloud = pv.PolyData(coords)
-        cloud["Cluster"] = cluster_labels
-        plotter.add_mesh(cloud, scalars="Cluster", cmap="plasma",
-                         point_size=viz_settings['cloud_point_size'],
-                         render_points_as_spheres=True,
-                         scalar_bar_args={'title': "Cluster ID"})
+        # Same cloud and level of detail as the strain view, colored by cluster ID
+        self.scene.show_clusters(coords, cluster_labels, viz_settings)
         plotter.add_text("K-Means Preview. Press 'Continue' to select points.",
                          position='upper_left', font_size=14)
         plotter.reset_camera()
+        self.scene.update_lod()
         plotter.render()
 
-    def update_candidate_table(self, csv_filepath):
-        if not os.path.exists(csv_filepath): return
-        try:
-            df = pd.read_csv(csv_filepath)
-        except Exception as e:
-            print(f"Error reading candidate CSV for table: {e}")
-            return
-
-        self.candidate_table.clear()
-        self.candidate_table.setRowCount(len(df))
-        self.candidate_table.setColumnCount(len(df.columns))
-        self.candidate_table.setHorizontalHeaderLabels(df.columns.tolist())
-
-        for row_idx, row_data in df.iterrows():
-            for col_idx, col_name in enumerate(df.columns):
-                cell_value = row_data[col_name]
-                if pd.isna(cell_value):
-                    item_text = "N/A"
-                elif isinstance(cell_value, (int, np.integer)):
-                    item_text = f"{cell_value}"
-                elif isinstance(cell_value, (float, np.floating)):
-                    item_text = f"{cell_value:.4g}"
-                else:
-                    item_text = str(cell_value)
-                item = QTableWidgetItem(item_text)
-                item.setTextAlignment(Qt.AlignCenter)
-                self.candidate_table.setItem(row_idx, col_idx, item)
+    def update_candidate_table(self, candidates_df):
+        self.candidate_model.set_dataframe(candidates_df)
 
         # Auto-size columns and adjust dock width so all columns are visible
         header = self.candidate_table.horizontalHeader()
@@ -317,34 +423,21 @@ class MainWindow(QMainWindow):
         self.candidate_table_dock.setMinimumWidth(total_width)
         self.candidate_table_dock.resize(total_width, self.candidate_table_dock.height())
 
-    def on_candidate_table_cell_clicked(self, row, column):
+    def on_candidate_table_cell_clicked(self, index):
         """
         Fly the camera to the XYZ position of the clicked candidate row.
 
         Behavior:
-        - Reads the table's column headers to locate the 'X', 'Y', 'Z' columns (robust to column order).
-        - Parses the numeric values from the clicked row (ignores empty / N/A cells).
+        - Reads the 'X', 'Y', 'Z' values of the clicked row from the DataFrame behind the table
+          (robust to column order and free of text formatting round-off).
         - Uses PyVista's fly_to for a smooth camera transition; falls back to setting the
           camera focal point if fly_to is unavailable in the installed version.
         """
         try:
-            # Determine indices of coordinate columns by header name, so this logic
-            # remains valid even if the table column order changes in the future.
-            headers = [self.candidate_table.horizontalHeaderItem(i).text() for i in range(self.candidate_table.columnCount())]
-            x_idx = headers.index('X') if 'X' in headers else None
-            y_idx = headers.index('Y') if 'Y' in headers else None
-            z_idx = headers.index('Z') if 'Z' in headers else None
-            if x_idx is None or y_idx is None or z_idx is None:
-                return
-
-            # Helper to get and safely convert a cell's text to float.
-            def get_val(col_idx):
-                item = self.candidate_table.item(row, col_idx)
-                return float(item.text()) if item and item.text() not in (None, '', 'N/A') else None
-
-            x = get_val(x_idx); y = get_val(y_idx); z = get_val(z_idx)
-            if x is None or y is None or z is None:
+            xyz = self.candidate_model.row_coordinates(index.row())
+            if xyz is None:
                 return
+            x, y, z = xyz
 
             plotter = self.visualization_panel.vtk_widget
             try:
@@ -355,18 +448,22 @@ class MainWindow(QMainWindow):
                 cam = plotter.camera
                 cam.focal_point = (float(x), float(y), float(z))
                 plotter.render()
+            self.scene.update_lod()
         except Exception:
             pass
 
     def toggle_candidate_table(self, checked):
         if checked:
             self.candidate_table_dock.show()
-            output_path = os.path.join(self.project_dir, "strain_candidate_points.csv")
-            self.update_candidate_table(output_path)
         else:
             self.candidate_table_dock.hide()
 
     def closeEvent(self, event):
         """Ensure the application and any VTK elements close cleanly."""
+        self._stop_engine_thread()
+        # The threads of cancelled runs must exit before the window that owns them is destroyed
+        for thread in list(self.stopping_threads):
+            thread.wait()
+        self.export_queue.wait()
         self.visualization_panel.vtk_widget.close()
         event.accept()
\ No newline at end of file
@@ -0,0 +1,374 @@
+# File: app/pipeline.py
+"""
+The strain gage positioning pipeline without any Qt dependency: loading and combining the
+input files, the strain/quality computations, and the dispatch to the selection strategies.
+
+AnalysisEngine runs it on a worker thread for the GUI; app/cli.py runs it in batch.
+"""
+
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from . import computation
+from . import geodesic
+from . import selection_strategies
+from .instrumentation import NULL_TRACE
+
+# Parameter set of a run, with the same keys and defaults as ControlPanel.get_parameters().
+DEFAULT_PARAMETERS = {
+    "measurement_mode": "Rosette",
+    "angle_method": "Closed-Form (Exact)",
+    "quality_mode": "Signal-Noise Ratio: |ε|/(σ+1e-12)",
+    "agg_method": "Max",
+    "precision": "Double (float64)",
+    "precision_validation": False,
+    "uniformity_radius": 10.0,
+    "neighborhood_metric": "Euclidean (Straight Line)",
+    "strategy": "Max Quality (Greedy Search)",
+    "candidate_count": 10,
+    "min_distance": 10.0,
+    "quality_percentile": 75.0,
+    "strain_threshold_enabled": False,
+    "strain_threshold_value_microstrain": 10.0,
+    "strain_threshold_agg": "Max",
+    "gradient_mode": "Max Local Std",
+    "kmeans_backend": "Full K-Means",
+    "roi_center": np.zeros(3),
+    "roi_radius": 50.0,
+    "write_trace": False,
+}
+
+# Strategies that keep a minimum distance between picks
+_MIN_DISTANCE_STRATEGIES = (
+    "Max Quality (Greedy Search)",
+    "Greedy Gradient Search",
+    "Region of Interest (ROI) Search",
+    "Max Observability (D-Optimal)",
+)
+
+
+def _no_report(stage, fraction=0.0):
+    """Default stage callback of compute_quality: progress is not reported."""
+
+
+def _node_hash(nodes):
+    """Returns a digest of the node ID sequence used to compare files cheaply."""
+    return hashlib.sha1(np.ascontiguousarray(nodes, dtype=np.int64).tobytes()).hexdigest()
+
+
+def _align_to_reference(ref_nodes, ref_coords, nodes, coords, fpath):
+    """
+    Returns the row order that maps a file's nodes onto the reference node order.
+    Returns None when the file already matches the reference order exactly.
+    Raises ValueError if the node sets or coordinates disagree.
+    """
+    if len(nodes) == len(ref_nodes) and _node_hash(nodes) == _node_hash(ref_nodes):
+        order = None
+    else:
+        if len(nodes) != len(ref_nodes):
+            raise ValueError(
+                f"Node count mismatch in '{os.path.basename(fpath)}': "
+                f"{len(nodes)} nodes vs. {len(ref_nodes)} in the first file.")
+        # Same size, different sequence: reorder by node ID if the sets are identical
+        sorter = np.argsort(nodes, kind='stable')
+        pos = np.searchsorted(nodes, ref_nodes, sorter=sorter)
+        pos = np.clip(pos, 0, len(nodes) - 1)
+        order = sorter[pos]
+        if not np.array_equal(nodes[order], ref_nodes):
+            raise ValueError(
+                f"Node IDs in '{os.path.basename(fpath)}' do not match the first file. "
+                f"All files must contain the same set of nodes.")
+
+    aligned_coords = coords if order is None else coords[order]
+    if not np.allclose(aligned_coords, ref_coords, rtol=1e-6, atol=1e-6):
+        raise ValueError(
+            f"Node coordinates in '{os.path.basename(fpath)}' differ from the first file. "
+            f"All files must come from the same mesh.")
+    return order
+
+
+def load_and_combine_data(filepaths, dtype=np.float64):
+    """
+    Loads data from multiple files concurrently and combines their strain tensors.
+
+    Every file is checked against the first one: node IDs are compared by hash and,
+    if they only differ in order, the file is reordered by node ID. Files with a
+    different node set or different coordinates are rejected.
+
+    The strain tensors of all load cases are written into one contiguous array of
+    shape (n_load_cases, n_nodes, 3) of the given dtype; the returned dictionary holds
+    views into it.
+    """
+    if not filepaths:
+        raise ValueError("No input files provided.")
+
+    # Read all files in parallel (parsing is I/O and C-parser bound)
+    load = partial(computation.load_data, dtype=dtype)
+    max_workers = max(1, min(len(filepaths), os.cpu_count() or 1))
+    if max_workers == 1:
+        loaded = [load(fpath) for fpath in filepaths]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            loaded = list(pool.map(load, filepaths))
+
+    # The first file provides the base node and coordinate data
+    nodes, coords, _ = loaded[0]
+
+    total_cases = sum(len(strain_tensors) for _, _, strain_tensors in loaded)
+    combined = np.empty((total_cases, len(nodes), 3), dtype=dtype)
+
+    measurement_idx = 0
+    for fpath, (file_nodes, file_coords, strain_tensors) in zip(filepaths, loaded):
+        order = _align_to_reference(nodes, coords, file_nodes, file_coords, fpath)
+        for tensor in strain_tensors.values():
+            combined[measurement_idx] = tensor if order is None else tensor[order]
+            measurement_idx += 1
+
+    combined_strain_tensors = {i: combined[i] for i in range(total_cases)}
+    return nodes, coords, combined_strain_tensors
+
+
+def quality_key(params):
+    """
+    The parameters that affect the aggregated quality result. Parameters used only during
+    candidate selection are excluded, so runs that differ only in those can share it.
+    """
+    threshold_enabled = bool(params.get("strain_threshold_enabled", False))
+    return (
+        params.get("precision", "Double (float64)"),
+        params["measurement_mode"],
+        params.get("angle_method", "Closed-Form (Exact)") if params["measurement_mode"] == "Uniaxial" else None,
+        params["quality_mode"],
+        float(params["uniformity_radius"]),
+        params.get("neighborhood_metric", "Euclidean (Straight Line)"),
+        params["agg_method"],
+        threshold_enabled,
+        float(params.get("strain_threshold_value_microstrain", 0.0)) if threshold_enabled else None,
+        params.get("strain_threshold_agg", "Max") if threshold_enabled else None,
+    )
+
+
+def compute_quality(nodes, coords, strain_tensors, params, report_stage=_no_report, trace=NULL_TRACE):
+    """
+    Runs the core strain and quality computations.
+
+    Args:
+        nodes, coords, strain_tensors: As returned by load_and_combine_data.
+        params (dict): Run parameters (see DEFAULT_PARAMETERS).
+        report_stage (callable, optional): Called as report_stage(stage, fraction) at every
+            stage and load case boundary ("normals", "neighborhoods", "aggregation"). It may
+            raise to abort the computation.
+        trace (instrumentation.PipelineTrace, optional): Receives the sizes of the
+            intermediate arrays of each stage.
+
+    Returns:
+        tuple: (agg_quality_df, current_scalars, kept_rows) where kept_rows are the node
+        rows that passed the strain threshold filter (rows of agg_quality_df).
+    """
+    n_cases = len(strain_tensors)
+
+    # --- Stage: normal strains (per load case) ---
+    angle_resolution = None
+    if params["measurement_mode"] == "Rosette":
+        angles = [0]
+    else:  # Uniaxial
+        angle_resolution = computation.ANGLE_METHODS[
+            params.get("angle_method", "Closed-Form (Exact)")]
+        interval = computation.LEGACY_ANGLE_INTERVAL
+        angles = [0] + list(range(interval, 180, interval))
+    use_closed_form = params["measurement_mode"] == "Uniaxial" and angle_resolution != "grid"
+
+    strains_list = []
+    best_angles_list = []
+    for i, tensor in enumerate(strain_tensors.values()):
+        report_stage("normals", i / n_cases)
+        # All internal calculations use microstrain
+        strain_data = tensor
+        if params["measurement_mode"] == "Rosette":
+            # von Mises equivalent strain calculation
+            vm_strains = np.sqrt(
+                strain_data[:, 0] ** 2 - strain_data[:, 0] * strain_data[:, 1] + strain_data[:, 1] ** 2 + 3 * (
+                            strain_data[:, 2] ** 2)
+            )
+            strains_list.append(vm_strains.reshape(-1, 1))
+        elif use_closed_form:
+            best_strains, best_angles = computation.compute_principal_direction(strain_data, angle_resolution)
+            strains_list.append(best_strains.reshape(-1, 1))
+            best_angles_list.append(best_angles)
+        else:
+            strains_list.append(computation.compute_normal_strains(strain_data, angles))
+    trace.record_arrays(normal_strains=strains_list, best_angles=best_angles_list)
+
+    # --- Stage: neighbourhoods (geometry only, shared by all load cases) ---
+    report_stage("neighborhoods")
+    neighbors = computation.compute_neighborhoods(
+        coords, params["uniformity_radius"], params.get("neighborhood_metric", "Euclidean (Straight Line)"))
+    trace.record_arrays(neighborhoods=neighbors)
+
+    # --- Stage: quality metrics and aggregation ---
+    quality_dfs = []
+    for i, strains_i in enumerate(strains_list):
+        report_stage("aggregation", i / n_cases)
+        df = computation.compute_quality_metrics(
+            nodes, coords, strains_i, angles,
+            params["quality_mode"], params["uniformity_radius"], neighbors=neighbors,
+            best_angles=best_angles_list[i] if use_closed_form else None
+        )
+        quality_dfs.append(df)
+
+    strains_stack = np.stack([np.max(np.abs(s), axis=1) for s in strains_list], axis=1)
+    agg_method = params["agg_method"]
+    current_scalars = np.max(strains_stack, axis=1) if agg_method == "Max" else np.mean(strains_stack, axis=1)
+
+    # Threshold metric across load cases
+    thresh_agg = params.get("strain_threshold_agg", "Max")
+    if thresh_agg == "Average":
+        threshold_metric = np.mean(strains_stack, axis=1)
+    else:
+        threshold_metric = np.max(strains_stack, axis=1)
+
+    agg_quality_df = computation.aggregate_quality_metrics(quality_dfs, params["agg_method"])
+    kept_rows = np.arange(len(agg_quality_df))
+    trace.record_arrays(quality_frames=quality_dfs, aggregated=agg_quality_df, current_scalars=current_scalars)
+
+    # Apply microstrain threshold filtering if enabled
+    if params.get("strain_threshold_enabled", False) and threshold_metric is not None:
+        # threshold_metric is in the same unit as input tensors after conversion depending on display mode
+        # Convert user-provided microstrain threshold into the working unit
+        user_thresh_micro = float(params.get("strain_threshold_value_microstrain", 0.0))
+        threshold_value = user_thresh_micro  # compare in microstrain
+
+        # Filter DataFrame rows where the metric is below threshold
+        mask = threshold_metric >= threshold_value
+        if not np.all(mask):
+            agg_quality_df = agg_quality_df.loc[mask].reset_index(drop=True)
+            kept_rows = np.flatnonzero(mask)
+
+    return agg_quality_df, current_scalars, kept_rows
+
+
+def _surface_graph(coords, params):
+    """The surface graph that exclusion zones are measured on, or None for straight-line distances."""
+    metric = params.get("neighborhood_metric", "Euclidean (Straight Line)")
+    if computation.NEIGHBORHOOD_METRICS[metric] == "geodesic" and params["min_distance"] > 0:
+        return geodesic.get_surface_graph(coords)
+    return None
+
+
+def _select_d_optimal(agg_quality_df, strain_tensors, kept_rows, params, surface=None):
+    """
+    Builds the gauge sensitivities of the kept nodes and runs the D-optimal selection.
+    A rosette places its 0/45/90 grids together. A uniaxial gauge has its orientation
+    optimized at the resolution of the quality metrics' angle method (continuous for the
+    closed form, its step for the stepped and legacy methods). The reported 'Gauge_Angle'
+    maximizes the joint load-case information, so it can still differ from the table's
+    principal strain angle of the same node.
+    """
+    if params["measurement_mode"] == "Rosette":
+        angles = [0, 45, 90]
+        sensitivity = computation.compute_gauge_sensitivities(strain_tensors, angles, rows=kept_rows)
+        return selection_strategies.select_candidates_d_optimal(
+            agg_quality_df, sensitivity, params["min_distance"], params["candidate_count"],
+            angles=angles, block=True, surface=surface
+        )
+
+    angle_step = computation.ANGLE_METHODS[params.get("angle_method", "Closed-Form (Exact)")]
+    if angle_step == "grid":
+        angle_step = computation.LEGACY_ANGLE_INTERVAL
+    basis = computation.compute_gauge_sensitivity_basis(strain_tensors, rows=kept_rows)
+    return selection_strategies.select_candidates_d_optimal(
+        agg_quality_df, basis, params["min_distance"], params["candidate_count"],
+        surface=surface, oriented=True, angle_step=angle_step
+    )
+
+
+def select_candidates(agg_quality_df, coords, params, strain_tensors=None, kept_rows=None):
+    """Dispatches to the selection strategy named by params["strategy"]."""
+    strategy = params["strategy"]
+    candidate_count = params["candidate_count"]
+    surface = _surface_graph(coords, params) if strategy in _MIN_DISTANCE_STRATEGIES else None
+
+    # A dispatch dictionary maps the strategy string to the correct function call
+    strategy_functions = {
+        "Max Quality (Greedy Search)":
+            lambda: selection_strategies.select_candidates_quality_greedy(
+                agg_quality_df, params["min_distance"], candidate_count, surface
+            ),
+        "Max Coverage (K-Means)":
+            lambda: selection_strategies.select_candidates_kmeans(
+                agg_quality_df, agg_quality_df[["X", "Y", "Z"]].values, candidate_count,
+                params.get("kmeans_backend", "Full K-Means")
+            ),
+        "Greedy Gradient Search":
+            lambda: selection_strategies.select_candidates_gradient_greedy(
+                agg_quality_df,
+                params["min_distance"],
+                candidate_count,
+                True if params.get("gradient_mode", "Max Local Std").startswith("Max") else False,
+                surface
+            ),
+        "Quality-Filtered K-Means":
+            lambda: selection_strategies.select_candidates_filtered_kmeans(
+                agg_quality_df, candidate_count, params["quality_percentile"],
+                params.get("kmeans_backend", "Full K-Means")
+            ),
+        "Region of Interest (ROI) Search":
+            lambda: selection_strategies.select_candidates_roi(
+                agg_quality_df, params["roi_center"], params["roi_radius"],
+                params["min_distance"], candidate_count, surface
+            ),
+        "Max Observability (D-Optimal)":
+            lambda: _select_d_optimal(agg_quality_df, strain_tensors, kept_rows, params, surface),
+    }
+
+    if strategy in strategy_functions:
+        return strategy_functions[strategy]()
+    else:
+        raise ValueError(f"Unknown selection strategy: {strategy}")
+
+
+def precision_deviation(reference, reference_candidates, result, candidates):
+    """
+    Compares a reduced-precision quality result and selection with its float64 reference.
+
+    reference and result are (agg_quality_df, current_scalars, kept_rows) tuples of the same run.
+    Rows are matched by node, since the strain threshold may keep a slightly different set.
+
+    Returns:
+        str: A short report of the max absolute/relative deviation per metric.
+    """
+    ref_df, ref_scalars, ref_rows = reference
+    df, scalars, rows = result
+    _, ref_idx, idx = np.intersect1d(ref_rows, rows, assume_unique=True, return_indices=True)
+
+    def deviation(ref_values, values):
+        ref_values = np.asarray(ref_values, dtype=np.float64)
+        diff = np.abs(np.asarray(values, dtype=np.float64) - ref_values)
+        scale = np.nanmax(np.abs(ref_values)) if ref_values.size else 0.0
+        max_diff = np.nanmax(diff) if diff.size else 0.0
+        return max_diff, (max_diff / scale if scale > 0 else 0.0)
+
+    lines = []
+    abs_dev, rel_dev = deviation(ref_scalars, scalars)
+    lines.append(f"Strain field: max |Δ| = {abs_dev:.3g} με (relative {rel_dev:.2e})")
+    for column in ("Best_Strain", "Local_Std", "Quality"):
+        abs_dev, rel_dev = deviation(ref_df[column].values[ref_idx], df[column].values[idx])
+        lines.append(f"{column}: max |Δ| = {abs_dev:.3g} (relative {rel_dev:.2e})")
+
+    ref_angles = ref_df["Best_Angle"].values[ref_idx]
+    if np.isfinite(ref_angles).any():
+        angle_diff = np.abs(df["Best_Angle"].values[idx].astype(np.float64) - ref_angles) % 180.0
+        lines.append(f"Best_Angle: max |Δ| = {np.nanmax(np.minimum(angle_diff, 180.0 - angle_diff)):.3g}°")
+
+    if len(ref_rows) != len(rows):
+        lines.append(f"Strain threshold kept {len(rows)} nodes (float64: {len(ref_rows)}).")
+
+    same = (reference_candidates.empty and candidates.empty) or (
+        "Node" in candidates and "Node" in reference_candidates
+        and np.array_equal(reference_candidates["Node"].values, candidates["Node"].values))
+    lines.append("Selected candidates: " + ("identical to float64." if same else "differ from float64."))
+    return "\n".join(lines)
@@ -0,0 +1,376 @@
+# File: app/scene_model.py
+"""
+Persistent scene for the strain point cloud and the candidate markers.
+
+The point cloud, the candidate glyphs and their actors are created once and then
+updated in place: new scalars replace the data array of the existing cloud, display
+settings are written to the existing actor properties and lookup table, and the
+candidate markers reuse their PolyData. Display tweaks therefore never rebuild or
+re-upload the cloud geometry.
+
+Very large clouds use level-of-detail (LOD) rendering: the overview shows one point per
+voxel (colored by the voxel maximum, so hot spots stay visible) and, when the camera is
+zoomed in, the full-resolution nodes around the visible region replace it. Candidate
+markers are always drawn at their exact positions and picks can be snapped to the
+nearest real node with snap_to_node. The K-Means preview (show_clusters) uses the same
+cloud and LOD, colored by cluster ID.
+"""
+import numpy as np
+import pyvista as pv
+from scipy.spatial import cKDTree
+
+# ---- Level-of-detail settings ---------------------------------------------------------
+LOD_POINT_THRESHOLD = 500000     # clouds with more nodes than this use LOD rendering
+LOD_TARGET_POINTS = 150000       # approximate point count of the decimated overview
+LOD_DETAIL_MAX_POINTS = 1000000  # full-resolution points streamed in for a zoomed-in view
+LOD_ZOOM_FRACTION = 0.3          # detail is shown when the visible radius is below this fraction of the model radius
+
+
+def voxel_decimate(coords, target_points, max_iterations=6):
+    """
+    Groups points into a regular voxel grid sized to keep roughly target_points voxels.
+
+    Returns:
+        tuple: (representative_idx, order, starts)
+            representative_idx: index of one real node per voxel (used as its position),
+            order: point indices sorted by voxel,
+            starts: start offset of each voxel in order (for np.*.reduceat).
+    """
+    coords = np.asarray(coords, dtype=float)
+    lo = coords.min(axis=0)
+    extent = coords.max(axis=0) - lo
+    # Flat models (plates) have no volume; a thin floor keeps the first voxel size finite
+    extent = np.maximum(extent, 1e-3 * max(float(extent.max()), 1e-12))
+
+    # Start from a volume-based estimate and adapt, since nodes usually sit on surfaces
+    h = float(np.prod(extent) / max(target_points, 1)) ** (1.0 / 3.0)
+    for _ in range(max_iterations):
+        ijk = np.floor((coords - lo) / h).astype(np.int64)
+        dims = ijk.max(axis=0) + 1
+        keys = (ijk[:, 0] * dims[1] + ijk[:, 1]) * dims[2] + ijk[:, 2]
+        n_voxels = len(np.unique(keys))
+        if 0.5 * target_points <= n_voxels <= 1.5 * target_points:
+            break
+        # Surface-like scaling: voxel count ~ 1 / h^2
+        h *= np.sqrt(n_voxels / float(target_points))
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    return order[starts], order, starts
+
+
+class StrainSceneModel:
+    """Owns the actors of the strain view on a PyVista plotter and updates them in place."""
+
+    def __init__(self, plotter):
+        self.pl = plotter
+        self._coords = None
+        self.cloud = None
+        self.cloud_actor = None
+        self.scalar_bar_title = None
+        self.candidate_points = None
+        self.candidate_actor = None
+        self.label_actor = None
+        self._labels = []
+        self._label_font_size = None
+
+        # Level-of-detail state
+        self.lod_enabled = True
+        self._lod = None              # (representative_idx, order, starts) when LOD is active
+        self._scalars = None
+        self._settings = None
+        self._tree = None
+        self.detail_cloud = None
+        self.detail_actor = None
+        self._detail_idx = None
+        self._cluster_view = False    # True while the cloud shows K-Means cluster IDs
+
+        # Re-evaluate the level of detail whenever a camera interaction ends
+        iren = getattr(self.pl, "iren", None)
+        if iren is not None:
+            try:
+                iren.add_observer("EndInteractionEvent", lambda *_: self.update_lod())
+            except Exception:
+                pass
+
+    # ---- Public API -----------------------------------------------------
+
+    def has_cloud(self):
+        return self.cloud_actor is not None
+
+    def reset(self):
+        """Forgets all actors. Call this after the plotter has been cleared by someone else."""
+        self._coords = None
+        self.cloud = None
+        self.cloud_actor = None
+        self.scalar_bar_title = None
+        self.candidate_points = None
+        self.candidate_actor = None
+        self.label_actor = None
+        self._labels = []
+        self._label_font_size = None
+        self._lod = None
+        self._scalars = None
+        self._tree = None
+        self.detail_cloud = None
+        self.detail_actor = None
+        self._detail_idx = None
+        self._cluster_view = False
+
+    def lod_active(self):
+        return self._lod is not None
+
+    def show(self, coords, scalars, candidate_coords, labels, settings, scalar_title):
+        """
+        Shows the strain cloud with its candidates.
+
+        The cloud geometry is only rebuilt when the node coordinates change; otherwise the
+        scalars are swapped on the existing mesh.
+
+        Args:
+            coords (np.ndarray): (n, 3) node coordinates.
+            scalars (np.ndarray): (n,) values used for coloring.
+            candidate_coords (np.ndarray): (k, 3) candidate coordinates (k may be 0).
+            labels (list): One label string per candidate.
+            settings (dict): VisualizationPanel.get_settings() output.
+            scalar_title (str): Title of the scalar bar.
+        """
+        self._settings = settings
+        self.lod_enabled = settings.get('lod_enabled', True)
+        if (self.has_cloud() and not self._cluster_view and self._same_geometry(coords)
+                and self._lod_matches(len(coords))):
+            self._scalars = np.asarray(scalars)
+            self.cloud["Scalars"] = self._overview_scalars()
+            if self.detail_cloud is not None and self._detail_idx is not None:
+                self.detail_cloud["Scalars"] = self._scalars[self._detail_idx]
+        else:
+            self._cluster_view = False
+            self._build_cloud(coords, scalars, settings, scalar_title)
+
+        if scalar_title != self.scalar_bar_title:
+            self._replace_scalar_bar(scalar_title)
+
+        self.set_candidates(candidate_coords, labels, settings)
+        self.apply_settings(settings)
+
+    def show_clusters(self, coords, cluster_labels, settings):
+        """
+        Shows the K-Means preview: every node colored by its cluster ID, without candidates.
+        Large clouds are decimated like the strain cloud; each voxel shows the cluster of
+        its representative node.
+        """
+        self._settings = settings
+        self.lod_enabled = settings.get('lod_enabled', True)
+        self._cluster_view = True
+        self._build_cloud(coords, cluster_labels, settings, "Cluster ID")
+        self.set_candidates(np.empty((0, 3)), [], settings)
+        self.apply_settings(settings)
+
+    def set_candidates(self, candidate_coords, labels, settings):
+        """Updates the candidate glyphs in place and rebuilds their labels."""
+        candidate_coords = np.asarray(candidate_coords, dtype=float).reshape(-1, 3)
+
+        if len(candidate_coords) == 0:
+            if self.candidate_actor is not None:
+                self.candidate_actor.SetVisibility(False)
+            self._set_labels([], settings['label_font_size'])
+            return
+
+        if self.candidate_points is None:
+            self.candidate_points = pv.PolyData(candidate_coords)
+            self.candidate_actor = self.pl.add_mesh(
+                self.candidate_points, color="magenta",
+                point_size=settings['candidate_point_size'],
+                render_points_as_spheres=True)
+        elif self.candidate_points.n_points == len(candidate_coords):
+            self.candidate_points.points = candidate_coords
+        else:
+            self.candidate_points.copy_from(pv.PolyData(candidate_coords))
+
+        self.candidate_actor.SetVisibility(True)
+        self._set_labels(list(labels), settings['label_font_size'])
+
+    def apply_settings(self, settings):
+        """Writes point sizes, color limits and out-of-range colors to the existing actors."""
+        if not self.has_cloud():
+            return
+
+        self._settings = settings
+        if settings.get('lod_enabled', True) != self.lod_enabled:
+            # Switching LOD on/off changes the overview geometry
+            self.lod_enabled = settings.get('lod_enabled', True)
+            if not self._lod_matches(len(self._coords)):
+                title = self.scalar_bar_title
+                self._build_cloud(self._coords, self._scalars, settings, title)
+
+        for actor in (self.cloud_actor, self.detail_actor):
+            if actor is None:
+                continue
+            actor.prop.point_size = settings['cloud_point_size']
+            if self._cluster_view:
+                # Cluster IDs keep their own color range
+                continue
+            actor.mapper.scalar_range = (settings['clim_min'], settings['clim_max'])
+            lut = actor.mapper.lookup_table
+            lut.below_range_color = settings['below_color']
+            lut.above_range_color = settings['above_color']
+
+        if self.candidate_actor is not None:
+            self.candidate_actor.prop.point_size = settings['candidate_point_size']
+
+        if settings['label_font_size'] != self._label_font_size:
+            self._set_labels(self._labels, settings['label_font_size'])
+
+    def update_lod(self):
+        """
+        Switches between the decimated overview and full-resolution detail for the current
+        camera. Detail is streamed in for the nodes around the visible region when zoomed in.
+        """
+        if not self.lod_active() or self.cloud_actor is None:
+            return
+
+        camera = self.pl.camera
+        focal = np.asarray(camera.focal_point, dtype=float)
+        if camera.parallel_projection:
+            half_height = camera.parallel_scale
+        else:
+            distance = np.linalg.norm(np.asarray(camera.position, dtype=float) - focal)
+            half_height = distance * np.tan(np.radians(camera.view_angle) / 2.0)
+        # Radius of a sphere enclosing the visible rectangle (wide aspect ratios included)
+        visible_radius = 1.1 * half_height * np.sqrt(1.0 + (16.0 / 9.0) ** 2)
+
+        lo = self._coords.min(axis=0)
+        hi = self._coords.max(axis=0)
+        model_radius = 0.5 * np.linalg.norm(hi - lo)
+
+        detail_idx = None
+        if visible_radius < LOD_ZOOM_FRACTION * model_radius:
+            if self._tree is None:
+                self._tree = cKDTree(self._coords)
+            idx = np.asarray(self._tree.query_ball_point(focal, visible_radius), dtype=int)
+            if 0 < len(idx) <= LOD_DETAIL_MAX_POINTS:
+                detail_idx = np.sort(idx)
+
+        if detail_idx is None:
+            self._remove_detail()
+            self.cloud_actor.SetVisibility(True)
+        else:
+            self._show_detail(detail_idx)
+            self.cloud_actor.SetVisibility(False)
+        self.pl.render()
+
+    def snap_to_node(self, point):
+        """Returns the coordinates of the real node nearest to a picked point."""
+        if self._coords is None or point is None:
+            return point
+        if self._tree is None:
+            self._tree = cKDTree(self._coords)
+        _, idx = self._tree.query(np.asarray(point, dtype=float).reshape(3))
+        return self._coords[int(idx)]
+
+    # ---- Internal helpers -----------------------------------------------
+
+    def _lod_matches(self, n_points):
+        wants_lod = self.lod_enabled and n_points > LOD_POINT_THRESHOLD
+        return wants_lod == self.lod_active()
+
+    def _overview_scalars(self):
+        """
+        Scalars of the overview cloud: all values, or under LOD the maximum per voxel
+        (the representative node's cluster ID in the K-Means preview).
+        """
+        if self._lod is None:
+            return self._scalars
+        if self._cluster_view:
+            return self._scalars[self._lod[0]]
+        _, order, starts = self._lod
+        return np.maximum.reduceat(self._scalars[order], starts)
+
+    def _show_detail(self, detail_idx):
+        self._detail_idx = detail_idx
+        detail = pv.PolyData(self._coords[detail_idx])
+        detail["Scalars"] = self._scalars[detail_idx]
+        if self.detail_actor is None:
+            settings = self._settings
+            self.detail_cloud = detail
+            self.detail_actor = self.pl.add_mesh(
+                self.detail_cloud, scalars="Scalars",
+                point_size=settings['cloud_point_size'],
+                render_points_as_spheres=True,
+                show_scalar_bar=False,
+                **self._color_args(settings)
+            )
+        else:
+            self.detail_cloud.copy_from(detail)
+            self.detail_actor.SetVisibility(True)
+
+    def _remove_detail(self):
+        if self.detail_actor is not None:
+            self.pl.remove_actor(self.detail_actor)
+        self.detail_actor = None
+        self.detail_cloud = None
+        self._detail_idx = None
+
+    def _same_geometry(self, coords):
+        if coords is self._coords:
+            return True
+        return (self._coords is not None and coords.shape == self._coords.shape
+                and np.array_equal(coords, self._coords))
+
+    def _build_cloud(self, coords, scalars, settings, scalar_title):
+        if self.cloud_actor is not None:
+            self.pl.remove_actor(self.cloud_actor)
+        if self.scalar_bar_title is not None:
+            self._remove_scalar_bar()
+
+        self._remove_detail()
+        self._coords = coords
+        self._scalars = np.asarray(scalars)
+        self._tree = None
+        if self.lod_enabled and len(coords) > LOD_POINT_THRESHOLD:
+            self._lod = voxel_decimate(coords, LOD_TARGET_POINTS)
+            self.cloud = pv.PolyData(coords[self._lod[0]])
+        else:
+            self._lod = None
+            self.cloud = pv.PolyData(coords)
+        self.cloud["Scalars"] = self._overview_scalars()
+        self.cloud_actor = self.pl.add_mesh(
+            self.cloud, scalars="Scalars",
+            point_size=settings['cloud_point_size'],
+            render_points_as_spheres=True,
+            scalar_bar_args={'title': scalar_title},
+            **self._color_args(settings)
+        )
+        self.scalar_bar_title = scalar_title
+
+    def _color_args(self, settings):
+        """Colormap arguments of the cloud actors: strain limits, or the cluster ID range."""
+        if self._cluster_view:
+            return {'cmap': "plasma", 'clim': (float(np.min(self._scalars)), float(np.max(self._scalars)))}
+        return {'cmap': "jet", 'clim': (settings['clim_min'], settings['clim_max']),
+                'below_color': settings['below_color'], 'above_color': settings['above_color']}
+
+    def _remove_scalar_bar(self):
+        try:
+            self.pl.remove_scalar_bar(self.scalar_bar_title)
+        except Exception:
+            pass
+        self.scalar_bar_title = None
+
+    def _replace_scalar_bar(self, scalar_title):
+        self._remove_scalar_bar()
+        self.pl.add_scalar_bar(title=scalar_title, mapper=self.cloud_actor.mapper)
+        self.scalar_bar_title = scalar_title
+
+    def _set_labels(self, labels, font_size):
+        if self.label_actor is not None:
+            self.pl.remove_actor(self.label_actor)
+            self.label_actor = None
+
+        self._labels = labels
+        self._label_font_size = font_size
+        if labels and self.candidate_points is not None:
+            self.label_actor = self.pl.add_point_labels(
+                self.candidate_points, labels, font_size=font_size,
+                shape_color="#E9E1D4", always_visible=True, shadow=True)
@@ -1,19 +1,173 @@
 # File: app/selection_strategies.py
 
+import hashlib
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from scipy.spatial import cKDTree
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+# ---- K-Means backends and fit cache (module-level) ------------------------------------
+KMEANS_BACKENDS = ("Full K-Means", "Mini-Batch K-Means", "Subsampled K-Means")
+_KMEANS_RANDOM_STATE = 42
+_KMEANS_SUBSAMPLE_SIZE = 50000     # points used to fit the subsampled backend
+_KMEANS_SUBSAMPLE_PER_CLUSTER = 20  # ...but never fewer than this many per cluster
+_KMEANS_CACHE_SIZE = 4
+_KMEANS_CACHE = OrderedDict()  # (coords digest, n_clusters, backend) -> (labels, centroids)
+_KMEANS_CACHE_LOCK = threading.Lock()  # a cancelled run can still be clustering while a new one starts
+
+
+def clear_kmeans_cache():
+    with _KMEANS_CACHE_LOCK:
+        _KMEANS_CACHE.clear()
+
+
+def _coords_digest(coords):
+    return hashlib.sha1(np.ascontiguousarray(coords, dtype=np.float64).tobytes()).hexdigest()
+
+
+def fit_kmeans(coords, n_clusters, backend="Full K-Means"):
+    """
+    Clusters node coordinates with the requested backend and caches the result.
+
+    The K-Means preview and the "Continue" step cluster the same coordinates, so the
+    second call is served from the cache instead of fitting again.
+
+    Args:
+        coords (np.ndarray): (n, 3) coordinates to cluster.
+        n_clusters (int): Number of clusters.
+        backend (str): One of KMEANS_BACKENDS.
+            - "Full K-Means": sklearn KMeans on all points (reference result).
+            - "Mini-Batch K-Means": sklearn MiniBatchKMeans on all points.
+            - "Subsampled K-Means": KMeans fitted on a random subsample, then every
+              point is assigned to its nearest centroid.
+
+    Returns:
+        tuple: (labels, centroids) as NumPy arrays.
+    """
+    key = (_coords_digest(coords), int(n_clusters), backend)
+    with _KMEANS_CACHE_LOCK:
+        if key in _KMEANS_CACHE:
+            _KMEANS_CACHE.move_to_end(key)
+            return _KMEANS_CACHE[key]
+
+    if backend == "Full K-Means":
+        model = KMeans(n_clusters=n_clusters, random_state=_KMEANS_RANDOM_STATE, n_init='auto').fit(coords)
+        labels = model.labels_
+    elif backend == "Mini-Batch K-Means":
+        model = MiniBatchKMeans(n_clusters=n_clusters, random_state=_KMEANS_RANDOM_STATE, n_init='auto',
+                                batch_size=max(1024, 3 * n_clusters)).fit(coords)
+        labels = model.labels_
+    elif backend == "Subsampled K-Means":
+        sample_size = max(_KMEANS_SUBSAMPLE_SIZE, _KMEANS_SUBSAMPLE_PER_CLUSTER * n_clusters)
+        if sample_size >= len(coords):
+            sample = coords
+        else:
+            rng = np.random.default_rng(_KMEANS_RANDOM_STATE)
+            sample = coords[np.sort(rng.choice(len(coords), size=sample_size, replace=False))]
+        model = KMeans(n_clusters=n_clusters, random_state=_KMEANS_RANDOM_STATE, n_init='auto').fit(sample)
+        labels = model.predict(coords)
+    else:
+        raise ValueError(f"Unknown K-Means backend: {backend}")
+
+    result = (np.asarray(labels), np.asarray(model.cluster_centers_))
+    with _KMEANS_CACHE_LOCK:
+        _KMEANS_CACHE[key] = result
+        _KMEANS_CACHE.move_to_end(key)
+        while len(_KMEANS_CACHE) > _KMEANS_CACHE_SIZE:
+            _KMEANS_CACHE.popitem(last=False)
+    return result
+
+
+def _exclusion_zone(coords, min_distance, surface=None):
+    """
+    Returns a function that gives the positions (into coords) of the points strictly closer
+    than min_distance to the point at a given position. This is a private helper function.
 
+    Distances are straight lines, or geodesic distances along the surface when a
+    geodesic.SurfaceGraph of the model is given (coords may then be any subset of its nodes).
+    """
+    if surface is None:
+        tree = cKDTree(coords)
+
+        def zone(position):
+            neighbors = np.asarray(tree.query_ball_point(coords[position], min_distance), dtype=int)
+            if neighbors.size:
+                distances = np.linalg.norm(coords[neighbors] - coords[position], axis=1)
+                neighbors = neighbors[distances < min_distance]
+            return neighbors
+        return zone
+
+    rows = surface.rows_of(coords)
+    position_of = np.full(len(surface.coords), -1, dtype=int)
+    position_of[rows] = np.arange(len(rows))
 
-def _greedy_selection(df, min_distance, candidate_count):
+    def zone(position):
+        ball_rows, distances = surface.ball(rows[position], min_distance)
+        positions = position_of[ball_rows[distances < min_distance]]
+        return positions[positions >= 0]
+    return zone
+
+
+def _greedy_selection_indices(coords, min_distance, candidate_count, surface=None):
     """
-    Optimized greedy selection using NumPy for faster distance checks.
+    Greedy min-distance selection over points that are already sorted by the desired metric.
+    This is a private helper function.
+
+    A KD-tree is built once; each pick only visits the points inside its exclusion
+    radius, so the cost grows with the number of excluded neighbours instead of with
+    the number of remaining candidates.
+
+    Args:
+        coords (np.ndarray): (n, 3) coordinates in metric order (best first).
+        min_distance (float): The minimum allowable distance between selected candidates.
+        candidate_count (int): The maximum number of candidates to select.
+        surface (geodesic.SurfaceGraph, optional): Measure min_distance along the surface.
+
+    Returns:
+        np.ndarray: Positional indices (into coords) of the selected points, in pick order.
+    """
+    n_points = len(coords)
+    if n_points == 0 or candidate_count <= 0:
+        return np.empty(0, dtype=int)
+
+    # Without an exclusion radius the greedy pick is simply the top of the ranking
+    if min_distance <= 0:
+        return np.arange(min(candidate_count, n_points))
+
+    exclusion_zone = _exclusion_zone(coords, min_distance, surface)
+    available = np.ones(n_points, dtype=bool)
+    selected = []
+
+    cursor = 0
+    while len(selected) < candidate_count:
+        # Advance to the next available point (which has the highest remaining metric value)
+        while cursor < n_points and not available[cursor]:
+            cursor += 1
+        if cursor >= n_points:
+            break
+
+        selected.append(cursor)
+        available[cursor] = False
+
+        # Exclude only the points strictly closer than min_distance to the new pick
+        available[exclusion_zone(cursor)] = False
+
+    return np.asarray(selected, dtype=int)
+
+
+def _greedy_selection(df, min_distance, candidate_count, surface=None):
+    """
+    Greedy selection that enforces a minimum distance between picks.
     This is a private helper function.
 
     Args:
         df (pd.DataFrame): DataFrame sorted by the desired metric (e.g., Quality, Local_Std).
         min_distance (float): The minimum allowable distance between selected candidates.
         candidate_count (int): The maximum number of candidates to select.
+        surface (geodesic.SurfaceGraph, optional): Measure min_distance along the surface.
 
     Returns:
         pd.DataFrame: A DataFrame containing the selected candidate points.
@@ -21,47 +175,23 @@ def _greedy_selection(df, min_distance, candidate_count):
     if df.empty or candidate_count == 0:
         return pd.DataFrame()
 
-    # Use a list of dicts for faster appending compared to DataFrame concatenation
-    selected_rows = []
-    all_coords = df[['X', 'Y', 'Z']].values
-
-    # Keep track of indices that are still available for selection
-    available_indices = np.arange(len(df))
-
-    while len(selected_rows) < candidate_count and len(available_indices) > 0:
-        # Select the first available point (which has the highest metric value)
-        current_idx_in_df = available_indices[0]
-        current_point_coords = all_coords[current_idx_in_df]
-        selected_rows.append(df.iloc[current_idx_in_df].to_dict())
-
-        # If there are still points left to check...
-        if len(available_indices) > 1:
-            # Get the indices of the remaining points
-            remaining_indices = available_indices[1:]
-            # Calculate distances from the new point to all *remaining* available points
-            distances = np.linalg.norm(all_coords[remaining_indices] - current_point_coords, axis=1)
-            # Keep only those points that are far enough away
-            available_indices = remaining_indices[distances >= min_distance]
-        else:
-            # No more points to check, exit the loop
-            break
-
-    return pd.DataFrame(selected_rows)
+    selected = _greedy_selection_indices(df[['X', 'Y', 'Z']].values, min_distance, candidate_count, surface)
+    return df.iloc[selected].reset_index(drop=True)
 
 
-def select_candidates_quality_greedy(df, min_distance, candidate_count):
+def select_candidates_quality_greedy(df, min_distance, candidate_count, surface=None):
     """
     Selects candidates with the highest 'Quality' using a greedy algorithm
     that enforces a minimum distance between points.
     """
     df_sorted = df.sort_values(by='Quality', ascending=False)
-    return _greedy_selection(df_sorted, min_distance, candidate_count)
+    return _greedy_selection(df_sorted, min_distance, candidate_count, surface)
 
 
-def select_candidates_kmeans(df, coords, candidate_count):
+def select_candidates_kmeans(df, coords, candidate_count, backend="Full K-Means"):
     """
     Selects one candidate per cluster, choosing the point with the highest
-    'Quality' from each cluster.
+    'Quality' from each cluster. See fit_kmeans for the available backends.
     """
     if df.empty or candidate_count == 0:
         return pd.DataFrame()
@@ -72,9 +202,9 @@ def select_candidates_kmeans(df, coords, candidate_count):
               f"Reducing cluster count for K-Means.")
         candidate_count = len(df)
 
-    kmeans = KMeans(n_clusters=candidate_count, random_state=42, n_init='auto').fit(coords)
+    labels, _ = fit_kmeans(coords, candidate_count, backend)
     df_with_clusters = df.copy()
-    df_with_clusters['Cluster'] = kmeans.labels_
+    df_with_clusters['Cluster'] = labels
 
     # Find the index of the row with the maximum quality within each cluster
     best_indices = df_with_clusters.groupby('Cluster')['Quality'].idxmax()
@@ -83,7 +213,7 @@ def select_candidates_kmeans(df, coords, candidate_count):
     return best_rows.sort_values(by='Quality', ascending=False).reset_index(drop=True)
 
 
-def select_candidates_gradient_greedy(df, min_distance, candidate_count, maximize: bool = True):
+def select_candidates_gradient_greedy(df, min_distance, candidate_count, maximize: bool = True, surface=None):
     """
     Selects candidates by strain gradient ('Local_Std') using a greedy algorithm
     that enforces a minimum distance.
@@ -93,12 +223,13 @@ def select_candidates_gradient_greedy(df, min_distance, candidate_count, maximiz
         min_distance: exclusion radius between picks.
         candidate_count: number of picks to return.
         maximize: if True (default) selects highest Local_Std; if False selects lowest.
+        surface: optional geodesic.SurfaceGraph to measure min_distance along the surface.
     """
     df_sorted = df.sort_values(by='Local_Std', ascending=not maximize)
-    return _greedy_selection(df_sorted, min_distance, candidate_count)
+    return _greedy_selection(df_sorted, min_distance, candidate_count, surface)
 
 
-def select_candidates_filtered_kmeans(df, candidate_count, quality_percentile):
+def select_candidates_filtered_kmeans(df, candidate_count, quality_percentile, backend="Full K-Means"):
     """
     Runs K-Means on a high-quality subset of nodes, filtered by a quality percentile.
     """
@@ -114,13 +245,14 @@ def select_candidates_filtered_kmeans(df, candidate_count, quality_percentile):
         return pd.DataFrame()
 
     filtered_coords = df_filtered[['X', 'Y', 'Z']].values
-    return select_candidates_kmeans(df_filtered, filtered_coords, candidate_count)
+    return select_candidates_kmeans(df_filtered, filtered_coords, candidate_count, backend)
 
 
-def select_candidates_roi(df, roi_center, roi_radius, min_distance, candidate_count):
+def select_candidates_roi(df, roi_center, roi_radius, min_distance, candidate_count, surface=None):
     """
     Selects candidates within a user-defined Region of Interest (ROI) using a
-    quality-based greedy search.
+    quality-based greedy search. The ROI is always a sphere; only min_distance is
+    measured along the surface when a surface graph is given.
     """
     if df.empty:
         return pd.DataFrame()
@@ -135,4 +267,170 @@ def select_candidates_roi(df, roi_center, roi_radius, min_distance, candidate_co
         return pd.DataFrame()
 
     # Perform a standard greedy search within the filtered ROI subset
-    return select_candidates_quality_greedy(df_roi, min_distance, candidate_count)
\ No newline at end of file
+    return select_candidates_quality_greedy(df_roi, min_distance, candidate_count, surface)
+
+
+def _orientation_vector(angle):
+    """The (1, cos 2θ, sin 2θ) weights that turn an orientation basis into the gauge row at angle θ."""
+    phi = np.radians(2.0 * angle)
+    return np.array([1.0, np.cos(phi), np.sin(phi)])
+
+
+def _best_gauge_orientation(G, angle_step=None):
+    """
+    Finds the gauge angle of every node that maximizes the D-optimal score u(θ)ᵀ G u(θ).
+
+    With u = (1, cos 2θ, sin 2θ) the score is a trigonometric polynomial in φ = 2θ, so it is
+    evaluated on multiples of angle_step degrees; with angle_step None a 1° scan is refined
+    by a few Newton steps, giving the continuous optimum.
+
+    Returns:
+        tuple: (angles in degrees within [0, 180), scores), one entry per node.
+    """
+    # score(φ) = c0 + c1·cos φ + c2·sin φ + c3·cos 2φ + c4·sin 2φ
+    coeffs = np.stack([
+        G[:, 0, 0] + 0.5 * (G[:, 1, 1] + G[:, 2, 2]),
+        2.0 * G[:, 0, 1],
+        2.0 * G[:, 0, 2],
+        0.5 * (G[:, 1, 1] - G[:, 2, 2]),
+        G[:, 1, 2],
+    ], axis=1)
+
+    def score(phi):
+        return (coeffs[:, 0] + coeffs[:, 1] * np.cos(phi) + coeffs[:, 2] * np.sin(phi)
+                + coeffs[:, 3] * np.cos(2 * phi) + coeffs[:, 4] * np.sin(2 * phi))
+
+    grid = np.arange(0.0, 180.0, angle_step or 1.0)
+    grid_phi = np.radians(2.0 * grid)
+    trig = np.stack([np.ones_like(grid_phi), np.cos(grid_phi), np.sin(grid_phi),
+                     np.cos(2 * grid_phi), np.sin(2 * grid_phi)])
+    values = coeffs @ trig
+    best = np.argmax(values, axis=1)
+    angles = grid[best]
+    scores = values[np.arange(len(best)), best]
+    if angle_step is not None:
+        return angles, scores
+
+    phi = np.radians(2.0 * angles)
+    max_step = np.radians(2.0)
+    for _ in range(4):
+        d1 = (-coeffs[:, 1] * np.sin(phi) + coeffs[:, 2] * np.cos(phi)
+              - 2 * coeffs[:, 3] * np.sin(2 * phi) + 2 * coeffs[:, 4] * np.cos(2 * phi))
+        d2 = (-coeffs[:, 1] * np.cos(phi) - coeffs[:, 2] * np.sin(phi)
+              - 4 * coeffs[:, 3] * np.cos(2 * phi) - 4 * coeffs[:, 4] * np.sin(2 * phi))
+        step = np.where(d2 < 0, -d1 / np.where(d2 < 0, d2, -1.0), 0.0)
+        phi = phi + np.clip(step, -max_step, max_step)
+    refined = score(phi)
+    improved = refined > scores
+    angles = np.where(improved, np.mod(np.degrees(phi) / 2.0, 180.0), angles)
+    return angles, np.where(improved, refined, scores)
+
+
+def select_candidates_d_optimal(df, sensitivity, min_distance, candidate_count, angles=None, block=False,
+                                surface=None, oriented=False, angle_step=None):
+    """
+    Selects gauges that jointly observe the load cases best (greedy D-optimal design).
+
+    Each node offers gauge rows a_i (the strain a gauge would read under each of the m load
+    cases). Picks greedily maximize the increase of log det(AᵀA) of the selected rows, i.e. the
+    Fisher information for the load-case amplitudes under equal gauge noise. The inverse
+    information matrix is kept current with Sherman–Morrison rank-one updates, and the
+    per-candidate scores aᵀM⁻¹a are downdated with one matrix-vector product per pick, so no
+    pick re-solves the system. A small ridge δ·I keeps M invertible before m gauges are placed.
+
+    Args:
+        df (pd.DataFrame): Candidate nodes (already threshold-filtered), rows aligned with sensitivity.
+        sensitivity (np.ndarray): (n_nodes, n_rows, m) gauge rows per node, see
+            computation.compute_gauge_sensitivities, or the (n_nodes, 3, m) orientation basis
+            of computation.compute_gauge_sensitivity_basis when oriented is True.
+        min_distance (float): Minimum distance between selected gauges.
+        candidate_count (int): Number of gauges to place.
+        angles (list, optional): Angle of each gauge row. Reported as 'Gauge_Angle' when block is False.
+        block (bool): If True, all rows of a node are placed together (rosette: one gauge per
+            grid); otherwise the best single row (gauge orientation) of each node is used.
+        surface (geodesic.SurfaceGraph, optional): Measure min_distance along the surface.
+        oriented (bool): If True, the gauge angle of each node is optimized from the orientation
+            basis instead of chosen among fixed rows.
+        angle_step (float, optional): With oriented, restrict the angles to multiples of this
+            many degrees; None optimizes the angle continuously.
+
+    Returns:
+        pd.DataFrame: Selected rows in pick order with an 'Info_Gain' column (log-det increase)
+        and, for single-gauge placement, the chosen 'Gauge_Angle'.
+    """
+    if df.empty or candidate_count == 0:
+        return pd.DataFrame()
+
+    S = np.asarray(sensitivity, dtype=float)
+    n_nodes, n_rows, m = S.shape
+    flat = S.reshape(n_nodes * n_rows, m)
+
+    # Ridge relative to the average gauge row energy (over all angles for an orientation basis)
+    if oriented:
+        row_energy = np.einsum('nm,nm->n', S[:, 0], S[:, 0]) + 0.5 * np.einsum('nrm,nrm->n', S[:, 1:], S[:, 1:])
+    else:
+        row_energy = np.einsum('ij,ij->i', flat, flat)
+    delta = 1e-6 * max(float(np.mean(row_energy)), np.finfo(float).tiny)
+    M_inv = np.eye(m) / delta
+
+    if block or oriented:
+        # G[i] = B_i M⁻¹ B_iᵀ for the whole block (or orientation basis) of node i
+        G = np.einsum('nim,njm->nij', S, S) / delta
+        identity = np.eye(n_rows)
+    else:
+        # q[i, a] = a_iaᵀ M⁻¹ a_ia for every candidate gauge row
+        q = np.einsum('nrm,nrm->nr', S, S) / delta
+
+    coords = df[['X', 'Y', 'Z']].values
+    exclusion_zone = _exclusion_zone(coords, min_distance, surface) if min_distance > 0 else None
+    available = np.ones(n_nodes, dtype=bool)
+
+    picks, picked_rows, gains = [], [], []
+    while len(picks) < candidate_count and available.any():
+        if block:
+            _, gain = np.linalg.slogdet(identity + G)
+        elif oriented:
+            best_angle, best_score = _best_gauge_orientation(G, angle_step)
+            gain = np.log1p(np.maximum(best_score, 0.0))
+        else:
+            best_row = np.argmax(q, axis=1)
+            gain = np.log1p(np.maximum(q[np.arange(n_nodes), best_row], 0.0))
+        gain = np.where(available, gain, -np.inf)
+
+        i = int(np.argmax(gain))
+        if not np.isfinite(gain[i]):
+            break
+        picks.append(i)
+        gains.append(float(gain[i]))
+        if block:
+            gauge_rows = S[i]
+            picked_rows.append(0)
+        elif oriented:
+            gauge_rows = [_orientation_vector(best_angle[i]) @ S[i]]
+            picked_rows.append(float(best_angle[i]))
+        else:
+            gauge_rows = [S[i, best_row[i]]]
+            picked_rows.append(int(best_row[i]))
+
+        # Sherman–Morrison update of M⁻¹ and downdate of all candidate scores
+        for a in gauge_rows:
+            u = M_inv @ a
+            denom = 1.0 + a @ u
+            M_inv -= np.outer(u, u) / denom
+            proj = (flat @ u).reshape(n_nodes, n_rows)
+            if block or oriented:
+                G -= np.einsum('ni,nj->nij', proj, proj) / denom
+            else:
+                q -= proj ** 2 / denom
+
+        available[i] = False
+        if exclusion_zone is not None:
+            available[exclusion_zone(i)] = False
+
+    selected = df.iloc[picks].reset_index(drop=True)
+    if oriented:
+        selected['Gauge_Angle'] = picked_rows
+    elif not block and angles is not None:
+        selected['Gauge_Angle'] = np.asarray(angles)[picked_rows]
+    selected['Info_Gain'] = gains
+    return selected
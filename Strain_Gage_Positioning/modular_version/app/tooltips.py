@@ -48,7 +48,8 @@ Provide multiple cases in either of two ways:
       This method is not recommended as it can be confusing and error-prone.<br/>
            Please use the multiple files method instead.<br/></li>
   <li><b>Multiple files:</b> Select more than one file when loading. 
-      Files are stacked as separate load cases as long as they share the same Node and XYZ coordinates.</li>
+      Files are read in parallel and stacked as separate load cases as long as they share the same Node and XYZ coordinates.<br/>
+      Row order may differ between files; rows are matched by Node ID. Files with different nodes or coordinates are rejected.</li>
   
 </ol>
 """
@@ -74,6 +75,23 @@ When using the "Max Coverage (K-Means)" strategy, this button will first show a
 spatial clusters. Its text will then change to <i>"Continue with K-Means"</i>, requiring a
 second click to finalize the selection.
 """
+CANCEL_ANALYSIS = """
+<b>Cancel Analysis</b><br><br>
+Stops the running analysis. The analysis runs in the background, so the 3D view stays responsive while it works;
+cancellation takes effect at the end of the current step (for example, after the current load case).
+The previous results remain on screen.
+"""
+WRITE_TRACE = """
+<b>Save Timing Trace (JSON)</b><br><br>
+When checked, every analysis run writes <b>analysis_trace_&lt;date&gt;_&lt;time&gt;.json</b> to the project
+directory. For each step (loading, normal strains, neighborhoods, aggregation, selection) it records the
+wall time, the process memory (current and peak RSS) and the size of the arrays the step produced.<br><br>
+Useful for finding out where time and memory go on a large model. The same summary is always shown in the
+status bar (hover it for the per-step breakdown) and printed to the console.
+"""
+PROFILE_LABEL = """
+Time and peak memory of the last analysis run. Hover after a run for the per-step breakdown.
+"""
 
 # =====================================================================================
 # Core Settings
@@ -100,6 +118,18 @@ Your choice depends on the type of strain gage you intend to use and what you wa
     strain gage and want to orient it to capture the absolute maximum strain possible at that location.</li>
 </ul>
 """
+ANGLE_METHOD = """
+<b>Gage Angle Search (Uniaxial)</b><br><br>
+Controls how the best gage orientation is found at each node:<br>
+<ul>
+  <li><b>Closed-Form (Exact):</b> Solves for the principal strain direction directly from
+    (εxx, εyy, γxy). Finds the true maximum at any angle and needs no angle grid (fastest, least memory).</li>
+  <li><b>Closed-Form (1° / 5° Steps):</b> Same solution, snapped to the nearest angle a gage can
+    realistically be mounted at. The reported strain is the value at the snapped angle.</li>
+  <li><b>15° Grid (Legacy):</b> Evaluates 12 fixed angles (0°, 15°, ..., 165°) and keeps the best one.
+    Kept for reproducing earlier results; it can miss the maximum by up to 7.5°.</li>
+</ul>
+"""
 CANDIDATE_COUNT = """
 <b>Candidate Points Requested</b><br><br>
 This value directly sets the number of final candidate points the selection algorithm will
@@ -134,6 +164,22 @@ computes the local gradient using the <b>k nearest neighbors</b> (k≥4) to stab
 After each run, it reports how often this fallback was used. If more than ~<b>5%</b> of points rely
 on the fallback, consider increasing the radius or refining the mesh.
 """
+NEIGHBORHOOD_METRIC = """
+<b>Distance Measure</b><br><br>
+Sets how distances are measured for the uniformity neighborhood and for the 'Min Distance'
+exclusion zone of the Greedy, ROI and D-Optimal strategies.
+<ul>
+  <li><b>Euclidean (Straight Line):</b> Points inside a sphere around the node. Fast, and exact for
+    open, gently curved surfaces.</li>
+  <li><b>Geodesic (Along Surface):</b> Points reachable along the part surface within the radius.
+    On thin walls, ribs and folded sheet the sphere also reaches the opposite face or a neighboring
+    flange, which mixes unrelated strains into σ and lets the exclusion zone block points on the
+    other side of the wall. Measuring along the surface avoids both.</li>
+</ul>
+The surface is rebuilt from the node cloud (nearest neighbors within the local tangent plane), so
+walls thinner than about half the node spacing cannot be separated. The surface graph and the
+neighborhoods are computed on the first geodesic run and reused until the model changes.
+"""
 
 # =====================================================================================
 # Quality Metrics
@@ -203,6 +249,23 @@ from all load cases.<br><br>
 across all expected operating conditions. It avoids points that are extreme in only one
 scenario and favors locations with overall stability and reliability.
 """
+COMPUTE_PRECISION = """
+<b>Compute Precision</b><br><br>
+Floating point precision of the strain data and all strain, local std and quality calculations.<br><br>
+<ul>
+  <li><b>Double (float64):</b> Full precision (default).</li>
+  <li><b>Single (float32):</b> Halves the memory and bandwidth of the strain arrays. About 7
+    significant digits are kept, which is plenty for screening very large meshes.</li>
+</ul>
+Node coordinates always stay in double precision.
+"""
+PRECISION_VALIDATION = """
+<b>Validate against float64</b><br><br>
+After a single precision run, the same analysis is repeated in double precision and the maximum
+deviation of the strain field, 'Best_Strain', 'Local_Std', 'Quality' (and 'Best_Angle' for uniaxial
+gages) is reported, together with whether the selected candidates are identical.<br><br>
+This needs the memory and time of both runs, so use it to check a setup before screening at scale.
+"""
 
 # =====================================================================================
 # Selection Strategies
@@ -263,6 +326,20 @@ on only the points remaining inside the ROI.<br><br>
 <b>Use Case:</b> Extremely useful for large, complex models where you only care about a specific
 component, feature, or known problem area.
 """
+STRATEGY_D_OPTIMAL = """
+<b>Max Observability (D-Optimal)</b><br><br>
+<b>Goal:</b> Place gages that, together, tell the load cases apart as well as possible.<br><br>
+Instead of scoring each node on its own, this strategy looks at what every gage would read under
+each load case and picks the set of gages whose readings best determine all load amplitudes at once
+(it maximizes the determinant of the information matrix). A point that repeats what already-chosen
+gages measure adds little, so redundant hot-spots are skipped automatically. In 'Uniaxial' mode the
+best gage orientation is chosen per point, at the resolution of the selected 'Gage Angle Search'; in
+'Rosette' mode all three grids are placed together. The chosen orientation maximizes the joint
+information, so it can differ from the principal strain angle shown in the table.<br><br>
+The label shows each gage's information gain (Δ log det). The 'Minimum Distance' is also enforced.<br><br>
+<b>Use Case:</b> Gage layouts intended for load reconstruction from measured strains, where the
+number of gages is close to the number of load cases.
+"""
 
 # =====================================================================================
 # Strategy-Specific Parameters
@@ -270,7 +347,7 @@ component, feature, or known problem area.
 
 MIN_DISTANCE = """
 <b>Minimum Distance [mm]</b><br><br>
-This parameter is used by all 'Greedy' and 'ROI' search strategies.<br><br>
+This parameter is used by all 'Greedy', 'ROI' and 'D-Optimal' search strategies.<br><br>
 It defines a "personal space" or "exclusion zone" around each candidate point after it has been
 selected. Once a point is chosen, no other point within this radius can be selected as a candidate.
 This is essential for preventing the algorithm from picking a tight cluster of points all in the
@@ -293,6 +370,18 @@ Controls how 'Greedy Gradient Search' ranks candidates:<br>
   <li><b>Min Local Std:</b> Prioritize the flattest, most uniform regions (e.g., for highly stable measurements).</li>
 <ul>
 """
+KMEANS_BACKEND = """
+<b>K-Means Backend</b><br><br>
+Selects how the clustering for the K-Means strategies is computed:<br>
+<ul>
+  <li><b>Full K-Means:</b> Standard K-Means on all nodes. Reference result; slowest on very large models.</li>
+  <li><b>Mini-Batch K-Means:</b> Fits on small random batches of nodes. Much faster on large models, with
+      slightly different cluster boundaries.</li>
+  <li><b>Subsampled K-Means:</b> Fits K-Means on a random subset of nodes (at least 50,000), then assigns
+      every node to its nearest cluster center.</li>
+</ul>
+The clustering shown in the K-Means preview is reused when you press 'Continue', so it is not computed twice.
+"""
 ROI_GROUP = "Define a spherical Region of Interest (ROI) by specifying its center coordinates (X, Y, Z) and its radius in millimeters."
 
 # =====================================================================================
@@ -354,6 +443,15 @@ Select how the per-node strain metric is computed across multiple load cases for
 CLOUD_POINT_SIZE = "Controls the rendered size of the individual points in the main data cloud."
 CANDIDATE_POINT_SIZE = "Controls the rendered size of the highlighted magenta points, making the final candidates easier to see."
 LABEL_FONT_SIZE = "Controls the font size of the text labels ('P1', 'P2', etc.) attached to the candidate points."
+LOD_RENDERING = """
+<b>Level of Detail (LOD)</b><br><br>
+Speeds up interaction with very large models (more than 500,000 nodes).<br>
+When enabled, the overview shows one point per small voxel, colored by the highest value inside
+that voxel so that strain hot spots remain visible. When you zoom in, the full-resolution nodes
+around the visible region are loaded automatically.<br><br>
+Candidate markers are always drawn at their exact positions, and distance measurement picks
+snap to the nearest real node. Has no effect on smaller models.
+"""
 LEGEND_CONTROLS = """
 <b>Legend Color and Range Controls</b><br><br>
 These controls allow you to manually adjust the color mapping for the 3D visualization.
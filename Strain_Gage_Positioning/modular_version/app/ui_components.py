@@ -1,11 +1,14 @@
 # File: app/ui_components.py
 
 import numpy as np
+import pandas as pd
 from PyQt5.QtWidgets import (QGroupBox, QVBoxLayout, QGridLayout, QLabel,
                              QPushButton, QComboBox, QSpinBox, QDoubleSpinBox,
                              QWidget, QHBoxLayout, QCheckBox)
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, pyqtSignal, QAbstractTableModel, QModelIndex
 from . import tooltips as tips
+from .selection_strategies import KMEANS_BACKENDS
+from .computation import ANGLE_METHODS, NEIGHBORHOOD_METRICS, PRECISIONS
 
 # pyvistaqt is a required dependency for the VisualizationPanel
 try:
@@ -39,6 +42,62 @@ class InputDataPanel(QGroupBox):
         self.lbl_file.setText(text)
 
 
+class CandidateTableModel(QAbstractTableModel):
+    """
+    Read-only table model backed directly by the candidate DataFrame. Cells are formatted
+    on demand when the view asks for them, so large candidate sets appear instantly.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._df = pd.DataFrame()
+
+    def set_dataframe(self, df):
+        self.beginResetModel()
+        self._df = df if df is not None else pd.DataFrame()
+        self.endResetModel()
+
+    def dataframe(self):
+        return self._df
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._df)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._df.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role != Qt.DisplayRole:
+            return None
+
+        cell_value = self._df.iat[index.row(), index.column()]
+        if pd.isna(cell_value):
+            return "N/A"
+        elif isinstance(cell_value, (int, np.integer)):
+            return f"{cell_value}"
+        elif isinstance(cell_value, (float, np.floating)):
+            return f"{cell_value:.4g}"
+        return str(cell_value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return str(self._df.columns[section])
+        return str(section + 1)
+
+    def row_coordinates(self, row):
+        """Returns the (X, Y, Z) of a candidate row, or None if unavailable."""
+        if not {'X', 'Y', 'Z'}.issubset(self._df.columns) or not 0 <= row < len(self._df):
+            return None
+        xyz = self._df[['X', 'Y', 'Z']].iloc[row].values.astype(float)
+        return None if np.any(np.isnan(xyz)) else tuple(xyz)
+
+
 class ControlPanel(QGroupBox):
     """
     A widget containing all user controls for the analysis. This class is part of the
@@ -48,6 +107,9 @@ class ControlPanel(QGroupBox):
     analysis_requested = pyqtSignal(bool)  # bool indicates if it's a continued K-Means run
 
 
+    # Signal emitted when the user clicks "Cancel" while an analysis is running.
+    cancel_requested = pyqtSignal()
+
     # Signal emitted when the display unit (strain/microstrain) changes.
     display_mode_changed = pyqtSignal(bool)
 
@@ -59,6 +121,8 @@ class ControlPanel(QGroupBox):
         self._apply_tooltips()
         self._connect_signals()
         self._update_strategy_controls()
+        self._update_measurement_controls()
+        self._update_precision_controls()
 
     def _setup_widgets(self):
         """Creates all the control widgets."""
@@ -66,13 +130,18 @@ class ControlPanel(QGroupBox):
         self.combo_measurement = QComboBox()
         self.combo_measurement.addItems(["Rosette", "Uniaxial"])
 
+        self.lbl_angle_method = QLabel("Gage Angle Search:")
+        self.combo_angle_method = QComboBox()
+        self.combo_angle_method.addItems(list(ANGLE_METHODS))
+
         self.combo_strategy = QComboBox()
         self.combo_strategy.addItems([
             "Max Quality (Greedy Search)",
             "Max Coverage (K-Means)",
             "Quality-Filtered K-Means",
             "Greedy Gradient Search",
-            "Region of Interest (ROI) Search"
+            "Region of Interest (ROI) Search",
+            "Max Observability (D-Optimal)"
         ])
 
         self.combo_quality = QComboBox()
@@ -86,6 +155,10 @@ class ControlPanel(QGroupBox):
         self.combo_agg = QComboBox()
         self.combo_agg.addItems(["Max", "Average"])
 
+        self.combo_precision = QComboBox()
+        self.combo_precision.addItems(list(PRECISIONS))
+        self.chk_precision_validation = QCheckBox("Validate against float64")
+
         self.spin_candidate_count = QSpinBox()
         self.spin_candidate_count.setRange(1, 1000)
         self.spin_candidate_count.setValue(10)
@@ -95,6 +168,9 @@ class ControlPanel(QGroupBox):
         self.dspin_uniformity_radius.setValue(10.0)
         self.dspin_uniformity_radius.setSingleStep(0.5)
 
+        self.combo_neighborhood_metric = QComboBox()
+        self.combo_neighborhood_metric.addItems(list(NEIGHBORHOOD_METRICS))
+
         # --- Strategy-specific controls ---
         self.lbl_min_distance = QLabel("Min Distance [mm]:")
         self.dspin_min_distance = QDoubleSpinBox()
@@ -112,6 +188,11 @@ class ControlPanel(QGroupBox):
         self.combo_gradient_mode.addItems(["Max Local Std", "Min Local Std"])
         self.combo_gradient_mode.setCurrentText("Max Local Std")
 
+        # K-Means backend (only used for the K-Means strategies)
+        self.lbl_kmeans_backend = QLabel("K-Means Backend:")
+        self.combo_kmeans_backend = QComboBox()
+        self.combo_kmeans_backend.addItems(list(KMEANS_BACKENDS))
+
         # --- ROI Group Box ---
         self.roiGroup = QGroupBox("Region of Interest (Sphere)")
         roi_layout = QGridLayout(self.roiGroup)
@@ -161,7 +242,11 @@ class ControlPanel(QGroupBox):
         self._lbl_threshold_value.setVisible(False)
         self._lbl_threshold_agg.setVisible(False)
 
+        self.chk_write_trace = QCheckBox("Save Timing Trace (JSON)")
+
         self.btn_update = QPushButton("Run Analysis")
+        self.btn_cancel = QPushButton("Cancel")
+        self.btn_cancel.setVisible(False)
 
     def _setup_layout(self):
         """Lays out all the control widgets."""
@@ -170,13 +255,18 @@ class ControlPanel(QGroupBox):
 
         widgets_map = [
             ("Measurement Mode:", self.combo_measurement),
+            (self.lbl_angle_method, self.combo_angle_method),
             ("Selection Strategy:", self.combo_strategy),
             ("Quality Metrics Mode:", self.combo_quality),
             ("Aggregation (Multi-Load Case):", self.combo_agg),
+            ("Compute Precision:", self.combo_precision),
+            (None, self.chk_precision_validation),
             ("Candidate Points Requested:", self.spin_candidate_count),
             ("Uniformity Search Radius [mm]:", self.dspin_uniformity_radius),
+            ("Distance Measure:", self.combo_neighborhood_metric),
             (self.lbl_min_distance, self.dspin_min_distance),
             (self.lbl_gradient_mode, self.combo_gradient_mode),
+            (self.lbl_kmeans_backend, self.combo_kmeans_backend),
             (self.lbl_quality_percentile, self.dspin_quality_percentile),
             (None, self.thresholdGroup),
             (None, self.roiGroup)
@@ -191,19 +281,27 @@ class ControlPanel(QGroupBox):
             main_layout.addWidget(widget)
 
         main_layout.addStretch(1)
+        main_layout.addWidget(self.chk_write_trace)
         main_layout.addWidget(self.btn_update)
+        main_layout.addWidget(self.btn_cancel)
 
     def _apply_tooltips(self):
         """Applies all tooltips to the widgets in this panel."""
         self.btn_update.setToolTip(tips.RUN_ANALYSIS)
+        self.btn_cancel.setToolTip(tips.CANCEL_ANALYSIS)
+        self.chk_write_trace.setToolTip(tips.WRITE_TRACE)
 
         # Core Settings
         self.combo_measurement.setToolTip(tips.MEASUREMENT_MODE)
+        self.combo_angle_method.setToolTip(tips.ANGLE_METHOD)
         self.spin_candidate_count.setToolTip(tips.CANDIDATE_COUNT)
         self.dspin_uniformity_radius.setToolTip(tips.UNIFORMITY_RADIUS)
+        self.combo_neighborhood_metric.setToolTip(tips.NEIGHBORHOOD_METRIC)
 
         # Quality Metrics
         self.combo_quality.setToolTip(tips.QUALITY_MODE)
+        self.combo_precision.setToolTip(tips.COMPUTE_PRECISION)
+        self.chk_precision_validation.setToolTip(tips.PRECISION_VALIDATION)
 
         # Aggregation Method (with dynamic item tooltips)
         self.combo_agg.setToolTip(tips.AGGREGATION_METHOD)
@@ -222,6 +320,7 @@ class ControlPanel(QGroupBox):
             "Quality-Filtered K-Means": tips.STRATEGY_FILTERED_KMEANS,
             "Greedy Gradient Search": tips.STRATEGY_GRADIENT_GREEDY,
             "Region of Interest (ROI) Search": tips.STRATEGY_ROI,
+            "Max Observability (D-Optimal)": tips.STRATEGY_D_OPTIMAL,
         }
         for i, (text, tooltip) in enumerate(strategy_map.items()):
             self.combo_strategy.setItemData(i, tooltip, Qt.ToolTipRole)
@@ -234,11 +333,15 @@ class ControlPanel(QGroupBox):
         self.dspin_threshold_value.setToolTip(tips.STRAIN_THRESHOLD_VALUE)
         self.combo_threshold_agg.setToolTip(tips.STRAIN_THRESHOLD_AGG)
         self.combo_gradient_mode.setToolTip(tips.GRADIENT_MODE)
+        self.combo_kmeans_backend.setToolTip(tips.KMEANS_BACKEND)
 
     def _connect_signals(self):
         """Connects widget signals to this panel's internal logic or output signals."""
         self.btn_update.clicked.connect(self._on_update_clicked)
+        self.btn_cancel.clicked.connect(self.cancel_requested.emit)
         self.combo_strategy.currentTextChanged.connect(self._update_strategy_controls)
+        self.combo_measurement.currentTextChanged.connect(self._update_measurement_controls)
+        self.combo_precision.currentTextChanged.connect(self._update_precision_controls)
         self.chk_threshold_enable.toggled.connect(self._on_threshold_toggle)
 
     def _on_update_clicked(self):
@@ -249,15 +352,18 @@ class ControlPanel(QGroupBox):
     def _update_strategy_controls(self):
         """Shows or hides GUI controls based on the selected strategy."""
         strategy = self.combo_strategy.currentText()
-        is_greedy = "Greedy" in strategy or "ROI" in strategy
+        is_greedy = "Greedy" in strategy or "ROI" in strategy or "D-Optimal" in strategy
         is_roi = "ROI" in strategy
         is_filtered_kmeans = "Filtered" in strategy
         is_gradient = "Gradient" in strategy
+        is_kmeans = "K-Means" in strategy
 
         self.lbl_min_distance.setVisible(is_greedy)
         self.dspin_min_distance.setVisible(is_greedy)
         self.lbl_gradient_mode.setVisible(is_gradient)
         self.combo_gradient_mode.setVisible(is_gradient)
+        self.lbl_kmeans_backend.setVisible(is_kmeans)
+        self.combo_kmeans_backend.setVisible(is_kmeans)
         self.lbl_quality_percentile.setVisible(is_filtered_kmeans)
         self.dspin_quality_percentile.setVisible(is_filtered_kmeans)
         self.roiGroup.setVisible(is_roi)
@@ -266,6 +372,16 @@ class ControlPanel(QGroupBox):
         if "K-Means" not in strategy and "Continue" in self.btn_update.text():
             self.set_button_state_ready()
 
+    def _update_measurement_controls(self):
+        """Shows the gage angle search only for uniaxial gages."""
+        is_uniaxial = self.combo_measurement.currentText() == "Uniaxial"
+        self.lbl_angle_method.setVisible(is_uniaxial)
+        self.combo_angle_method.setVisible(is_uniaxial)
+
+    def _update_precision_controls(self):
+        """Validation only applies to reduced precision runs."""
+        self.chk_precision_validation.setVisible(PRECISIONS[self.combo_precision.currentText()] != np.float64)
+
     def _on_threshold_toggle(self, checked: bool):
         """Show or hide the threshold numeric and agg controls when enabled."""
         self.dspin_threshold_value.setVisible(checked)
@@ -279,9 +395,13 @@ class ControlPanel(QGroupBox):
         """Gathers all settings from the UI widgets into a dictionary."""
         return {
             "measurement_mode": self.combo_measurement.currentText(),
+            "angle_method": self.combo_angle_method.currentText(),
             "quality_mode": self.combo_quality.currentText(),
             "agg_method": self.combo_agg.currentText(),
+            "precision": self.combo_precision.currentText(),
+            "precision_validation": self.chk_precision_validation.isChecked(),
             "uniformity_radius": self.dspin_uniformity_radius.value(),
+            "neighborhood_metric": self.combo_neighborhood_metric.currentText(),
             "strategy": self.combo_strategy.currentText(),
             "candidate_count": self.spin_candidate_count.value(),
             "min_distance": self.dspin_min_distance.value(),
@@ -290,12 +410,14 @@ class ControlPanel(QGroupBox):
             "strain_threshold_value_microstrain": self.dspin_threshold_value.value(),
             "strain_threshold_agg": self.combo_threshold_agg.currentText(),
             "gradient_mode": self.combo_gradient_mode.currentText(),
+            "kmeans_backend": self.combo_kmeans_backend.currentText(),
             "roi_center": np.array([
                 self.dspin_roi_x.value(),
                 self.dspin_roi_y.value(),
                 self.dspin_roi_z.value()
             ]),
-            "roi_radius": self.dspin_roi_radius.value()
+            "roi_radius": self.dspin_roi_radius.value(),
+            "write_trace": self.chk_write_trace.isChecked()
         }
 
     def set_file_label(self, text):
@@ -306,16 +428,26 @@ class ControlPanel(QGroupBox):
         """Sets the update button to a 'running' state."""
         self.btn_update.setText("Running...")
         self.btn_update.setEnabled(False)
+        self.btn_cancel.setText("Cancel")
+        self.btn_cancel.setEnabled(True)
+        self.btn_cancel.setVisible(True)
+
+    def set_button_state_cancelling(self):
+        """Disables the cancel button while the engine winds down."""
+        self.btn_cancel.setText("Cancelling...")
+        self.btn_cancel.setEnabled(False)
 
     def set_button_state_ready(self):
         """Sets the update button to a normal, ready state."""
         self.btn_update.setText("Run Analysis")
         self.btn_update.setEnabled(True)
+        self.btn_cancel.setVisible(False)
 
     def set_button_state_kmeans_continue(self):
         """Sets the update button to the 'continue' state for K-Means."""
         self.btn_update.setText("Continue with K-Means")
         self.btn_update.setEnabled(True)
+        self.btn_cancel.setVisible(False)
 
 
 class VisualizationPanel(QWidget):
@@ -356,6 +488,9 @@ class VisualizationPanel(QWidget):
         graphical_layout.addWidget(self.dspin_candidate_point_size)
         graphical_layout.addWidget(QLabel("Label Size:"))
         graphical_layout.addWidget(self.spin_label_font_size)
+        self.chk_lod = QCheckBox("Level of Detail")
+        self.chk_lod.setChecked(True)
+        graphical_layout.addWidget(self.chk_lod)
         graphical_layout.addStretch(1)
 
         self.legend_group = QGroupBox("Legend Controls")
@@ -403,6 +538,7 @@ class VisualizationPanel(QWidget):
         self.dspin_cloud_point_size.setToolTip(tips.CLOUD_POINT_SIZE)
         self.dspin_candidate_point_size.setToolTip(tips.CANDIDATE_POINT_SIZE)
         self.spin_label_font_size.setToolTip(tips.LABEL_FONT_SIZE)
+        self.chk_lod.setToolTip(tips.LOD_RENDERING)
         self.legend_group.setToolTip(tips.LEGEND_CONTROLS)
 
     def _connect_signals(self):
@@ -414,6 +550,7 @@ class VisualizationPanel(QWidget):
                 widget.valueChanged.connect(self.visualization_settings_changed.emit)
             else:
                 widget.currentIndexChanged.connect(self.visualization_settings_changed.emit)
+        self.chk_lod.toggled.connect(self.visualization_settings_changed.emit)
 
     def get_settings(self):
         """Gathers all visualization settings into a dictionary."""
@@ -425,6 +562,7 @@ class VisualizationPanel(QWidget):
             'clim_max': self.dspin_above_limit.value(),
             'below_color': self.combo_below_color.currentText().lower(),
             'above_color': self.combo_above_color.currentText().lower(),
+            'lod_enabled': self.chk_lod.isChecked(),
         }
 
     def set_legend_limits(self, min_val, max_val):
@@ -16,6 +16,9 @@ class DistanceMeasureUI:
         self.pl = plotter
         self.units = units
         self.enabled = False
+        # Optional callable mapping a picked position to an exact model position
+        # (e.g. the nearest node when the view shows a decimated cloud)
+        self.snap_function = None
 
         # State
         self.picks = []
@@ -112,6 +115,8 @@ class DistanceMeasureUI:
             return
         if point is None:
             return
+        if self.snap_function is not None:
+            point = self.snap_function(point)
         p = np.asarray(point, dtype=float).reshape(3)
         self.picks.append(p)
         if len(self.picks) > 2:
@@ -0,0 +1,283 @@
+# File: benchmarks/run_benchmarks.py
+"""
+Benchmarks the positioning engine on synthetic models, headless (no Qt).
+
+Times load_data, the normal strain / principal direction kernels, the Euclidean and geodesic
+neighbourhood searches, compute_quality_metrics, aggregate_quality_metrics and every selection
+strategy, and compares the timings with stored baselines.
+
+Usage (from Strain_Gage_Positioning/modular_version):
+    python -m benchmarks.run_benchmarks                      # 10k and 100k nodes, check baselines
+    python -m benchmarks.run_benchmarks --sizes 1M,5M --load-cases 16 --skip-load
+    python -m benchmarks.run_benchmarks --save-baseline      # record baselines on this machine
+
+The exit code is 1 if any benchmark is slower than its baseline by more than --tolerance.
+Baselines are machine specific; record them on the machine the checks run on. When the baselines were recorded
+on a different machine (processor or CPU count), slowdowns are only reported as warnings unless --strict is given.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import sklearn
+
+from app import computation
+from app import geodesic
+from app import selection_strategies
+from benchmarks.synthetic_mesh import generate_model, write_input_file
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Machine properties that must match for baseline timings to be comparable
+COMPARABLE_MACHINE_KEYS = ("processor", "cpu_count")
+
+QUALITY_MODE = "Default: |ε|/(1+σ)"
+
+
+def parse_size(text):
+    """Parses node counts such as '10k', '2.5M' or '50000'."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if scale > 1 else text
+    return int(float(number) * scale)
+
+
+def format_size(n_nodes):
+    if n_nodes >= 1_000_000 and n_nodes % 1_000_000 == 0:
+        return f"{n_nodes // 1_000_000}M"
+    if n_nodes >= 1_000 and n_nodes % 1_000 == 0:
+        return f"{n_nodes // 1_000}k"
+    return str(n_nodes)
+
+
+def time_call(func, repeat, setup=None):
+    """
+    Runs func `repeat` times and returns (best, median) wall time in seconds.
+    setup is called before every run and is not timed.
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), float(np.median(timings)), result
+
+
+def benchmark_size(n_nodes, args, dtype):
+    """Runs all benchmarks for one model size. Returns {benchmark name: (best, median)}."""
+    results = {}
+
+    def record(name, func, setup=None):
+        best, median, value = time_call(func, args.repeat, setup)
+        results[name] = (best, median)
+        print(f"  {name:<48s} best {best:9.4f} s   median {median:9.4f} s", flush=True)
+        return value
+
+    nodes, coords, strain_tensors = generate_model(n_nodes, args.load_cases, seed=args.seed, dtype=dtype)
+    print(f"\n{format_size(n_nodes)} nodes (generated {len(nodes)}), {args.load_cases} load cases, "
+          f"{np.dtype(dtype).name}", flush=True)
+
+    # --- File loading -------------------------------------------------------------------
+    if not args.skip_load:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "synthetic_strain_data.txt")
+            write_input_file(path, nodes, coords, strain_tensors)
+            record("load_data", lambda: computation.load_data(path, dtype=dtype))
+
+    # --- Strain kernels -----------------------------------------------------------------
+    interval = computation.LEGACY_ANGLE_INTERVAL
+    grid_angles = [0] + list(range(interval, 180, interval))
+    tensors = list(strain_tensors.values())
+    record("compute_normal_strains (15° grid)",
+           lambda: [computation.compute_normal_strains(t, grid_angles) for t in tensors])
+    principal = record("compute_principal_direction",
+                       lambda: [computation.compute_principal_direction(t) for t in tensors])
+
+    # --- Quality metrics ----------------------------------------------------------------
+    neighbors = record("compute_neighborhoods",
+                       lambda: computation.compute_neighborhoods(coords, args.uniformity_radius))
+    # The surface graph and geodesic neighbourhoods are cached by the app; time them from scratch
+    record("compute_neighborhoods (geodesic)",
+           lambda: computation.compute_neighborhoods(coords, args.uniformity_radius, "Geodesic (Along Surface)"),
+           setup=geodesic.clear_geodesic_cache)
+
+    def quality_all_cases():
+        return [
+            computation.compute_quality_metrics(
+                nodes, coords, best.reshape(-1, 1), None, QUALITY_MODE, args.uniformity_radius,
+                neighbors=neighbors, best_angles=angles)
+            for best, angles in principal
+        ]
+
+    quality_dfs = record("compute_quality_metrics", quality_all_cases)
+    agg_df = record("aggregate_quality_metrics",
+                    lambda: computation.aggregate_quality_metrics(quality_dfs, "Max"))
+
+    # --- Selection strategies -------------------------------------------------------------
+    count = args.candidates
+    min_distance = args.min_distance
+    agg_coords = agg_df[["X", "Y", "Z"]].values
+    roi_center = agg_coords.mean(axis=0)
+    roi_radius = 0.25 * float(np.ptp(agg_coords, axis=0).max())
+
+    strategies = {
+        "Max Quality (Greedy Search)":
+            lambda: selection_strategies.select_candidates_quality_greedy(agg_df, min_distance, count),
+        "Greedy Gradient Search":
+            lambda: selection_strategies.select_candidates_gradient_greedy(agg_df, min_distance, count, True),
+        "Region of Interest (ROI) Search":
+            lambda: selection_strategies.select_candidates_roi(agg_df, roi_center, roi_radius, min_distance, count),
+        "Max Observability (D-Optimal)":
+            lambda: selection_strategies.select_candidates_d_optimal(
+                agg_df, computation.compute_gauge_sensitivities(strain_tensors, grid_angles),
+                min_distance, count, angles=grid_angles),
+    }
+    for backend in selection_strategies.KMEANS_BACKENDS:
+        strategies[f"Max Coverage (K-Means) [{backend}]"] = (
+            lambda backend=backend: selection_strategies.select_candidates_kmeans(agg_df, agg_coords, count, backend))
+        strategies[f"Quality-Filtered K-Means [{backend}]"] = (
+            lambda backend=backend: selection_strategies.select_candidates_filtered_kmeans(agg_df, count, 75.0, backend))
+
+    for name, func in strategies.items():
+        if args.strategies and not any(s.lower() in name.lower() for s in args.strategies):
+            continue
+        # K-Means fits are cached by the app; every timed run must fit from scratch
+        record(name, func, setup=selection_strategies.clear_kmeans_cache)
+
+    return results
+
+
+def check_regressions(results, baselines, tolerance, noise_floor):
+    """
+    Compares best timings against the baselines.
+
+    A benchmark regresses when it is more than `tolerance` times slower than its baseline
+    and the difference exceeds `noise_floor` seconds (short benchmarks are too noisy to judge).
+
+    Returns:
+        list: (key, baseline, measured) of every regression.
+    """
+    regressions = []
+    for key, (best, _) in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        if best > baseline * tolerance and best - baseline > noise_floor:
+            regressions.append((key, baseline, best))
+    return regressions
+
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+
+
+def machine_differences(baseline_machine, machine):
+    """Returns the comparable machine properties that differ, as 'key: baseline -> current' strings."""
+    return [f"{key}: {baseline_machine.get(key)} -> {machine.get(key)}"
+            for key in COMPARABLE_MACHINE_KEYS if baseline_machine.get(key) != machine.get(key)]
+
+
+def load_baselines(path):
+    """Returns (benchmark timings, machine the baselines were recorded on)."""
+    if not os.path.isfile(path):
+        return {}, {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("benchmarks", {}), data.get("machine", {})
+
+
+def save_baselines(path, results):
+    """Merges the best timings into the baseline file (other sizes are kept)."""
+    baselines, _ = load_baselines(path)
+    baselines.update({key: round(best, 6) for key, (best, _) in results.items()})
+    data = {
+        "machine": machine_info(),
+        "benchmarks": dict(sorted(baselines.items())),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the strain gage positioning engine.")
+    parser.add_argument("--sizes", default="10k,100k",
+                        help="Comma separated node counts, e.g. 10k,100k,1M,5M (default: 10k,100k).")
+    parser.add_argument("--load-cases", type=int, default=8, help="Load cases per model (default: 8).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (default: 3).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precision", choices=["float64", "float32"], default="float64")
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--min-distance", type=float, default=10.0)
+    parser.add_argument("--uniformity-radius", type=float, default=10.0)
+    parser.add_argument("--strategies", nargs="*", default=None,
+                        help="Only run selection strategies whose name contains one of these strings.")
+    parser.add_argument("--skip-load", action="store_true",
+                        help="Skip writing and loading the input file (slow for very large models).")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline JSON file.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the measured timings as the new baselines instead of checking them.")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="Allowed slowdown factor against the baseline (default: 1.5).")
+    parser.add_argument("--noise-floor", type=float, default=0.05,
+                        help="Ignore slowdowns smaller than this many seconds (default: 0.05).")
+    parser.add_argument("--strict", action="store_true",
+                        help="Fail on regressions even if the baselines were recorded on a different machine.")
+    parser.add_argument("--json-out", default=None, help="Also write all timings to this JSON file.")
+    args = parser.parse_args(argv)
+
+    dtype = np.float32 if args.precision == "float32" else np.float64
+
+    results = {}
+    for size in args.sizes.split(","):
+        n_nodes = parse_size(size)
+        size_results = benchmark_size(n_nodes, args, dtype)
+        prefix = f"{format_size(n_nodes)}/{args.load_cases}lc/{args.precision}"
+        results.update({f"{prefix}/{name}": timing for name, timing in size_results.items()})
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({key: {"best": best, "median": median} for key, (best, median) in results.items()},
+                      f, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        save_baselines(args.baseline, results)
+        print(f"\nBaselines saved to {args.baseline}")
+        return 0
+
+    baselines, baseline_machine = load_baselines(args.baseline)
+    checked = [key for key in results if key in baselines]
+    regressions = check_regressions(results, baselines, args.tolerance, args.noise_floor)
+    differences = machine_differences(baseline_machine, machine_info())
+
+    print(f"\nChecked {len(checked)}/{len(results)} benchmarks against {args.baseline}")
+    if differences:
+        print("  The baselines were recorded on a different machine (" + "; ".join(differences) + "); "
+              "timings are not comparable" + (" (--strict)." if args.strict else ", slowdowns are only warnings."))
+    label = "REGRESSION" if args.strict or not differences else "WARNING (machine mismatch)"
+    for key, baseline, best in regressions:
+        print(f"  {label} {key}: {best:.4f} s vs baseline {baseline:.4f} s ({best / baseline:.2f}x)")
+    if regressions and (args.strict or not differences):
+        return 1
+    print("No regressions." if not regressions else "No regressions on a comparable machine.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# File: benchmarks/synthetic_mesh.py
+
+import numpy as np
+
+
+def generate_model(n_nodes, n_load_cases, spacing=4.0, seed=0, dtype=np.float64):
+    """
+    Generates a synthetic FE surface model: a thin-walled cylinder meshed with a jittered
+    structured grid, and smooth strain fields for several load cases.
+
+    Every load case mixes global modes (tension, bending about a random axis, torsion) with a
+    few localized, Gaussian-shaped stress concentrations, so the quality metrics and the
+    selection strategies see realistic hot spots and gradients.
+
+    Args:
+        n_nodes (int): Approximate number of nodes (the grid is rounded to full rings).
+        n_load_cases (int): Number of strain fields to generate.
+        spacing (float): Mean node spacing in mm. With the default uniformity radius of
+            10 mm, 4 mm gives roughly 20 neighbours per node.
+        seed (int): Random seed, so repeated runs use identical data.
+        dtype: Floating point dtype of the strain tensors.
+
+    Returns:
+        tuple: (nodes, coords, strain_tensors) in the same layout as computation.load_data:
+        node IDs, coordinates in mm and a dict of (n_nodes, 3) [exx, eyy, exy] in microstrain.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Unrolled grid: n_circ nodes around, n_axial along; the cylinder is about twice as
+    # long as its circumference.
+    n_circ = max(8, int(round(np.sqrt(n_nodes / 2.0))))
+    n_axial = max(2, int(round(n_nodes / n_circ)))
+    radius = n_circ * spacing / (2.0 * np.pi)
+    length = n_axial * spacing
+
+    s_grid, z_grid = np.meshgrid(np.arange(n_circ) * spacing, np.arange(n_axial) * spacing)
+    s = s_grid.ravel() + rng.uniform(-0.2, 0.2, s_grid.size) * spacing
+    z = z_grid.ravel() + rng.uniform(-0.2, 0.2, z_grid.size) * spacing
+    phi = s / radius
+
+    coords = np.column_stack((radius * np.cos(phi), radius * np.sin(phi), z))
+    nodes = np.arange(1, len(coords) + 1)
+
+    strain_tensors = {}
+    for i in range(n_load_cases):
+        strain_tensors[i] = _load_case_strains(rng, phi, z, radius, length).astype(dtype)
+
+    return nodes, coords, strain_tensors
+
+
+def _load_case_strains(rng, phi, z, radius, length, n_hot_spots=4):
+    """Strain field [exx, eyy, exy] (axial, hoop, shear) of one random load case, in microstrain."""
+    # Global modes
+    tension = rng.uniform(-300.0, 300.0)
+    bending = rng.uniform(-500.0, 500.0)
+    bending_axis = rng.uniform(0.0, 2.0 * np.pi)
+    torsion = rng.uniform(-200.0, 200.0)
+    poisson = 0.3
+
+    axial = tension + bending * np.cos(phi - bending_axis) * (1.0 - z / length)
+    exx = axial
+    eyy = -poisson * axial
+    exy = np.full_like(phi, torsion)
+
+    # Localized stress concentrations (e.g. holes, fillets)
+    arc_length = 2.0 * np.pi * radius
+    for _ in range(n_hot_spots):
+        center_s = rng.uniform(0.0, arc_length)
+        center_z = rng.uniform(0.1, 0.9) * length
+        width = rng.uniform(0.01, 0.05) * min(arc_length, length)
+        amplitude = rng.uniform(-1500.0, 1500.0)
+        direction = rng.uniform(0.0, np.pi)
+
+        ds = (phi * radius - center_s + 0.5 * arc_length) % arc_length - 0.5 * arc_length
+        dz = z - center_z
+        peak = amplitude * np.exp(-(ds ** 2 + dz ** 2) / (2.0 * width ** 2))
+
+        # Uniaxial peak strain along 'direction', with the transverse Poisson contraction
+        c, s = np.cos(direction), np.sin(direction)
+        exx = exx + peak * (c ** 2 - poisson * s ** 2)
+        eyy = eyy + peak * (s ** 2 - poisson * c ** 2)
+        exy = exy + peak * (1.0 + poisson) * 2.0 * s * c
+
+    return np.column_stack((exx, eyy, exy))
+
+
+def write_input_file(path, nodes, coords, strain_tensors, chunk_size=200000):
+    """
+    Writes a model in the input file format read by computation.load_data: a header line,
+    then Node, X, Y, Z and one [Exx, Eyy, Ezz, Exy] block per load case (strains dimensionless).
+
+    Args:
+        path (str): Output file path.
+        nodes, coords, strain_tensors: As returned by generate_model (strains in microstrain).
+        chunk_size (int): Rows formatted at a time, to bound memory for very large models.
+    """
+    n_cases = len(strain_tensors)
+    header = ["Node", "X Location (mm)", "Y Location (mm)", "Z Location (mm)"]
+    for i in range(n_cases):
+        header += [f"Exx_{i + 1}", f"Eyy_{i + 1}", f"Ezz_{i + 1}", f"Exy_{i + 1}"]
+    fmt = ["%d"] + ["%.6f"] * 3 + ["%.6e"] * (4 * n_cases)
+
+    tensors = list(strain_tensors.values())
+    with open(path, "w") as f:
+        f.write(" ".join(header) + "\n")
+        for start in range(0, len(nodes), chunk_size):
+            stop = min(start + chunk_size, len(nodes))
+            block = np.empty((stop - start, 4 + 4 * n_cases))
+            block[:, 0] = nodes[start:stop]
+            block[:, 1:4] = coords[start:stop]
+            for i, tensor in enumerate(tensors):
+                base = 4 + 4 * i
+                block[:, base] = tensor[start:stop, 0] * 1e-6
+                block[:, base + 1] = tensor[start:stop, 1] * 1e-6
+                block[:, base + 2] = 0.0
+                block[:, base + 3] = tensor[start:stop, 2] * 1e-6
+            np.savetxt(f, block, fmt=fmt)
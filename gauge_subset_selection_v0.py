@@ -0,0 +1,326 @@
+# Gauge Subset Selection
+
+"""
+Selects the best subset of strain gauges for the load reconstruction from "strain_sensitivity_matrix.csv"
+(gauges x load cases, no header) when more gauges are available than are needed.
+
+The reconstruction estimates the loads by weighted least squares, so with independent gauge errors of
+variance sigma_i^2 (weights w_i = 1 / sigma_i^2) the covariance of the estimated loads of a gauge subset S is
+the inverse of its information matrix F_S = sum over S of w_i a_i a_i^T (a_i: row i of the matrix). The weights
+are those of the reconstruction (compute_gauge_weights of load_reconstruction_engine.py): signal noise plus the
+gage factor and positioning errors scaled by the RMS strain of each gauge. Subsets are ranked by:
+    D-optimality: maximize det(F_S), the smallest confidence ellipsoid of the loads
+    A-optimality: minimize trace(F_S^-1), the smallest sum of the load variances
+
+Greedy selection adds one gauge at a time; adding gauge i is a rank-one update of F, so its effect on det(F)
+and trace(F^-1) is known for every candidate from the current F^-1 (Sherman-Morrison) without a refactorization:
+    det(F + a a^T)          = det(F) (1 + a^T F^-1 a)
+    trace((F + a a^T)^-1)   = trace(F^-1) - |F^-1 a|^2 / (1 + a^T F^-1 a)
+The greedy subsets are nested, so one pass gives a subset for every size. The optional exchange refinement then
+swaps selected gauges against candidates while the criterion improves (Fedorov exchange). For D-optimality the
+determinant ratio of every (in, out) swap follows from one matrix product, so all k x (n - k) swaps are
+evaluated at once:
+    det(F') / det(F) = (1 + d_in)(1 - d_out) + d_in_out^2,   d_xy = a_x^T F^-1 a_y
+
+Usage:
+    python gauge_subset_selection_v0.py --matrix strain_sensitivity_matrix.csv --size 12
+    python gauge_subset_selection_v0.py --matrix strain_sensitivity_matrix.csv --size 12 --criterion A --refine
+        --gauge-names SG_FEA_strain_data.csv --output gauge_subsets.csv
+    python gauge_subset_selection_v0.py --matrix strain_sensitivity_matrix.csv --size 12 --noise 2
+        --gage-factor-error 1 --positioning-error 2 --strains SG_FEA_strain_data.csv
+"""
+
+# region Import necessary libraries
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from load_reconstruction_engine import compute_gauge_weights
+# endregion
+
+
+# region Gauge weights
+def rms_strain_per_gauge(strain_file_path, chunk_size=100_000):
+    # RMS strain of each gauge column of a strain CSV (first column: time), read in chunks
+    sum_of_squares = None
+    n_rows = 0
+    for chunk in pd.read_csv(strain_file_path, chunksize=chunk_size):
+        strains = chunk.iloc[:, 1:].values
+        chunk_sum = np.sum(strains ** 2, axis=0)
+        sum_of_squares = chunk_sum if sum_of_squares is None else sum_of_squares + chunk_sum
+        n_rows += len(strains)
+    if n_rows == 0:
+        raise ValueError(f"{strain_file_path} contains no time steps.")
+    return np.sqrt(sum_of_squares / n_rows)
+
+
+def gauge_weights(n_gauges, signal_noise_microstrains=1.0, gage_factor_error_percent=0.0,
+                  positioning_error_percent=0.0, rms_strains=None):
+    # Inverse variance weights of the reconstruction; the gage factor and positioning errors need the RMS strains
+    if rms_strains is None:
+        if gage_factor_error_percent or positioning_error_percent:
+            raise ValueError("The gage factor and positioning errors need the RMS strain of every gauge.")
+        rms_strains = np.zeros(n_gauges)
+    return compute_gauge_weights(np.asarray(rms_strains, dtype=np.float64), signal_noise_microstrains,
+                                 gage_factor_error_percent, positioning_error_percent)
+# endregion
+
+
+# region Information matrix updates
+def weighted_rows(A_matrix, weights):
+    # Rows a_i scaled by sqrt(w_i), so that F_S = A_w[S]^T A_w[S]
+    return np.asarray(A_matrix, dtype=np.float64) * np.sqrt(np.asarray(weights, dtype=np.float64))[:, None]
+
+
+def _regularization(A_w):
+    # A tiny ridge keeps F invertible while the subset has fewer gauges than loads; it steers the
+    # first picks towards new load directions and is negligible once the subset resolves every load
+    n_loads = A_w.shape[1]
+    return 1e-9 * np.sum(A_w ** 2) / n_loads
+
+
+def _add_row(F_inverse, a):
+    # Sherman-Morrison: (F + a a^T)^-1
+    Fa = F_inverse @ a
+    return F_inverse - np.outer(Fa, Fa) / (1 + a @ Fa)
+
+
+def _remove_row(F_inverse, a):
+    # Sherman-Morrison: (F - a a^T)^-1
+    Fa = F_inverse @ a
+    return F_inverse + np.outer(Fa, Fa) / (1 - a @ Fa)
+
+
+def _gains(A_candidates, F_inverse, criterion):
+    # Improvement of the criterion for adding each candidate (larger is better):
+    #   D: log det ratio log(1 + a^T F^-1 a)
+    #   A: decrease of trace(F^-1), |F^-1 a|^2 / (1 + a^T F^-1 a)
+    B = A_candidates @ F_inverse
+    leverage = np.einsum('ij,ij->i', B, A_candidates)
+    if criterion == "D":
+        return np.log1p(leverage)
+    return np.einsum('ij,ij->i', B, B) / (1 + leverage)
+
+
+def subset_covariance(A_w, subset):
+    # Covariance of the estimated loads (load units^2) of a subset, None if it cannot resolve every load
+    A_subset = A_w[np.asarray(subset, dtype=int)]
+    if len(subset) < A_w.shape[1] or np.linalg.matrix_rank(A_subset) < A_w.shape[1]:
+        return None
+    return np.linalg.inv(A_subset.T @ A_subset)
+
+
+def criterion_value(covariance, criterion):
+    # log det(F) for D-optimality, trace(F^-1) for A-optimality
+    if covariance is None:
+        return -np.inf if criterion == "D" else np.inf
+    if criterion == "D":
+        return -np.linalg.slogdet(covariance)[1]
+    return float(np.trace(covariance))
+# endregion
+
+
+# region Greedy selection and exchange refinement
+def greedy_selection(A_w, max_size, criterion="D", initial_subset=()):
+    """
+    Adds gauges one at a time, each time the one with the largest criterion gain.
+
+    Returns:
+        list: Gauge indices in the order they were selected (the first k form the greedy k-gauge subset).
+    """
+    n_gauges, n_loads = A_w.shape
+    F_inverse = np.eye(n_loads) / _regularization(A_w)
+    selected = []
+    available = np.ones(n_gauges, dtype=bool)
+    for gauge in initial_subset:
+        F_inverse = _add_row(F_inverse, A_w[gauge])
+        selected.append(int(gauge))
+        available[gauge] = False
+
+    while len(selected) < min(max_size, n_gauges):
+        candidates = np.flatnonzero(available)
+        best = candidates[int(np.argmax(_gains(A_w[candidates], F_inverse, criterion)))]
+        F_inverse = _add_row(F_inverse, A_w[best])
+        selected.append(int(best))
+        available[best] = False
+    return selected
+
+
+def exchange_refinement(A_w, subset, criterion="D", max_iterations=1000, tolerance=1e-10):
+    """
+    Swaps a selected gauge for an unselected one while that improves the criterion, always taking
+    the best swap of all k x (n - k) pairs.
+
+    Returns:
+        tuple: (refined subset, number of swaps)
+    """
+    n_gauges, n_loads = A_w.shape
+    subset = [int(gauge) for gauge in subset]
+    F_inverse = np.linalg.inv(A_w[subset].T @ A_w[subset] + _regularization(A_w) * np.eye(n_loads))
+
+    for iteration in range(max_iterations):
+        selected = np.asarray(subset)
+        available = np.ones(n_gauges, dtype=bool)
+        available[selected] = False
+        candidates = np.flatnonzero(available)
+        if len(candidates) == 0:
+            return subset, 0
+
+        A_in, A_out = A_w[candidates], A_w[selected]
+        B_in = A_in @ F_inverse
+        d_in = np.einsum('ij,ij->i', B_in, A_in)
+        d_out = np.einsum('ij,ij->i', A_out @ F_inverse, A_out)
+
+        if criterion == "D":
+            # Determinant ratio of every swap (candidate in, selected out) at once
+            ratio = (1 + d_in)[:, None] * (1 - d_out)[None, :] + (B_in @ A_out.T) ** 2
+            best_in, best_out = np.unravel_index(int(np.argmax(ratio)), ratio.shape)
+            improvement = np.log(ratio[best_in, best_out])
+        else:
+            # Trace of F^-1 after each swap: remove each selected gauge in turn, then evaluate every
+            # candidate for the freed slot at once
+            improvement, best_in, best_out = -np.inf, None, None
+            current_trace = np.trace(F_inverse)
+            for out_position in range(len(selected)):
+                F_inverse_removed = _remove_row(F_inverse, A_out[out_position])
+                trace_after = np.trace(F_inverse_removed) - _gains(A_in, F_inverse_removed, "A")
+                position = int(np.argmin(trace_after))
+                if current_trace - trace_after[position] > improvement:
+                    improvement = current_trace - trace_after[position]
+                    best_in, best_out = position, out_position
+            improvement /= max(current_trace, np.finfo(float).tiny)
+
+        if improvement <= tolerance:
+            return subset, iteration
+        F_inverse = _add_row(_remove_row(F_inverse, A_out[best_out]), A_in[best_in])
+        subset[best_out] = int(candidates[best_in])
+    return subset, max_iterations
+
+
+def select_gauge_subsets(A_matrix, max_size, criterion="D", refine=False, weights=None, min_size=None):
+    """
+    Best gauge subset of every size from min_size (default: the number of loads) to max_size, ranked for
+    the weighted least squares reconstruction with the given gauge weights (default: gauge_weights with
+    1 microstrain of signal noise only).
+
+    Returns:
+        list: One dict per subset size with the subset, the criterion value and the predicted
+        standard deviation of every estimated load.
+    """
+    if criterion not in ("D", "A"):
+        raise ValueError(f"Unknown criterion: {criterion} (use 'D' or 'A')")
+    if weights is None:
+        weights = gauge_weights(len(A_matrix))
+    A_w = weighted_rows(A_matrix, weights)
+    n_gauges, n_loads = A_w.shape
+    max_size = min(max_size, n_gauges)
+    min_size = n_loads if min_size is None else max(1, min_size)
+    if min_size > max_size:
+        raise ValueError(f"No subset sizes from {min_size} to {max_size} ({n_gauges} gauges, {n_loads} loads).")
+
+    order = greedy_selection(A_w, max_size, criterion)
+    results = []
+    for size in range(min_size, max_size + 1):
+        subset, swaps = order[:size], 0
+        if refine and size < n_gauges:
+            subset, swaps = exchange_refinement(A_w, subset, criterion)
+        covariance = subset_covariance(A_w, subset)
+        results.append({
+            'size': size,
+            'subset': sorted(subset),
+            'swaps': swaps,
+            'criterion': criterion_value(covariance, criterion),
+            'load_std': np.sqrt(np.diag(covariance)) if covariance is not None else np.full(n_loads, np.nan),
+        })
+    return results
+# endregion
+
+
+# region Report
+def subsets_to_dataframe(results, gauge_names, criterion):
+    criterion_column = "log det(F)" if criterion == "D" else "trace(Cov)"
+    rows = []
+    for result in results:
+        row = {'Subset Size': result['size'], criterion_column: result['criterion'],
+               'Exchange Swaps': result['swaps']}
+        for j, std in enumerate(result['load_std']):
+            row[f'Load {j+1} Std'] = std
+        row['Gauges'] = ";".join(gauge_names[i] for i in result['subset'])
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Optimal strain gauge subsets for load reconstruction.")
+    parser.add_argument("--matrix", required=True, help="strain_sensitivity_matrix.csv")
+    parser.add_argument("--size", type=int, required=True, help="Largest subset size to report.")
+    parser.add_argument("--min-size", type=int, default=None,
+                        help="Smallest subset size to report (default: the number of loads).")
+    parser.add_argument("--criterion", choices=("D", "A"), default="D",
+                        help="D: max det of the information matrix, A: min sum of load variances (default: D).")
+    parser.add_argument("--refine", action="store_true", help="Refine every greedy subset by exchanges.")
+    parser.add_argument("--noise", type=float, default=1.0,
+                        help="Gauge signal noise standard deviation in microstrains (default: 1).")
+    parser.add_argument("--gage-factor-error", type=float, default=0.0,
+                        help="Gage factor error in percent of the RMS strain (default: 0).")
+    parser.add_argument("--positioning-error", type=float, default=0.0,
+                        help="Positioning error in percent of the RMS strain (default: 0).")
+    parser.add_argument("--gauge-names", default=None,
+                        help="Strain CSV (e.g. SG_FEA_strain_data.csv) whose header names the gauges.")
+    parser.add_argument("--strains", default=None,
+                        help="Strain CSV giving the RMS strain of every gauge for the gage factor and positioning "
+                             "errors (default: the --gauge-names file).")
+    parser.add_argument("--output", default=None, help="Save the subsets to this CSV file.")
+    args = parser.parse_args(argv)
+
+    A_matrix = pd.read_csv(args.matrix, header=None).values
+    n_gauges, n_loads = A_matrix.shape
+    if args.min_size is None and n_gauges < n_loads:
+        parser.error(f"The matrix has {n_gauges} gauges for {n_loads} loads; use --min-size to report "
+                     f"subsets that cannot resolve every load.")
+    if args.min_size is None and args.size < n_loads:
+        parser.error(f"--size must be at least the number of loads ({n_loads}); use --min-size to report "
+                     f"smaller subsets.")
+    if args.min_size is not None and args.min_size > min(args.size, n_gauges):
+        parser.error(f"--min-size ({args.min_size}) is larger than --size ({args.size}) or the number of "
+                     f"gauges ({n_gauges}).")
+    gauge_names = [f'Gauge {i+1}' for i in range(n_gauges)]
+    if args.gauge_names:
+        names = list(pd.read_csv(args.gauge_names, nrows=0).columns[1:])
+        if len(names) == n_gauges:
+            gauge_names = names
+        else:
+            print(f"{args.gauge_names} has {len(names)} gauge columns for {n_gauges} matrix rows; using numbers.")
+
+    rms_strains = None
+    if args.gage_factor_error or args.positioning_error:
+        strain_file_path = args.strains or args.gauge_names
+        if strain_file_path is None:
+            parser.error("--gage-factor-error and --positioning-error need --strains (or --gauge-names).")
+        rms_strains = rms_strain_per_gauge(strain_file_path)
+        if len(rms_strains) != n_gauges:
+            parser.error(f"{strain_file_path} has {len(rms_strains)} gauge columns for {n_gauges} matrix rows.")
+    weights = gauge_weights(n_gauges, args.noise, args.gage_factor_error, args.positioning_error, rms_strains)
+
+    start = time.perf_counter()
+    results = select_gauge_subsets(A_matrix, args.size, args.criterion, args.refine, weights, args.min_size)
+    elapsed = time.perf_counter() - start
+
+    df = subsets_to_dataframe(results, gauge_names, args.criterion)
+    with pd.option_context('display.max_columns', None, 'display.width', 200, 'display.max_colwidth', 80):
+        print(df.to_string(index=False, float_format=lambda value: f"{value:.4g}"))
+    print(f"{n_gauges} gauges, {n_loads} loads: subsets of {results[0]['size']} to {results[-1]['size']} gauges "
+          f"in {elapsed:.2f} s (load std for {args.noise:g} microstrain of signal noise, "
+          f"{args.gage_factor_error:g} % gage factor and {args.positioning_error:g} % positioning error).")
+    if args.output:
+        df.to_csv(args.output, index=False)
+        print("Subsets saved at: " + args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# endregion
@@ -7,6 +7,7 @@ The program gets each analysis environment from top to bottom, assuming that the
 The columns of the matrix specifies are those load cases. 
 Within each analysis environment, the results from each normal strain result objects with "StrainX_SG" in their names and that are NOT suppressed, are extracted. 
 Each extracted value is the average value of that strain gauge result. 
+The results are exported in one pass ("unit_load_results_export.csv") and the matrix is assembled outside Mechanical by strain_sensitivity_matrix_assembler.py. 
 The columns of sensitivity matrix correspond to the response of each strain gauge for each unit load case. 
 Therefore the rows in each column correspond to sensitivity of each strain gage to that unit load case.
 '''
@@ -23,6 +24,34 @@ clr.AddReference('System.Drawing')
 clr.AddReference("System")
 from System.Drawing import *
 from System.Windows.Forms import *
+from System.Diagnostics import Process, ProcessWindowStyle
+# endregion
+
+# Path of strain_sensitivity_matrix_assembler.py, which builds strain_sensitivity_matrix.csv from the exported
+# unit load results with CPython. Leave empty to look for it next to this script and then in the project folder.
+strain_sensitivity_matrix_assembler_path = r""
+
+# region Find the strain sensitivity matrix assembler
+def find_script_file(file_name, configured_path):
+    # The configured path, then the folder of this script (when it is run from a file), then the project folder
+    candidates = [configured_path]
+    if '__file__' in globals():
+        candidates.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name))
+    candidates.append(os.path.join(project_path, file_name))
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            return candidate
+    return None
+
+# Checked before anything is evaluated, as the matrix cannot be built without it
+strain_sensitivity_matrix_assembler_path = find_script_file('strain_sensitivity_matrix_assembler.py',
+                                                            strain_sensitivity_matrix_assembler_path)
+if strain_sensitivity_matrix_assembler_path is None:
+    message_assembler_missing = ("strain_sensitivity_matrix_assembler.py is not found. Set "
+                                 "strain_sensitivity_matrix_assembler_path at the top of this script or copy the file "
+                                 "into the project folder: " + project_path)
+    MessageBox.Show(message_assembler_missing, "Assembler Missing", MessageBoxButtons.OK, MessageBoxIcon.Error)
+    raise IOError(message_assembler_missing)
 # endregion
 
 # ----------------------------------------------------------------------------------------------------------
@@ -144,8 +173,8 @@ class Form(Form):
             if selectedIndex >= 0 and selectedIndex < len(list_of_endtime_of_time_steps):
                 # Retrieve the corresponding end time based on the selected index
                 self.endtime_of_unit_load = float(list_of_endtime_of_time_steps[selectedIndex])
-                # Assuming you have a way to determine the initial load end time, otherwise set a default or use user input
-                self.endtime_of_initial_load = float(list_of_endtime_of_time_steps[selectedIndex-1])
+                # The step before the unit load step holds the initial loads (none if the unit load is the first step)
+                self.endtime_of_initial_load = float(list_of_endtime_of_time_steps[selectedIndex-1]) if selectedIndex > 0 else None
                 self.DialogResult = DialogResult.OK
                 self.Close()
             else:
@@ -225,7 +254,7 @@ if form.DialogResult == DialogResult.OK:
 
 # ----------------------------------------------------------------------------------------------------------
 
-# region Get results from environments
+# region Get the SG result objects of every unit load study (one pass over the tree)
 ''' 
 From environments with "Unit_Load_Study_LC_" in their names,
 - Get the objects with SG_ in their names if:
@@ -233,112 +262,79 @@ From environments with "Unit_Load_Study_LC_" in their names,
     - They are NOT suppressed
     - They have "StrainX_SG" in their names
 '''
-list_of_list_of_obj_of_SG_results_of_unit_load_studies = [
-    [list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k]
-     for k in range(len(list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children))
-     if list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].Name.Contains("StrainX_SG")
-     and list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].DataModelObjectCategory == DataModelObjectCategory.NormalElasticStrain
-     and list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].Suppressed == False]
-     for i in range(len(list_of_obj_of_analysis_environments_of_unit_load_studies))]
-# Flatten the list
-list_of_obj_of_SG_results_of_unit_load_studies = []
-for sublist in list_of_list_of_obj_of_SG_results_of_unit_load_studies:
-    for item in sublist:
-        list_of_obj_of_SG_results_of_unit_load_studies.append(item)
-# endregion 
-
-# ----------------------------------------------------------------------------------------------------------
-
-# region Set the endtime of SG results to be extracted
-for i in range(len(list_of_obj_of_SG_results_of_unit_load_studies)):
-    list_of_obj_of_SG_results_of_unit_load_studies[i].DisplayTime = Quantity(endtime_of_initial_load, "sec")
-# endregion
-
-# ----------------------------------------------------------------------------------------------------------
-
-# region Evaluate all SG results
-[list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.EvaluateAllResults() 
-for i in range(len(list_of_obj_of_analysis_environments_of_unit_load_studies))]
-# endregion
-
-# ----------------------------------------------------------------------------------------------------------
-
-# region Get the values of each SG due to their initial values (Bolt preload, shrink/rabbet fits etc.) 
-list_of_SG_initial_strains_of_unit_load_studies = [
-    [list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].Average.Value
-     for k in range(len(list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children))
-     if list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].Name.Contains("StrainX_SG")
-     and list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].DataModelObjectCategory == DataModelObjectCategory.NormalElasticStrain
-     and list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].Suppressed == False]
-     for i in range(len(list_of_obj_of_analysis_environments_of_unit_load_studies))]
-# endregion 
-
-# ----------------------------------------------------------------------------------------------------------
-
-# region Set the endtime of SG results to be extracted
-for i in range(len(list_of_obj_of_SG_results_of_unit_load_studies)):
-    list_of_obj_of_SG_results_of_unit_load_studies[i].DisplayTime = Quantity(endtime_of_unit_load, "sec")
-# endregion
-
-# ----------------------------------------------------------------------------------------------------------
+def get_SG_result_objects(analysis):
+    return [child for child in analysis.Solution.Children
+            if child.Name.Contains("StrainX_SG")
+            and child.DataModelObjectCategory == DataModelObjectCategory.NormalElasticStrain
+            and child.Suppressed == False]
 
-# region Evaluate all SG results
-[list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.EvaluateAllResults() 
-for i in range(len(list_of_obj_of_analysis_environments_of_unit_load_studies))]
-# endregion
-
-# ----------------------------------------------------------------------------------------------------------
-
-# region Get the values of each SG due to the application of unit loads only 
-list_of_SG_results_of_unit_load_studies = [
-    [list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].Average.Value
-     for k in range(len(list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children))
-     if list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].Name.Contains("StrainX_SG")
-     and list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].DataModelObjectCategory == DataModelObjectCategory.NormalElasticStrain
-     and list_of_obj_of_analysis_environments_of_unit_load_studies[i].Solution.Children[k].Suppressed == False]
-     for i in range(len(list_of_obj_of_analysis_environments_of_unit_load_studies))]
+list_of_list_of_obj_of_SG_results_of_unit_load_studies = [
+    get_SG_result_objects(analysis) for analysis in list_of_obj_of_analysis_environments_of_unit_load_studies]
 # endregion 
 
 # ----------------------------------------------------------------------------------------------------------
 
-# region Check if all inner lists have the same length
-list_lengths = [len(inner) for inner in list_of_SG_results_of_unit_load_studies]
-if min(list_lengths) != max(list_lengths):
-    raise ValueError("The number of extracted values are different for each unit load application. Please check whether all the analyses have the same number of SGs with name StrainX_SG and they are all evaluated and their results are correct.")
-
-list_lengths = [len(inner) for inner in list_of_SG_initial_strains_of_unit_load_studies]
-if min(list_lengths) != max(list_lengths):
-    raise ValueError("The number of extracted values are different for the initial load results of each unit load application. Please check whether all the analyses have the same number of SGs with name StrainX_SG and they are all evaluated and their results are correct.")
-# endregion
-
-# ----------------------------------------------------------------------------------------------------------
-
-# Subtracting the effect of initial strains from unit load results
-list_of_SG_results_of_unit_load_studies_only = [
-    [result - initial for result, initial in zip(results_list, initial_list)]
-    for results_list, initial_list in 
-    zip(list_of_SG_results_of_unit_load_studies, list_of_SG_initial_strains_of_unit_load_studies)]
-
+# region Export the average strain of every SG result at the initial and the unit load times
+'''
+A result object shows one display time, so each state (initial load, unit load) needs one evaluation
+per environment. Everything else (checks, subtraction of the initial strains, the matrix itself) is done
+outside Mechanical by strain_sensitivity_matrix_assembler.py from this export.
+'''
+def export_SG_results(endtime, state, rows):
+    for i, analysis in enumerate(list_of_obj_of_analysis_environments_of_unit_load_studies):
+        SG_results = list_of_list_of_obj_of_SG_results_of_unit_load_studies[i]
+        for SG_result in SG_results:
+            SG_result.DisplayTime = Quantity(endtime, "sec")
+        analysis.Solution.EvaluateAllResults()
+        for SG_result in SG_results:
+            rows.append([i + 1, analysis.Name, SG_result.Name, state, endtime, SG_result.Average.Value])
+
+# Move the previous matrix aside before anything is exported, so the load reconstruction can never pick up
+# a matrix of earlier unit load results if the export or the assembly fails
 csv_file_name = 'strain_sensitivity_matrix.csv'
-
 csv_file_path = os.path.join(project_path, csv_file_name)
+previous_csv_file_path = csv_file_path + '.previous'
+if os.path.isfile(csv_file_path):
+    if os.path.isfile(previous_csv_file_path):
+        os.remove(previous_csv_file_path)
+    os.rename(csv_file_path, previous_csv_file_path)
+
+export_rows = []
+# Values of each SG due to their initial values (Bolt preload, shrink/rabbet fits etc.), if any
+if endtime_of_initial_load is not None:
+    export_SG_results(endtime_of_initial_load, "initial", export_rows)
+# Values of each SG due to the application of unit loads
+export_SG_results(endtime_of_unit_load, "unit", export_rows)
+
+export_file_name = 'unit_load_results_export.csv'
+export_file_path = os.path.join(project_path, export_file_name)
 
 # Write to CSV file into the specified project path
-with open(csv_file_path, 'wb') as csvfile:
+with open(export_file_path, 'wb') as csvfile:
     writer = csv.writer(csvfile)
-    
-    # Use zip(*list_of_SG_results_of_unit_load_studies) to transpose the list of lists
-    for row in zip(*list_of_SG_results_of_unit_load_studies_only):
+    writer.writerow(['Load Case', 'Environment', 'Result', 'State', 'Time [s]', 'Average'])
+    for row in export_rows:
         writer.writerow(row)
 # endregion
 
 # ----------------------------------------------------------------------------------------------------------
 
-# region Show the generated strain sensitivity matrix [A]
+# region Assemble the strain sensitivity matrix [A] outside Mechanical
+process = Process()
+process.StartInfo.UseShellExecute = True
+process.StartInfo.WindowStyle = ProcessWindowStyle.Minimized
+process.StartInfo.FileName = "cmd.exe"
+process.StartInfo.Arguments = '/k python "' + strain_sensitivity_matrix_assembler_path + '" "' + export_file_path + '" --output "' + csv_file_path + '"'
+process.Start()
 message_success = r"""
-The script for generating the strain sensitivity matrix [A] is run successfully.
+The unit load results are exported and the strain sensitivity matrix [A] is being assembled (see the minimized command window).
 Please verify the contents of the generated CSV file in the specified project path by the "Project Folder" button.
 """
+# endregion
+
+# ----------------------------------------------------------------------------------------------------------
+
+# region Show the generated strain sensitivity matrix [A]
 msg = Ansys.Mechanical.Application.Message(message_success, MessageSeverityType.Info)
 ExtAPI.Application.Messages.Add(msg)
 
@@ -0,0 +1,307 @@
+# Load Reconstruction Benchmark
+
+"""
+Benchmarks the load reconstruction engine (load_reconstruction_engine.py) on synthetic sensitivity matrices and
+strain histories, and verifies it against the analytical beam of
+SG_Verif_Ex_Load_Reconstruction_1_Analytical_Beam.ipynb.
+
+Verification (rectangular beam, height a, width b, Young's modulus E, axial force F and bending moment Mb):
+    strain at height y = F / (a b E) + Mb y / (E I),   I = b a^3 / 12
+    - the two-gauge example of the notebook (upper and lower surface) must give F = -1000 N, Mb = 1 Nm
+    - with gauges spread symmetrically through the height, the columns of [A] are orthogonal, so every mode has a
+      closed form solution on a noise-free load history: "wls" the true loads, "tikhonov" the true loads times the
+      filter factor s^2 / (s^2 + lambda^2), "nnls" and "box" the true loads clipped to the bounds
+    - with gauge noise sigma, the scatter of the "wls" loads must match the predicted sigma / |column of [A]|
+
+Benchmark: for every gauge count, a synthetic [A] with a set condition number and a strain history of smooth
+loads plus gauge noise. The history is streamed in chunks of bounded size (a few distinct chunks, generated once
+and cycled), so 10^6+ time steps with thousands of gauges fit in memory. Times the operator builds ("qr",
+"cholesky", "svd", from the cache), the diagnostics SVD and every reconstruction mode over the whole history.
+
+Usage:
+    python load_reconstruction_benchmark.py                                   # verification + 1M steps
+    python load_reconstruction_benchmark.py --gauges 32,1000,4000 --loads 12 --steps 2M
+    python load_reconstruction_benchmark.py --steps 10k --skip-benchmark --output benchmark.csv
+
+The exit code is 1 if any verification check fails.
+"""
+
+# region Import necessary libraries
+import argparse
+import contextlib
+import io
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import load_reconstruction_engine as engine
+# endregion
+
+# Analytical beam of the verification notebook (SI units)
+BEAM_HEIGHT = 0.01          # a [m]
+BEAM_WIDTH = 0.02           # b [m]
+YOUNGS_MODULUS = 200e9      # E [Pa]
+NOTEBOOK_STRAINS = (-1e-5, -4e-5)       # upper and lower surface [mm/mm]
+NOTEBOOK_LOADS = (-1000.0, 1.0)         # F [N], Mb [Nm]
+
+
+def parse_size(text):
+    """Parses counts such as '10k', '2.5M' or '50000'."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if scale > 1 else text
+    return int(float(number) * scale)
+
+
+def time_call(func, repeat):
+    """Runs func `repeat` times and returns (best, median, result of the last run) wall time in seconds."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), float(np.median(timings)), result
+
+
+# region Analytical beam
+def beam_sensitivity_matrix(gauge_heights, a=BEAM_HEIGHT, b=BEAM_WIDTH, E=YOUNGS_MODULUS):
+    # Strain per unit axial force and per unit bending moment of gauges at the given heights
+    # (measured from the neutral axis, positive towards the upper surface)
+    inertia = b * a ** 3 / 12
+    gauge_heights = np.asarray(gauge_heights, dtype=np.float64)
+    return np.column_stack([np.full(len(gauge_heights), 1 / (a * b * E)), gauge_heights / (E * inertia)])
+
+
+def beam_load_history(n_steps, seed=0):
+    # Axial force [N] and bending moment [Nm] of the notebook scale, both changing sign
+    t = np.linspace(0, 1, n_steps)
+    rng = np.random.default_rng(seed)
+    force = -1000 * np.sin(2 * np.pi * 3 * t) + 200 * rng.standard_normal(n_steps)
+    moment = 1.5 * np.cos(2 * np.pi * 5 * t) + 0.2 * rng.standard_normal(n_steps)
+    return np.column_stack([force, moment])
+
+
+def _relative_error(estimate, expected):
+    return float(np.max(np.abs(estimate - expected)) / max(np.max(np.abs(expected)), np.finfo(float).tiny))
+
+
+def verify_against_analytical_beam(n_gauges=9, n_steps=50_000, noise_microstrains=1.0, seed=0):
+    """
+    Returns:
+        list: One dict per check with its name, error, tolerance and whether it passed.
+    """
+    checks = []
+
+    def check(name, error, tolerance):
+        checks.append({'Check': name, 'Error': error, 'Tolerance': tolerance, 'Passed': bool(error <= tolerance)})
+
+    # Two-gauge example of the notebook: exactly determined, every factorization must recover it
+    A_two = beam_sensitivity_matrix([BEAM_HEIGHT / 2, -BEAM_HEIGHT / 2])
+    for solver in ("qr", "cholesky", "svd"):
+        loads = engine.reconstruct_loads(A_two, NOTEBOOK_STRAINS, solver=solver)
+        check(f"notebook example, wls ({solver})", _relative_error(loads[0], np.array(NOTEBOOK_LOADS)), 1e-9)
+
+    # Gauges through the height, symmetric about the neutral axis: orthogonal columns of [A]
+    A_matrix = beam_sensitivity_matrix(np.linspace(-BEAM_HEIGHT / 2, BEAM_HEIGHT / 2, n_gauges))
+    weights = engine.equal_gauge_weights(n_gauges)
+    true_loads = beam_load_history(n_steps, seed)
+    strains = true_loads @ A_matrix.T
+
+    loads = engine.reconstruct_loads(A_matrix, strains, weights)
+    check(f"{n_gauges} gauges, wls", _relative_error(loads, true_loads), 1e-9)
+
+    solver = engine.LoadSolver(A_matrix, weights, mode="tikhonov", strain_chunks=lambda: [strains], verbose=False)
+    column_energy = weights[0] * np.sum(A_matrix ** 2, axis=0)
+    filter_factors = column_energy / (column_energy + solver.tikhonov_parameter ** 2)
+    check(f"{n_gauges} gauges, tikhonov (lambda {solver.tikhonov_parameter:.3g})",
+          _relative_error(solver.solve(strains), true_loads * filter_factors), 1e-9)
+
+    loads = engine.reconstruct_loads(A_matrix, strains, weights, mode="nnls")
+    check(f"{n_gauges} gauges, nnls", _relative_error(loads, np.clip(true_loads, 0, None)), 1e-9)
+
+    lower, upper = np.array([-800.0, -1.0]), np.array([600.0, 1.2])
+    loads = engine.reconstruct_loads(A_matrix, strains, weights, mode="box", lower_bounds=lower, upper_bounds=upper)
+    check(f"{n_gauges} gauges, box", _relative_error(loads, np.clip(true_loads, lower, upper)), 1e-9)
+
+    # Gauge noise: the scatter of the loads must match the predicted standard deviation
+    rng = np.random.default_rng(seed + 1)
+    noisy_strains = strains + noise_microstrains * 1e-6 * rng.standard_normal(strains.shape)
+    scatter = np.std(engine.reconstruct_loads(A_matrix, noisy_strains, weights) - true_loads, axis=0)
+    predicted = noise_microstrains * 1e-6 / np.linalg.norm(A_matrix, axis=0)
+    check(f"{n_gauges} gauges, wls noise scatter ({noise_microstrains:g} microstrain)",
+          float(np.max(np.abs(scatter / predicted - 1))), 5 / np.sqrt(2 * n_steps))
+    return checks
+# endregion
+
+
+# region Synthetic models
+def synthetic_sensitivity_matrix(n_gauges, n_loads, condition_number=100, seed=0):
+    # [A] = U diag(s) V^T with random orthonormal U, V and singular values log-spaced from 1 down to
+    # 1 / condition_number, scaled so that the best resolved load direction gives about 100 microstrain
+    # per unit load on a gauge
+    rng = np.random.default_rng(seed)
+    U, _ = np.linalg.qr(rng.standard_normal((n_gauges, n_loads)))
+    V, _ = np.linalg.qr(rng.standard_normal((n_loads, n_loads)))
+    s = np.logspace(0, -np.log10(condition_number), n_loads)
+    return 100e-6 * np.sqrt(n_gauges) * (U * s) @ V.T
+
+
+def synthetic_load_history(n_steps, n_loads, start_step=0, seed=0):
+    # Smooth positive loads around 1 (one frequency per load); about a third of the time steps of every load
+    # are above 1.5, the upper bound of the "box" benchmark
+    steps = np.arange(start_step, start_step + n_steps)[:, None]
+    frequencies = 1e-4 * (1 + np.arange(n_loads))[None, :]
+    phases = np.random.default_rng(seed).uniform(0, 2 * np.pi, n_loads)[None, :]
+    return 1 + 0.9 * np.sin(2 * np.pi * frequencies * steps + phases)
+
+
+def synthetic_strain_chunks(A_matrix, n_steps, chunk_mb=64, pool_size=4, noise_microstrains=1.0, seed=0):
+    """
+    Streams a strain history of n_steps time steps in chunks of about chunk_mb megabytes, cycling through
+    pool_size distinct chunks generated once, so memory use does not grow with n_steps.
+
+    Returns:
+        tuple: (callable returning an iterator over (true loads, strains) chunks, chunk length)
+    """
+    n_gauges, n_loads = A_matrix.shape
+    chunk_steps = int(max(1, min(n_steps, chunk_mb * 1e6 // (8 * n_gauges))))
+    rng = np.random.default_rng(seed)
+    pool = []
+    for i in range(min(pool_size, -(-n_steps // chunk_steps))):
+        loads = synthetic_load_history(chunk_steps, n_loads, i * chunk_steps, seed)
+        strains = loads @ A_matrix.T + noise_microstrains * 1e-6 * rng.standard_normal((chunk_steps, n_gauges))
+        pool.append((loads, strains))
+
+    def chunks():
+        for i, start in enumerate(range(0, n_steps, chunk_steps)):
+            loads, strains = pool[i % len(pool)]
+            stop = min(chunk_steps, n_steps - start)
+            yield loads[:stop], strains[:stop]
+    return chunks, chunk_steps
+# endregion
+
+
+# region Benchmark
+def benchmark_model(n_gauges, args):
+    """Times the operator builds and every reconstruction mode for one gauge count. Returns a list of result rows."""
+    rows = []
+    A_matrix = synthetic_sensitivity_matrix(n_gauges, args.loads, args.condition_number, args.seed)
+    weights = engine.equal_gauge_weights(n_gauges)
+    chunks, chunk_steps = synthetic_strain_chunks(A_matrix, args.steps, args.chunk_mb, noise_microstrains=args.noise,
+                                                  seed=args.seed)
+    print(f"\n{n_gauges} gauges x {args.loads} loads, condition number {args.condition_number:.3g}, "
+          f"{args.steps} time steps in chunks of {chunk_steps}", flush=True)
+
+    def record(name, best, median, steps=None, error=None):
+        row = {'Gauges': n_gauges, 'Loads': args.loads, 'Steps': steps, 'Benchmark': name,
+               'Best [s]': best, 'Median [s]': median,
+               'us per Step': best / steps * 1e6 if steps else None, 'RMS Error / RMS Load': error}
+        rows.append(row)
+        rate = f"   {row['us per Step']:8.3f} us/step" if steps else ""
+        accuracy = f"   rms error {error:.3g}" if error is not None else ""
+        print(f"  {name:<34s} best {best:9.4f} s   median {median:9.4f} s{rate}{accuracy}", flush=True)
+
+    # Operator builds, and the cached operator of a second run
+    for solver in ("qr", "cholesky", "svd"):
+        best, median, _ = time_call(lambda: engine.build_reconstruction_operator(A_matrix, weights, solver),
+                                    args.repeat)
+        record(f"operator build ({solver})", best, median)
+    with tempfile.TemporaryDirectory() as cache_folder:
+        engine.get_reconstruction_operator(A_matrix, weights, cache_folder)
+        with contextlib.redirect_stdout(io.StringIO()):
+            best, median, _ = time_call(lambda: engine.get_reconstruction_operator(A_matrix, weights, cache_folder),
+                                        args.repeat)
+        record("operator from cache (qr)", best, median)
+    best, median, _ = time_call(lambda: engine.sensitivity_matrix_diagnostics(A_matrix, weights), args.repeat)
+    record("diagnostics (SVD)", best, median)
+
+    # Reconstruction of the whole history in every mode; the setup (operator, Tikhonov sweep over the
+    # history, Gram matrix) and the chunk loop are timed separately
+    mode_options = {'wls': {}, 'tikhonov': {}, 'nnls': {}, 'box': {'lower_bounds': 0.0, 'upper_bounds': 1.5}}
+    for mode in args.modes:
+        options = mode_options[mode]
+        best, median, solver = time_call(
+            lambda: engine.LoadSolver(A_matrix, weights, mode=mode, verbose=False,
+                                      strain_chunks=lambda: (strains for _, strains in chunks()), **options),
+            args.repeat)
+        record(f"{mode} setup", best, median)
+
+        def solve_history():
+            elapsed, squared_error, squared_load = 0.0, 0.0, 0.0
+            if mode in ("nnls", "box"):
+                solver.previous_loads = np.clip(np.zeros(args.loads), solver.lower, solver.upper)
+            for true_loads, strains in chunks():
+                start = time.perf_counter()
+                loads = solver.solve(strains)
+                elapsed += time.perf_counter() - start
+                squared_error += np.sum((loads - true_loads) ** 2)
+                squared_load += np.sum(true_loads ** 2)
+            return elapsed, np.sqrt(squared_error / squared_load)
+
+        results = [solve_history() for _ in range(args.repeat)]
+        timings = [elapsed for elapsed, _ in results]
+        label = f"{mode} solve"
+        if mode in ("nnls", "box"):
+            label += f" ({solver.constrained_steps // args.repeat} constrained)"
+        record(label, min(timings), float(np.median(timings)), args.steps, results[-1][1])
+    return rows
+# endregion
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark and verify the load reconstruction engine.")
+    parser.add_argument("--gauges", default="32,1000,4000",
+                        help="Comma separated gauge counts, e.g. 100,2k (default: 32,1000,4000).")
+    parser.add_argument("--loads", type=int, default=6, help="Number of loads (default: 6).")
+    parser.add_argument("--steps", type=parse_size, default=parse_size("1M"),
+                        help="Time steps of the strain history, e.g. 100k or 2M (default: 1M).")
+    parser.add_argument("--modes", default=",".join(engine.RECONSTRUCTION_MODES),
+                        help="Comma separated reconstruction modes (default: all).")
+    parser.add_argument("--condition-number", type=float, default=100,
+                        help="Condition number of the synthetic sensitivity matrices (default: 100).")
+    parser.add_argument("--noise", type=float, default=1.0, help="Gauge noise in microstrains (default: 1).")
+    parser.add_argument("--chunk-mb", type=float, default=64, help="Size of a strain chunk in MB (default: 64).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per benchmark (default: 1).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-benchmark", action="store_true", help="Only run the verification.")
+    parser.add_argument("--output", default=None, help="Save the benchmark results to this CSV file.")
+    args = parser.parse_args(argv)
+    args.modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in args.modes if mode not in engine.RECONSTRUCTION_MODES]
+    if unknown:
+        parser.error(f"Unknown reconstruction modes: {unknown}")
+
+    print(f"Python {platform.python_version()}, numpy {np.__version__}, {platform.machine()}, "
+          f"{os.cpu_count()} CPUs")
+
+    print("\nVerification against the analytical beam")
+    checks = verify_against_analytical_beam(n_steps=min(args.steps, 50_000), noise_microstrains=args.noise,
+                                            seed=args.seed)
+    for check in checks:
+        status = "ok" if check['Passed'] else "FAILED"
+        print(f"  {check['Check']:<52s} error {check['Error']:9.3g}   tolerance {check['Tolerance']:9.3g}   {status}")
+
+    if not args.skip_benchmark:
+        rows = []
+        for n_gauges in (parse_size(size) for size in args.gauges.split(",")):
+            rows.extend(benchmark_model(n_gauges, args))
+        if args.output:
+            pd.DataFrame(rows).to_csv(args.output, index=False)
+            print("\nBenchmark results saved at: " + args.output)
+
+    failed = [check['Check'] for check in checks if not check['Passed']]
+    if failed:
+        print(f"\n{len(failed)} verification check(s) failed: " + ", ".join(failed))
+        return 1
+    print("\nAll verification checks passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
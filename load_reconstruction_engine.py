@@ -0,0 +1,422 @@
+# Load Reconstruction Engine
+
+"""
+Solver of the load reconstruction: gauge weights, the cached weighted least squares operator, the sensitivity
+matrix diagnostics and the regularized and constrained reconstruction modes.
+load_reconstruction_function_with_errors_weighting_function_v1.py copies this file next to the CPython script it
+generates in the solution folder, which imports it from there; the module only needs numpy and pandas.
+
+    loads = LoadSolver(A_matrix, weights, mode="wls").solve(strains)          # strains: (n_steps, n_gauges)
+
+Modes: "wls" (weighted least squares, operator from a "qr", "cholesky" or "svd" factorization), "tikhonov"
+(lambda from a GCV / L-curve sweep computed from one SVD), "nnls" and "box" (bound-constrained, active set solver
+warm-started from the previous time step). Operators and SVD factors can be cached in a folder as .npz files,
+shared with the Mechanical script and load_reconstruction_online_v0.py.
+
+Also used by load_reconstruction_online_v0.py, load_reconstruction_benchmark.py and gauge_subset_selection_v0.py.
+"""
+
+# region Import necessary libraries
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+# endregion
+
+# Factorization used to build the weighted least squares operator: "qr", "cholesky" or "svd"
+DEFAULT_SOLVER = "qr"
+# Folder (next to strain_sensitivity_matrix.csv) where reconstruction operators are cached
+RECONSTRUCTION_CACHE_FOLDER_NAME = "load_reconstruction_cache"
+# Condition numbers above this are flagged in the sensitivity matrix diagnostics
+CONDITION_NUMBER_WARNING = 1e4
+RECONSTRUCTION_MODES = ("wls", "tikhonov", "nnls", "box")
+
+
+# region Gauge weights
+def compute_gauge_weights(rms_strain_per_gauge, signal_noise_microstrains, gage_factor_error_percent,
+                          positioning_error_percent):
+    # Calculate variances from different error sources for each gauge
+    signal_noise = signal_noise_microstrains * 1e-6
+    signal_noise_variance = signal_noise ** 2
+
+    gage_factor_error = gage_factor_error_percent / 100
+    positioning_error = positioning_error_percent / 100
+
+    # Total variance for each strain gauge measurement
+    total_variance_per_gauge = (signal_noise_variance +
+                                (gage_factor_error ** 2) * rms_strain_per_gauge ** 2 +
+                                (positioning_error ** 2) * rms_strain_per_gauge ** 2)
+
+    total_variance_per_gauge = np.where(total_variance_per_gauge == 0, 1e-10, total_variance_per_gauge)
+
+    # Weight of each gauge (inverse variance)
+    return 1 / total_variance_per_gauge
+
+
+def equal_gauge_weights(n_gauges):
+    # Weights of the reconstruction without error parameters (all variances replaced by 1e-10)
+    return compute_gauge_weights(np.zeros(n_gauges), 0, 0, 0)
+# endregion
+
+
+# region Load reconstruction engine (factorized, cached weighted least squares operator)
+def reconstruction_cache_key(A_matrix, weights, solver):
+    # Identifies an operator by the sensitivity matrix, the gauge weights and the solver
+    digest = hashlib.sha1()
+    digest.update(np.asarray(A_matrix.shape, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(A_matrix, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(weights, dtype=np.float64).tobytes())
+    digest.update(solver.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_reconstruction_operator(A_matrix, weights, solver=DEFAULT_SOLVER, svd_factors=None):
+    # Returns the weighted least squares operator P (n_loads x n_gauges), so that the loads
+    # of every time step are L_hat = P @ strains.
+    # The weights are applied as row scaling of A by sqrt(w) (no n_gauges x n_gauges matrix),
+    # and the normal equations are never inverted explicitly:
+    #   "qr":       A_w = Q R              ->  P = R^-1 Q^T diag(sqrt(w))
+    #   "cholesky": A_w^T A_w = C C^T      ->  P = C^-T C^-1 A_w^T diag(sqrt(w))
+    #   "svd":      A_w = U diag(s) V^T    ->  P = V diag(1/s) U^T diag(sqrt(w))
+    #               (svd_factors (U, s, Vt), e.g. from get_weighted_svd, are used when given)
+    # QR works on A_w itself and loses no accuracy to squaring the condition number.
+    A_matrix = np.asarray(A_matrix, dtype=np.float64)
+    sqrt_w = np.sqrt(np.asarray(weights, dtype=np.float64))
+    A_w = A_matrix * sqrt_w[:, None]
+
+    n_gauges, n_loads = A_w.shape
+    if n_gauges < n_loads:
+        raise ValueError(f"The sensitivity matrix has {n_gauges} gauges for {n_loads} loads. "
+                         f"At least as many gauges as loads are needed.")
+
+    if solver == "cholesky":
+        C = np.linalg.cholesky(A_w.T @ A_w)
+        P = np.linalg.solve(C.T, np.linalg.solve(C, A_w.T))
+    elif solver == "qr":
+        Q, R = np.linalg.qr(A_w, mode="reduced")
+        if np.any(np.abs(np.diag(R)) <= np.finfo(float).eps * np.abs(R).max() * max(A_w.shape)):
+            raise np.linalg.LinAlgError("The weighted sensitivity matrix is rank deficient; "
+                                        "some loads cannot be resolved by the gauges.")
+        P = np.linalg.solve(R, Q.T)
+    elif solver == "svd":
+        U, s, Vt = svd_factors[:3] if svd_factors is not None else np.linalg.svd(A_w, full_matrices=False)
+        if s[-1] <= np.finfo(float).eps * s[0] * max(A_w.shape):
+            raise np.linalg.LinAlgError("The weighted sensitivity matrix is rank deficient; "
+                                        "some loads cannot be resolved by the gauges.")
+        P = (Vt.T / s) @ U.T
+    else:
+        raise ValueError(f"Unknown reconstruction solver: {solver}")
+
+    return P * sqrt_w[None, :]
+
+
+def get_reconstruction_operator(A_matrix, weights, cache_folder=None, solver=DEFAULT_SOLVER):
+    # Returns the reconstruction operator, loading it from the .npz cache in cache_folder when
+    # the same sensitivity matrix and weights were used before. New operators are stored there,
+    # so later runs against the same strain_sensitivity_matrix.csv only need P @ strains.
+    key = reconstruction_cache_key(A_matrix, weights, solver)
+    cache_file_path = None
+    if cache_folder:
+        cache_file_path = os.path.join(cache_folder, f"operator_{key}.npz")
+        if os.path.isfile(cache_file_path):
+            try:
+                with np.load(cache_file_path) as cached:
+                    if str(cached["key"]) == key:
+                        print("Reconstruction operator loaded from cache: " + cache_file_path)
+                        return cached["operator"]
+            except Exception as e:
+                print(f"Ignoring unreadable operator cache ({e}).")
+
+    svd_factors = get_weighted_svd(A_matrix, weights, cache_folder) if solver == "svd" else None
+    operator = build_reconstruction_operator(A_matrix, weights, solver, svd_factors)
+
+    if cache_file_path:
+        try:
+            os.makedirs(cache_folder, exist_ok=True)
+            np.savez(cache_file_path, key=key, operator=operator, solver=solver)
+        except OSError as e:
+            print(f"Could not cache the reconstruction operator ({e}).")
+    return operator
+# endregion
+
+
+# region Sensitivity matrix diagnostics (one cached SVD of the weighted matrix)
+def build_weighted_svd(A_matrix, weights):
+    # Thin SVD of the row-scaled sensitivity matrix: A_w = diag(sqrt(w)) A = U diag(s) V^T
+    sqrt_w = np.sqrt(np.asarray(weights, dtype=np.float64))
+    U, s, Vt = np.linalg.svd(np.asarray(A_matrix, dtype=np.float64) * sqrt_w[:, None], full_matrices=False)
+    return U, s, Vt
+
+
+def get_weighted_svd(A_matrix, weights, cache_folder=None):
+    # Returns (U, s, Vt, sqrt_w), loading the factors from the .npz cache in cache_folder when the same
+    # sensitivity matrix and weights were factorized before (by the diagnostics, the "svd" solver or
+    # the Tikhonov mode; all of them share these factors)
+    sqrt_w = np.sqrt(np.asarray(weights, dtype=np.float64))
+    key = reconstruction_cache_key(A_matrix, weights, "svd")
+    cache_file_path = os.path.join(cache_folder, f"svd_{key}.npz") if cache_folder else None
+    if cache_file_path and os.path.isfile(cache_file_path):
+        try:
+            with np.load(cache_file_path) as cached:
+                if str(cached["key"]) == key:
+                    return cached["U"], cached["s"], cached["Vt"], sqrt_w
+        except Exception as e:
+            print(f"Ignoring unreadable SVD cache ({e}).")
+
+    U, s, Vt = build_weighted_svd(A_matrix, weights)
+    if cache_file_path:
+        try:
+            os.makedirs(cache_folder, exist_ok=True)
+            np.savez(cache_file_path, key=key, U=U, s=s, Vt=Vt)
+        except OSError as e:
+            print(f"Could not cache the SVD of the sensitivity matrix ({e}).")
+    return U, s, Vt, sqrt_w
+
+
+def sensitivity_matrix_diagnostics(A_matrix, weights, cache_folder=None, gauge_names=None):
+    # Observability of the loads from one SVD of the weighted matrix A_w = U diag(s) V^T:
+    # - condition number s_max / s_min: relative noise in the strains can be amplified up to this
+    #   factor in the loads
+    # - per load: column norm (how strongly the gauges see the load), standard deviation of the
+    #   estimated load per microstrain of independent noise on every gauge (rows of
+    #   P = V diag(1/s) U^T diag(sqrt(w))), the collinearity factor |a_j| |p_j| (1 for a load the
+    #   gauges separate perfectly from the others, large when they confuse it with other loads) and
+    #   its share in the weakest singular direction
+    # - per gauge: leverage, the diagonal of the hat matrix U U^T (sums to the number of loads). A
+    #   leverage near 1 means no other gauge backs this one up: an error on it goes straight into the loads
+    U, s, Vt, sqrt_w = get_weighted_svd(A_matrix, weights, cache_folder)
+    n_gauges, n_loads = A_matrix.shape
+    operator = (Vt.T / s) @ (U.T * sqrt_w[None, :])
+    operator_row_norms = np.linalg.norm(operator, axis=1)
+
+    load_report = pd.DataFrame({
+        'Load': [f'Load {j+1}' for j in range(n_loads)],
+        'Sensitivity Norm': np.linalg.norm(A_matrix, axis=0),
+        'Std per Microstrain Noise': operator_row_norms * 1e-6,
+        'Collinearity Factor': np.linalg.norm(A_matrix, axis=0) * operator_row_norms,
+        'Weakest Direction Share': Vt[-1] ** 2,
+    })
+    gauge_report = pd.DataFrame({
+        'Gauge': gauge_names if gauge_names is not None else [f'Gauge {i+1}' for i in range(n_gauges)],
+        'Leverage': np.sum(U ** 2, axis=1),
+    })
+    return {
+        'singular_values': s,
+        'condition_number': s[0] / s[-1] if s[-1] > 0 else np.inf,
+        'loads': load_report,
+        'gauges': gauge_report,
+    }
+
+
+def format_sensitivity_matrix_diagnostics(diagnostics, condition_number_warning=CONDITION_NUMBER_WARNING):
+    lines = ["Sensitivity matrix diagnostics",
+             f"  Condition number (weighted): {diagnostics['condition_number']:.4g}",
+             "  Singular values: " + ", ".join(f"{value:.4g}" for value in diagnostics['singular_values'])]
+    if diagnostics['condition_number'] > condition_number_warning:
+        lines.append(f"  WARNING: condition number above {condition_number_warning:.0g}; the loads will be noisy. "
+                     f"Consider the 'tikhonov' mode or a different gauge layout.")
+    lines.append("")
+    lines.append(diagnostics['loads'].to_string(index=False, float_format=lambda value: f"{value:.4g}"))
+    lines.append("")
+    gauges = diagnostics['gauges'].sort_values('Leverage', ascending=False)
+    lines.append(gauges.to_string(index=False, float_format=lambda value: f"{value:.4g}"))
+    return lines
+# endregion
+
+
+# region Regularized and constrained reconstruction modes
+def tikhonov_operator(U, s, Vt, sqrt_w, tikhonov_parameter):
+    # Minimizes |A_w L - sqrt(w) strains|^2 + lambda^2 |L|^2:
+    #   P = V diag(s / (s^2 + lambda^2)) U^T diag(sqrt(w))
+    # Each singular direction is damped by its filter factor s^2 / (s^2 + lambda^2), so the
+    # directions the gauges barely see no longer amplify the measurement noise.
+    return (Vt.T * (s / (s ** 2 + tikhonov_parameter ** 2))) @ (U.T * sqrt_w[None, :])
+
+
+def tikhonov_parameter_sweep(U, s, sqrt_w, strain_chunks, n_points=200):
+    # Residual norm, solution norm, GCV function and L-curve curvature over a log-spaced range of
+    # lambda, summed over the whole strain history. With beta = U^T sqrt(w) strains per time step,
+    # every quantity is a sum over the singular values, so the history is read once (in chunks)
+    # and the sweep itself costs O(n_points x n_loads):
+    #   residual^2 = sum((1 - f)^2 beta^2) + |part of the strains outside the range of A_w|^2
+    #   solution^2 = sum((f / s)^2 beta^2)
+    #   GCV        = residual^2 / (n_gauges - sum(f))^2
+    # The weights are folded into U and into the energy sum, so the chunks are never copied
+    U_w = U * sqrt_w[:, None]
+    coefficient_energy = np.zeros(len(s))
+    total_energy = 0.0
+    for strains in strain_chunks:
+        coefficient_energy += np.sum((strains @ U_w) ** 2, axis=0)
+        total_energy += np.einsum('ij,ij->j', strains, strains) @ sqrt_w ** 2
+    outside_energy = max(total_energy - coefficient_energy.sum(), 0.0)
+
+    smallest = max(s[-1], s[0] * 1e-12)
+    lambdas = np.logspace(np.log10(smallest) - 2, np.log10(s[0]) + 1, n_points)
+    f = s[None, :] ** 2 / (s[None, :] ** 2 + lambdas[:, None] ** 2)
+    residual_norm = np.sqrt(np.sum((1 - f) ** 2 * coefficient_energy, axis=1) + outside_energy)
+    solution_norm = np.sqrt(np.sum((f / s[None, :]) ** 2 * coefficient_energy, axis=1))
+    degrees_of_freedom = U.shape[0] - np.sum(f, axis=1)
+    gcv = residual_norm ** 2 / np.maximum(degrees_of_freedom, np.finfo(float).tiny) ** 2
+
+    # Curvature of (log residual, log solution) along log lambda; the L-curve corner is its maximum
+    x = np.log(np.maximum(residual_norm, np.finfo(float).tiny))
+    y = np.log(np.maximum(solution_norm, np.finfo(float).tiny))
+    t = np.log(lambdas)
+    dx, dy = np.gradient(x, t), np.gradient(y, t)
+    ddx, ddy = np.gradient(dx, t), np.gradient(dy, t)
+    curvature = (dx * ddy - ddx * dy) / np.maximum((dx ** 2 + dy ** 2) ** 1.5, np.finfo(float).tiny)
+
+    return pd.DataFrame({'Lambda': lambdas, 'Residual Norm': residual_norm, 'Solution Norm': solution_norm,
+                         'GCV': gcv, 'L-Curve Curvature': curvature})
+
+
+def select_tikhonov_parameter(sweep, n_gauges, n_loads, rule="gcv"):
+    # GCV needs redundant gauges; with as many gauges as loads it is undefined, so the L-curve is used
+    if rule == "gcv" and n_gauges > n_loads:
+        return float(sweep['Lambda'].values[np.argmin(sweep['GCV'].values)])
+    if rule in ("gcv", "lcurve"):
+        # Ignore the ends of the sweep, where the finite difference curvature is one-sided
+        curvature = sweep['L-Curve Curvature'].values[2:-2]
+        return float(sweep['Lambda'].values[2 + np.argmax(curvature)])
+    raise ValueError(f"Unknown Tikhonov parameter rule: {rule}")
+
+
+def load_bounds(n_loads, mode, lower_bounds=None, upper_bounds=None):
+    # Lower and upper bound of every load for the constrained modes; the bounds of the "box" mode are a
+    # number (all loads) or one value per load, None is unbounded
+    if mode == "nnls":
+        return np.zeros(n_loads), np.full(n_loads, np.inf)
+    lower = np.full(n_loads, -np.inf) if lower_bounds is None else lower_bounds
+    upper = np.full(n_loads, np.inf) if upper_bounds is None else upper_bounds
+    lower = np.broadcast_to(np.asarray(lower, dtype=np.float64), (n_loads,)).copy()
+    upper = np.broadcast_to(np.asarray(upper, dtype=np.float64), (n_loads,)).copy()
+    if np.any(lower > upper):
+        raise ValueError("The lower load bounds must not exceed the upper load bounds.")
+    return lower, upper
+
+
+def solve_box_constrained_step(gram, gradient_offset, lower, upper, initial_loads):
+    # Primal active set method for min 1/2 L^T G L - g^T L subject to lower <= L <= upper, where
+    # G = A_w^T A_w and g = A_w^T sqrt(w) strains. Starting from a feasible warm start (the solution of
+    # the previous time step, with its loads at their bounds as the active set), consecutive time
+    # steps usually need a single iteration.
+    n_loads = len(gradient_offset)
+    loads = np.clip(initial_loads, lower, upper)
+    at_lower = loads <= lower
+    at_upper = (loads >= upper) & ~at_lower
+    for _ in range(10 * n_loads + 10):
+        free = ~(at_lower | at_upper)
+        # Minimize over the free loads with the others held at their bounds
+        candidate = loads.copy()
+        if free.any():
+            free_rows = gram[free]
+            rhs = gradient_offset[free] - free_rows[:, ~free] @ loads[~free]
+            candidate[free] = np.linalg.solve(free_rows[:, free], rhs)
+
+        step = candidate - loads
+        below, above = free & (candidate < lower), free & (candidate > upper)
+        if below.any() or above.any():
+            # Move as far as feasible and hold the blocking load at its bound
+            ratios = np.full(n_loads, np.inf)
+            ratios[below] = (lower[below] - loads[below]) / step[below]
+            ratios[above] = (upper[above] - loads[above]) / step[above]
+            blocking = int(np.argmin(ratios))
+            loads = np.clip(loads + ratios[blocking] * step, lower, upper)
+            if below[blocking]:
+                at_lower[blocking] = True
+            else:
+                at_upper[blocking] = True
+            continue
+
+        loads = candidate
+        # Optimal once no bound pushes against the objective (KKT multipliers of the right sign)
+        gradient = gram @ loads - gradient_offset
+        multipliers = np.where(at_lower, gradient, np.where(at_upper, -gradient, 0.0))
+        release = int(np.argmin(multipliers))
+        if multipliers[release] >= -1e-12 * max(np.abs(gradient_offset).max(), 1e-300):
+            return loads
+        at_lower[release] = at_upper[release] = False
+    return loads
+
+
+class LoadSolver:
+    # Reconstructs the loads chunk by chunk in the selected mode:
+    #   "wls":      weighted least squares, the cached operator of get_reconstruction_operator
+    #   "tikhonov": regularized weighted least squares; lambda is tikhonov_parameter, or selected from
+    #               a GCV / L-curve sweep over the strain history (strain_chunks) computed from one SVD
+    #   "nnls":     weighted least squares with non-negative loads
+    #   "box":      weighted least squares with lower_bounds <= loads <= upper_bounds
+    # The constrained modes start from the unconstrained solution of the whole chunk (one matrix
+    # multiply) and only solve the time steps that violate a bound, warm-started from the previous
+    # time step (also across chunks).
+    def __init__(self, A_matrix, weights, cache_folder=None, mode="wls", strain_chunks=None, solver=DEFAULT_SOLVER,
+                 tikhonov_parameter=None, tikhonov_rule="gcv", tikhonov_sweep_points=200, lower_bounds=None,
+                 upper_bounds=None, verbose=True):
+        if mode not in RECONSTRUCTION_MODES:
+            raise ValueError(f"Unknown reconstruction mode: {mode}")
+        self.mode = mode
+        self.sweep = None
+        self.tikhonov_parameter = None
+        n_gauges, n_loads = A_matrix.shape
+
+        if mode == "tikhonov":
+            U, s, Vt, sqrt_w = get_weighted_svd(A_matrix, weights, cache_folder)
+            self.tikhonov_parameter = tikhonov_parameter
+            if self.tikhonov_parameter is None:
+                self.sweep = tikhonov_parameter_sweep(U, s, sqrt_w, strain_chunks() if strain_chunks else [],
+                                                      tikhonov_sweep_points)
+                self.tikhonov_parameter = select_tikhonov_parameter(self.sweep, n_gauges, n_loads, tikhonov_rule)
+            if verbose:
+                print(f"Tikhonov parameter: {self.tikhonov_parameter:.6g} "
+                      f"(singular values of the weighted matrix: {s[0]:.6g} to {s[-1]:.6g})")
+            self.operator = tikhonov_operator(U, s, Vt, sqrt_w, self.tikhonov_parameter)
+        else:
+            self.operator = get_reconstruction_operator(A_matrix, weights, cache_folder, solver)
+
+        if mode in ("nnls", "box"):
+            A_w = A_matrix * np.sqrt(weights)[:, None]
+            self.gram = A_w.T @ A_w
+            self.lower, self.upper = load_bounds(n_loads, mode, lower_bounds, upper_bounds)
+            self.previous_loads = np.clip(np.zeros(n_loads), self.lower, self.upper)
+            self.constrained_steps = 0
+
+    def solve(self, strains):
+        loads = strains @ self.operator.T
+        if self.mode not in ("nnls", "box"):
+            return loads
+
+        # The unconstrained solution satisfies G L = g, so g = G L_unconstrained
+        violating = np.flatnonzero(np.any((loads < self.lower) | (loads > self.upper), axis=1))
+        self.constrained_steps += len(violating)
+        for row in violating:
+            # Rows are solved in order, so the previous row already holds its (feasible) final loads
+            initial_loads = loads[row - 1] if row > 0 else self.previous_loads
+            loads[row] = solve_box_constrained_step(self.gram, self.gram @ loads[row], self.lower, self.upper,
+                                                    initial_loads)
+        if len(loads):
+            self.previous_loads = loads[-1].copy()
+        return loads
+# endregion
+
+
+def reconstruct_loads(A_matrix, strains, weights=None, mode="wls", **solver_options):
+    """
+    Estimates the loads of a strain history in one call.
+
+    Args:
+        A_matrix (np.ndarray): Sensitivity matrix (n_gauges x n_loads).
+        strains (np.ndarray): Strains (n_steps x n_gauges), gauges in the row order of A_matrix.
+        weights (np.ndarray, optional): Gauge weights (inverse variances); equal weights by default.
+        mode (str): One of RECONSTRUCTION_MODES.
+        **solver_options: Further LoadSolver arguments (solver, tikhonov_parameter, lower_bounds, ...).
+
+    Returns:
+        np.ndarray: Estimated loads (n_steps x n_loads).
+    """
+    A_matrix = np.asarray(A_matrix, dtype=np.float64)
+    strains = np.atleast_2d(np.asarray(strains, dtype=np.float64))
+    if weights is None:
+        weights = equal_gauge_weights(A_matrix.shape[0])
+    solver = LoadSolver(A_matrix, weights, mode=mode, strain_chunks=lambda: [strains], **solver_options)
+    return solver.solve(strains)
@@ -7,6 +7,23 @@ This button searches the measured SG results file from FEA ("SG_FEA_strain_data.
 inside the solution folder of the selected analysis environment. 
 However, the "strain_sensitivity_matrix.csv" file is searched inside 
 the project folder specified by the "Project Folder" button.
+The search keeps an index of the project folder ("sensitivity_matrix_index.json" in its "load_reconstruction_cache"
+folder), so later launches only re-list the directories that changed; strain_sensitivity_matrix_file_path_override
+skips the search entirely.
+
+The weighted least squares operator is factorized once per sensitivity matrix and set of gauge weights
+and cached in a "load_reconstruction_cache" folder next to "strain_sensitivity_matrix.csv", so repeated
+reconstructions against the same matrix are a single matrix multiply over the time history.
+Before the reconstruction, an SVD of the weighted sensitivity matrix (cached in the same folder) reports the
+condition number, the observability and noise amplification of every load and the leverage of every gauge
+("sensitivity_matrix_diagnostics.txt"). The Tikhonov mode and the "svd" solver reuse these factors.
+Strain histories larger than STREAMING_THRESHOLD_MB are processed in two streaming passes
+(RMS per gauge, then reconstruction chunk by chunk), so long measured logs fit in bounded memory.
+With MONTE_CARLO_ENABLED (and the "wls" mode), the measurement errors entered in the parameter form are propagated
+to the estimated loads by Monte Carlo sampling (perturbed sensitivity matrices, gage factors and signal noise,
+evaluated as batched tensors in parallel), giving confidence bands on every load over time
+("estimated_loads_confidence_bands.csv"). The bands are added to the plot once they are computed.
+The solver itself is load_reconstruction_engine.py, copied next to the generated CPython script on every launch.
 
 """
 
@@ -15,10 +32,14 @@ import os
 from System.Drawing import Color, Font, FontStyle, Size, Point, SolidBrush, Pen
 from System.Windows.Forms import *
 from System.Diagnostics import Process, ProcessWindowStyle
-from System.IO import StreamWriter, FileStream, FileMode, FileAccess, StreamReader
+from System.IO import StreamWriter, FileStream, FileMode, FileAccess, StreamReader, File
 from System.Text import UTF8Encoding
 # endregion
 
+# Path of load_reconstruction_engine.py, the solver imported by the generated CPython script. Leave empty to
+# look for it next to this script and then in the project folder.
+load_reconstruction_engine_path = r""
+
 # ----------------------------------------------------------------------------------------------------------------
 
 # region Import the necessary classes and functions for the GUI
@@ -136,12 +157,42 @@ project_path = project_path.Replace("\\", "\\")
 measured_SG_strain_FEA_file_name = 'SG_FEA_strain_data.csv'
 measured_SG_strain_FEA_file_path = os.path.join(solution_directory_path, measured_SG_strain_FEA_file_name)
 
+# Full path of the strain_sensitivity_matrix.csv to use. Leave empty to search the project folder.
+strain_sensitivity_matrix_file_path_override = ""
+
 # Define the path the cpython script will be executed
 cpython_script_name = "load_reconstruction_FEA_cpython_code_only.py"
 cpython_script_path = sol_selected_environment.WorkingDir + cpython_script_name
 # strain_sensitivity_matrix_file_path will be obtained during the execution of cpython code
 # endregion
 
+# region Copy the load reconstruction engine next to the cpython script
+def find_script_file(file_name, configured_path):
+    # The configured path, then the folder of this script (when it is run from a file), then the project folder
+    candidates = [configured_path]
+    if '__file__' in globals():
+        candidates.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name))
+    candidates.append(os.path.join(project_path, file_name))
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            return candidate
+    return None
+
+load_reconstruction_engine_file_name = "load_reconstruction_engine.py"
+load_reconstruction_engine_source_path = find_script_file(load_reconstruction_engine_file_name,
+                                                          load_reconstruction_engine_path)
+if load_reconstruction_engine_source_path is None:
+    message_engine_missing = ("load_reconstruction_engine.py is not found. Set load_reconstruction_engine_path at the "
+                              "top of this script or copy the file into the project folder: " + project_path)
+    MessageBox.Show(message_engine_missing, "Load Reconstruction Engine Missing", MessageBoxButtons.OK,
+                    MessageBoxIcon.Error)
+    raise IOError(message_engine_missing)
+
+# Overwritten on every launch, so the cpython script never imports an outdated engine
+File.Copy(load_reconstruction_engine_source_path,
+          sol_selected_environment.WorkingDir + load_reconstruction_engine_file_name, True)
+# endregion
+
 # Define the load reconstruction function and the plotter of the estimated loads to be run
 cpython_code ="""
 # region Import necessary libraries
@@ -156,9 +207,15 @@ try:
     import plotly.express as px
     import os
     import re
-    from PyQt5.QtCore import Qt
+    import json
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from PyQt5.QtCore import Qt, QThread, pyqtSignal
     from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QMessageBox, QComboBox
     from PyQt5.QtWebEngineWidgets import QWebEngineView
+    # Written next to this script by the Mechanical button
+    from load_reconstruction_engine import (RECONSTRUCTION_CACHE_FOLDER_NAME, LoadSolver, compute_gauge_weights,
+                                            format_sensitivity_matrix_diagnostics, sensitivity_matrix_diagnostics)
 
 except ImportError as e:
     app = QApplication(sys.argv)
@@ -169,6 +226,49 @@ except ImportError as e:
 # Set the color scheme for plot traces
 my_discrete_color_scheme = px.colors.qualitative.Light24
 
+# Factorization used to build the reconstruction operator: "qr" (default), "cholesky" or "svd"
+# ("svd" reuses the cached factors of the sensitivity matrix diagnostics)
+RECONSTRUCTION_SOLVER = "qr"
+# Condition numbers above this are flagged in the sensitivity matrix diagnostics
+CONDITION_NUMBER_WARNING = 1e4
+# Reconstruction mode: "wls" (weighted least squares), "tikhonov" (regularized weighted least squares),
+# "nnls" (non-negative loads) or "box" (loads within LOAD_LOWER_BOUNDS and LOAD_UPPER_BOUNDS)
+RECONSTRUCTION_MODE = "wls"
+# Tikhonov parameter lambda (scale of the singular values of the weighted matrix); None selects it
+# with TIKHONOV_PARAMETER_RULE: "gcv" (generalized cross validation) or "lcurve" (L-curve corner)
+TIKHONOV_PARAMETER = None
+TIKHONOV_PARAMETER_RULE = "gcv"
+TIKHONOV_SWEEP_POINTS = 200
+# Load bounds of the "box" mode: one number for all loads or a list with one value per load (None: unbounded)
+LOAD_LOWER_BOUNDS = None
+LOAD_UPPER_BOUNDS = None
+# Strain histories larger than this are reconstructed in streaming mode (bounded memory)
+STREAMING_THRESHOLD_MB = 500
+# Time steps read per chunk in streaming mode
+STREAMING_CHUNK_ROWS = 200000
+# Measurement errors entered in the parameter form (None if the form was cancelled), used for the
+# Monte Carlo confidence bands of the estimated loads
+SIGNAL_NOISE_MICROSTRAINS = """ + str(signal_noise_microstrains) + """
+GAGE_FACTOR_ERROR_PERCENT = """ + str(gage_factor_error_percent) + """
+POSITIONING_ERROR_PERCENT = """ + str(positioning_error_percent) + """
+# strain_sensitivity_matrix.csv to use without searching the project folder (empty: search)
+STRAIN_SENSITIVITY_MATRIX_FILE_PATH_OVERRIDE = r'""" + strain_sensitivity_matrix_file_path_override + """'
+# Index of the project folder (directory mtimes and sensitivity matrix files), so later searches only
+# re-list the directories that changed. Kept in the reconstruction cache folder of the project folder, which the
+# search skips, so saving the index never marks an indexed directory as modified.
+SENSITIVITY_MATRIX_INDEX_FILE_NAME = "sensitivity_matrix_index.json"
+# Monte Carlo confidence bands of the estimated loads. Their cost grows with time steps x realizations (minutes
+# for long histories), so they are opt-in and computed after the estimated loads are shown. The bands describe
+# the "wls" estimator and are skipped in the other reconstruction modes.
+MONTE_CARLO_ENABLED = False
+# Monte Carlo realizations of the measurement errors and confidence level of the bands
+MONTE_CARLO_SAMPLES = 2000
+MONTE_CARLO_CONFIDENCE = 0.95
+# Size of the (time steps x realizations x loads) tensor handled by one worker, in MB
+MONTE_CARLO_TENSOR_MB = 32
+MONTE_CARLO_WORKERS = os.cpu_count() or 1
+MONTE_CARLO_SEED = 0
+
 # region Import the necessary classes and functions for the GUI
 class PlotlyViewer(QWebEngineView):
     def __init__(self, fig, parent=None):
@@ -180,14 +280,34 @@ class PlotlyViewer(QWebEngineView):
         raw_html = plot(self.figure, include_plotlyjs='cdn', output_type='div', config={'staticPlot': False})
         self.setHtml(raw_html)
 
+class ConfidenceBandWorker(QThread):
+    # Computes the Monte Carlo confidence bands while the estimated loads are already shown
+    bands_ready = pyqtSignal(str)
+
+    def __init__(self, compute_bands, parent=None):
+        super(ConfidenceBandWorker, self).__init__(parent)
+        self.compute_bands = compute_bands
+
+    def run(self):
+        try:
+            self.bands_ready.emit(self.compute_bands())
+        except Exception as e:
+            print(f"The Monte Carlo confidence bands could not be computed: {e}")
+
 class PlotWindow(QMainWindow):
-    def __init__(self, folder_name, file_name):
+    def __init__(self, folder_name, file_name, compute_bands=None):
         super(PlotWindow, self).__init__()
         self.setWindowTitle('Load Reconstruction - FEA: """ + sol_selected_environment.Parent.Name + """')
         self.setGeometry(100, 100, 800, 600)
         self.folder_name = folder_name
         self.file_name = file_name
         self.initUI()
+        if compute_bands is not None:
+            self.statusBar().showMessage("Computing the Monte Carlo confidence bands...")
+            self.band_worker = ConfidenceBandWorker(compute_bands, self)
+            self.band_worker.bands_ready.connect(self.add_confidence_bands)
+            self.band_worker.finished.connect(lambda: self.statusBar().clearMessage())
+            self.band_worker.start()
         
     def extract_sort_key(self, channel_name):
         match = re.match(r'SG(\d+)_(\d+)', channel_name)
@@ -298,8 +418,11 @@ class PlotWindow(QMainWindow):
         spikedash='dot',  # Set spike style
         )
         
+        self.figure = fig
+        self.load_labels = list(data_long['Component'].unique())
+        
         # Generate an offline (html) version of the plotly graph
-        plot(fig, filename=os.path.join(self.folder_name, 'Load_Reconstruction_FEA_""" + sol_selected_environment.Parent.Name + """.html'), auto_open=False) 
+        self.save_html()
         self.viewer = PlotlyViewer(fig)
         
         layout = QVBoxLayout()
@@ -308,110 +431,397 @@ class PlotWindow(QMainWindow):
         widget = QWidget()
         widget.setLayout(layout)
         self.setCentralWidget(widget)
+
+    def save_html(self):
+        plot(self.figure, filename=os.path.join(self.folder_name, 'Load_Reconstruction_FEA_""" + sol_selected_environment.Parent.Name + """.html'), auto_open=False)
+
+    def add_confidence_bands(self, bands_file_path):
+        # Shade the Monte Carlo confidence band of every load in the color of its trace
+        bands = pd.read_csv(bands_file_path)
+        for trace_index, label in enumerate(self.load_labels):
+            if f'{label} lower' not in bands.columns:
+                continue
+            trace_color = my_discrete_color_scheme[trace_index % len(my_discrete_color_scheme)]
+            red, green, blue = (int(trace_color[i:i + 2], 16) for i in (1, 3, 5))
+            self.figure.add_trace(go.Scatter(
+                x=bands['Time [s]'], y=bands[f'{label} upper'], mode='lines', line=dict(width=0),
+                legendgroup=label, showlegend=False, hoverinfo='skip'))
+            self.figure.add_trace(go.Scatter(
+                x=bands['Time [s]'], y=bands[f'{label} lower'], mode='lines', line=dict(width=0),
+                fill='tonexty', fillcolor=f'rgba({red}, {green}, {blue}, 0.2)',
+                name=f'{label} ({MONTE_CARLO_CONFIDENCE:.0%} wls band)', legendgroup=label, hoverinfo='skip'))
+        self.save_html()
+        self.viewer.initUI()
 # endregion
 
 # region Find files containing "strain_sensitivity_matrix" in their names in the project folder
-def find_files_with_strain_sensitivity_matrix(project_path):
-    # Initialize an empty list to store the paths of files containing "strain_sensitivity_matrix"
-    matching_files = []
-
-    # Walk through the directory
-    for root, dirs, files in os.walk(project_path):
-        for file in files:
-            # Check if "strain_sensitivity_matrix" is in the file name and the file is a .csv file
-            if "strain_sensitivity_matrix" in file and file.endswith('.csv'):
-                # Add the file path to the list
-                matching_files.append(os.path.join(root, file))
-                print(matching_files)
-
-    # Check if more than one file was found
-    if len(matching_files) > 1:
-        # Initialize the QApplication
-        app = QApplication([])
-
-        # Show an error messagebox
-        QMessageBox.critical(None, "Error", "More than one file with 'strain_sensitivity_matrix' is found. There should be only one strain_sensitivity_matrix.csv inside the folder for the program to continue.")
-
-        # No need to explicitly destroy the QApplication
-    if len(matching_files) == 1:
-        strain_sensitivity_matrix_file_path = matching_files[0]
-        
-    # Return the list of matching files
-    return strain_sensitivity_matrix_file_path
+def is_strain_sensitivity_matrix_file(file_name):
+    return "strain_sensitivity_matrix" in file_name and file_name.endswith('.csv')
+
+def load_sensitivity_matrix_index(index_file_path):
+    try:
+        with open(index_file_path, 'r') as f:
+            index = json.load(f)
+        return index.get("directories", {}) if index.get("version") == 1 else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_sensitivity_matrix_index(index_file_path, directories):
+    # Written to a temporary file first, so an interrupted run never leaves a truncated index
+    temporary_file_path = index_file_path + ".tmp"
+    try:
+        with open(temporary_file_path, 'w') as f:
+            json.dump({"version": 1, "directories": directories}, f)
+        os.replace(temporary_file_path, index_file_path)
+    except OSError as e:
+        print(f"Could not save the project index ({e}).")
+
+def index_project_folder(project_path, previous_directories):
+    # Walks the project folder like os.walk, but a directory whose mtime matches the index is not
+    # listed again: adding, removing or renaming an entry changes the mtime of its directory, so its
+    # recorded subdirectories and matrix files are still valid. An unchanged tree therefore costs one
+    # stat per directory instead of a listing. Directories modified within the last seconds are
+    # recorded without an mtime (coarse timestamps on network shares) and re-listed next time.
+    # Reconstruction cache folders are skipped: they hold the index and operators, not matrices.
+    directories = {}
+    pending = ["."]
+    while pending:
+        relative_path = pending.pop()
+        directory = os.path.normpath(os.path.join(project_path, relative_path))
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            continue
+
+        entry = previous_directories.get(relative_path)
+        if entry is None or entry.get("mtime") != mtime:
+            entry = {"subdirectories": [], "matches": {}}
+            try:
+                with os.scandir(directory) as entries:
+                    for dir_entry in entries:
+                        if dir_entry.is_dir(follow_symlinks=False):
+                            if dir_entry.name != RECONSTRUCTION_CACHE_FOLDER_NAME:
+                                entry["subdirectories"].append(dir_entry.name)
+                        elif is_strain_sensitivity_matrix_file(dir_entry.name):
+                            entry["matches"][dir_entry.name] = None
+            except OSError:
+                continue
+            entry["mtime"] = mtime if time.time() - mtime > 2.0 else None
+
+        # Matrix files are few; refresh their mtimes (their content can change in place)
+        for file_name in list(entry["matches"]):
+            try:
+                entry["matches"][file_name] = os.stat(os.path.join(directory, file_name)).st_mtime
+            except OSError:
+                del entry["matches"][file_name]
+
+        directories[relative_path] = entry
+        pending.extend(os.path.join(relative_path, name) for name in entry["subdirectories"])
+    return directories
+
+def find_files_with_strain_sensitivity_matrix(project_path, override_file_path=None):
+    # An explicit path skips the search entirely
+    if override_file_path:
+        if os.path.isfile(override_file_path):
+            return override_file_path
+        matching_files = []
+        error_message = f"The strain sensitivity matrix file does not exist: {override_file_path}"
+    else:
+        # The index folder is created before the walk, so creating it does not change the recorded root mtime
+        index_folder = os.path.join(project_path, RECONSTRUCTION_CACHE_FOLDER_NAME)
+        try:
+            os.makedirs(index_folder, exist_ok=True)
+        except OSError as e:
+            print(f"Could not create the project index folder ({e}).")
+        index_file_path = os.path.join(index_folder, SENSITIVITY_MATRIX_INDEX_FILE_NAME)
+        previous_directories = load_sensitivity_matrix_index(index_file_path)
+        directories = index_project_folder(project_path, previous_directories)
+        if directories != previous_directories:
+            save_sensitivity_matrix_index(index_file_path, directories)
+
+        matching_files = sorted(os.path.normpath(os.path.join(project_path, relative_path, file_name))
+                                for relative_path, entry in directories.items() for file_name in entry["matches"])
+        print(f"Found {len(matching_files)} strain sensitivity matrix file(s): {matching_files}")
+        if len(matching_files) == 1:
+            return matching_files[0]
+        if len(matching_files) > 1:
+            error_message = "More than one file with 'strain_sensitivity_matrix' is found. There should be only one strain_sensitivity_matrix.csv inside the folder for the program to continue."
+        else:
+            error_message = "No file with 'strain_sensitivity_matrix' is found in the project folder."
+
+    # Show an error messagebox
+    app = QApplication([])
+    QMessageBox.critical(None, "Error", error_message)
+    sys.exit(1)
+
+strain_sensitivity_matrix_file_path = find_files_with_strain_sensitivity_matrix(
+    r'""" + project_path + """', STRAIN_SENSITIVITY_MATRIX_FILE_PATH_OVERRIDE)
+# endregion
 
-strain_sensitivity_matrix_file_path = find_files_with_strain_sensitivity_matrix(r'""" + project_path + """')
+# region Report the observability of the loads
+def report_sensitivity_matrix_diagnostics(sensitivity_matrix_file_path, measured_SG_strain_FEA_file_path):
+    # Diagnostics for the gauge weights of the reconstruction below (equal weights, as all error
+    # parameters are 0), so the Tikhonov mode and the "svd" solver reuse the cached factors
+    A_matrix = pd.read_csv(sensitivity_matrix_file_path, header=None).values
+    gauge_names = list(pd.read_csv(measured_SG_strain_FEA_file_path, nrows=0).columns[1:])
+    if len(gauge_names) != A_matrix.shape[0]:
+        gauge_names = None
+    weights = compute_gauge_weights(np.zeros(A_matrix.shape[0]), 0, 0, 0)
+    cache_folder = os.path.join(os.path.dirname(sensitivity_matrix_file_path), RECONSTRUCTION_CACHE_FOLDER_NAME)
+
+    report_lines = format_sensitivity_matrix_diagnostics(
+        sensitivity_matrix_diagnostics(A_matrix, weights, cache_folder, gauge_names), CONDITION_NUMBER_WARNING)
+    report_file_path = os.path.join('""" + solution_directory_path + """', 'sensitivity_matrix_diagnostics.txt')
+    with open(report_file_path, 'w') as f:
+        for line in report_lines:
+            print(line)
+            print(line, file=f)
+    print("Diagnostics saved at: " + report_file_path)
 # endregion
 
 # region Define and run the reconstruction function
+def accumulate_rms_per_gauge(measured_SG_strain_FEA_file_path, chunk_size=STREAMING_CHUNK_ROWS):
+    # First streaming pass: RMS strain of each gauge from running sums of squares
+    sum_of_squares = None
+    n_rows = 0
+    for chunk in pd.read_csv(measured_SG_strain_FEA_file_path, chunksize=chunk_size):
+        strains = chunk.iloc[:, 1:].values
+        chunk_sum = np.sum(strains ** 2, axis=0)
+        sum_of_squares = chunk_sum if sum_of_squares is None else sum_of_squares + chunk_sum
+        n_rows += len(strains)
+    if n_rows == 0:
+        raise ValueError("The measured strain file contains no time steps.")
+    return np.sqrt(sum_of_squares / n_rows)
+
+def create_load_solver(A_matrix, weights, cache_folder, mode, strain_chunks):
+    # LoadSolver of load_reconstruction_engine.py with the reconstruction settings above
+    return LoadSolver(A_matrix, weights, cache_folder, mode, strain_chunks, solver=RECONSTRUCTION_SOLVER,
+                      tikhonov_parameter=TIKHONOV_PARAMETER, tikhonov_rule=TIKHONOV_PARAMETER_RULE,
+                      tikhonov_sweep_points=TIKHONOV_SWEEP_POINTS, lower_bounds=LOAD_LOWER_BOUNDS,
+                      upper_bounds=LOAD_UPPER_BOUNDS)
+
+def save_reconstruction_mode_results(solver):
+    # Saves the Tikhonov parameter sweep (if any) next to the estimated loads
+    if solver.sweep is not None:
+        sweep_csv_file_path = os.path.join('""" + solution_directory_path + """', 'tikhonov_parameter_sweep.csv')
+        solver.sweep.to_csv(sweep_csv_file_path, index=False)
+        print("Tikhonov parameter sweep saved at: " + sweep_csv_file_path)
+
 def estimate_loads_from_strains_with_errors_per_gauge(
 measured_SG_strain_FEA_file_path, 
 sensitivity_matrix_file_path,
 signal_noise_microstrains,
 gage_factor_error_percent,
-positioning_error_percent):
-    # Load the CSV files
-    S_df = pd.read_csv(measured_SG_strain_FEA_file_path)
+positioning_error_percent,
+streaming=None,
+chunk_size=STREAMING_CHUNK_ROWS,
+mode=RECONSTRUCTION_MODE):
+    # mode selects the solver, see LoadSolver in load_reconstruction_engine.py.
+    # streaming=None streams files larger than STREAMING_THRESHOLD_MB; True/False force the mode.
+    # In streaming mode the strain history is read twice in chunks of chunk_size rows (RMS per
+    # gauge, then the reconstruction) and the loads are appended to the output file chunk by
+    # chunk, so memory stays bounded for any length of history. The estimated loads are then
+    # not returned (None); read them from the output file.
     A_df = pd.read_csv(sensitivity_matrix_file_path, header=None)
-
-    # Extract strain measurements and sensitivity matrix
-    S_matrix = S_df.iloc[:, 1:].values
     A_matrix = A_df.values
+    load_columns = [f'Load {i+1}' for i in range(A_matrix.shape[1])]
+    cache_folder = os.path.join(os.path.dirname(sensitivity_matrix_file_path), RECONSTRUCTION_CACHE_FOLDER_NAME)
 
-    # Calculate variances from different error sources for each gauge
-    signal_noise = signal_noise_microstrains * 1e-6
-    signal_noise_variance = signal_noise ** 2
-
-    # Calculate RMS strain for each gauge
-    rms_strain_per_gauge = np.sqrt(np.mean(S_matrix**2, axis=0))
+    estimated_loads_csv_file_name = 'estimated_loads_with_errors_per_gauge_RMS.csv'
+    estimated_loads_csv_file_path = os.path.join('""" + solution_directory_path + """', estimated_loads_csv_file_name)
 
-    gage_factor_error = gage_factor_error_percent / 100
-    positioning_error = positioning_error_percent / 100
+    if streaming is None:
+        file_size_mb = os.path.getsize(measured_SG_strain_FEA_file_path) / (1024.0 * 1024.0)
+        streaming = file_size_mb > STREAMING_THRESHOLD_MB
+
+    if streaming:
+        # The RMS pass is only needed when the weights depend on the strain level
+        if gage_factor_error_percent or positioning_error_percent:
+            rms_strain_per_gauge = accumulate_rms_per_gauge(measured_SG_strain_FEA_file_path, chunk_size)
+        else:
+            rms_strain_per_gauge = np.zeros(A_matrix.shape[0])
+        weights = compute_gauge_weights(rms_strain_per_gauge, signal_noise_microstrains,
+                                        gage_factor_error_percent, positioning_error_percent)
+        solver = create_load_solver(A_matrix, weights, cache_folder, mode, lambda: (
+            chunk.iloc[:, 1:].values for chunk in pd.read_csv(measured_SG_strain_FEA_file_path, chunksize=chunk_size)))
+        save_reconstruction_mode_results(solver)
+
+        # Second pass: reconstruct and append chunk by chunk
+        n_rows = 0
+        for i, chunk in enumerate(pd.read_csv(measured_SG_strain_FEA_file_path, chunksize=chunk_size)):
+            loads_chunk = pd.DataFrame(solver.solve(chunk.iloc[:, 1:].values), columns=load_columns)
+            loads_chunk.insert(0, 'Time [s]', chunk.iloc[:, 0].values)
+            loads_chunk.to_csv(estimated_loads_csv_file_path, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+            n_rows += len(loads_chunk)
+        print(f"Reconstructed {n_rows} time steps in chunks of {chunk_size} rows.")
+        return None, estimated_loads_csv_file_path
 
-    # Total variance for each strain gauge measurement
-    total_variance_per_gauge = (signal_noise_variance +
-                                (gage_factor_error ** 2) * rms_strain_per_gauge ** 2 +
-                                (positioning_error ** 2) * rms_strain_per_gauge ** 2)
-    
-    total_variance_per_gauge[total_variance_per_gauge == 0] = 1e-10  # replace 0 with a small number
+    # Load the CSV files
+    S_df = pd.read_csv(measured_SG_strain_FEA_file_path)
 
-    # Creating the W matrix for each gauge
-    W = np.diag(1 / total_variance_per_gauge)
+    # Extract strain measurements
+    S_matrix = S_df.iloc[:, 1:].values
 
-    # Perform the weighted least squares estimate calculation
-    A_T_W = A_matrix.T @ W
-    A_T_W_A_inv = np.linalg.inv(A_T_W @ A_matrix)
-    L_hat = A_T_W_A_inv @ A_T_W @ S_matrix.T
+    # Calculate RMS strain for each gauge
+    rms_strain_per_gauge = np.sqrt(np.mean(S_matrix**2, axis=0))
+    weights = compute_gauge_weights(rms_strain_per_gauge, signal_noise_microstrains,
+                                    gage_factor_error_percent, positioning_error_percent)
 
-    # Transpose to get the original shape
-    L_hat_timeseries = L_hat.T
+    # Weighted least squares estimate: one factorization (cached per sensitivity matrix and
+    # weights), then a single matrix multiply over the whole time history (see LoadSolver for
+    # the regularized and constrained modes)
+    solver = create_load_solver(A_matrix, weights, cache_folder, mode, lambda: [S_matrix])
+    save_reconstruction_mode_results(solver)
+    L_hat_timeseries = solver.solve(S_matrix)
 
     # Create a DataFrame for the results
-    estimated_loads_df = pd.DataFrame(L_hat_timeseries, columns=[f'Load {i+1}' for i in range(A_matrix.shape[1])])
+    estimated_loads_df = pd.DataFrame(L_hat_timeseries, columns=load_columns)
     estimated_loads_df.insert(0, 'Time [s]', S_df.iloc[:, 0])
 
     # Save to CSV
-    estimated_loads_csv_file_name = 'estimated_loads_with_errors_per_gauge_RMS.csv'
-    estimated_loads_csv_file_path = os.path.join('""" + solution_directory_path + """', estimated_loads_csv_file_name)
     estimated_loads_df.to_csv(estimated_loads_csv_file_path, index=False)
     estimated_loads_df.set_index('Time [s]', inplace=True)
 
     return estimated_loads_df, estimated_loads_csv_file_path
 
+# Diagnose the sensitivity matrix before the reconstruction
+report_sensitivity_matrix_diagnostics(strain_sensitivity_matrix_file_path, r'""" + measured_SG_strain_FEA_file_path + """')
+
 loads_df_with_errors_per_gauge, estimated_loads_csv_file_path = estimate_loads_from_strains_with_errors_per_gauge(
     r'""" + measured_SG_strain_FEA_file_path + """',
     strain_sensitivity_matrix_file_path,
     0, 0, 0  # Error parameters
 )
 
-print(loads_df_with_errors_per_gauge)  # Display the first few rows of the estimated loads
+if loads_df_with_errors_per_gauge is not None:
+    print(loads_df_with_errors_per_gauge)  # Display the first few rows of the estimated loads
 print("CSV file saved at: " + estimated_loads_csv_file_path)
 
+# region Monte Carlo uncertainty of the estimated loads
+def sample_perturbed_operators(A_matrix, weights, gage_factor_error_percent, positioning_error_percent,
+                               n_samples=MONTE_CARLO_SAMPLES, seed=MONTE_CARLO_SEED):
+    # Systematic errors, fixed over the time history of every realization:
+    # - positioning error: every sensitivity of a gauge is off by a relative N(0, positioning error),
+    #   since the gauge sits where the strain field differs from the model. Each realization
+    #   reconstructs with the operator of its perturbed sensitivity matrix.
+    # - gage factor error: every gauge reads its strain scaled by (1 + N(0, gage factor error)),
+    #   folded into the columns of the operator.
+    # All operators come from one batched QR of the (n_samples, n_gauges, n_loads) matrix stack.
+    rng = np.random.default_rng([seed, 0])
+    n_gauges, n_loads = A_matrix.shape
+    perturbed_A = A_matrix * (1 + rng.normal(0.0, positioning_error_percent / 100, (n_samples, n_gauges, n_loads)))
+    gage_factors = 1 + rng.normal(0.0, gage_factor_error_percent / 100, (n_samples, 1, n_gauges))
+
+    sqrt_w = np.sqrt(weights)
+    Q, R = np.linalg.qr(perturbed_A * sqrt_w[None, :, None])
+    operators = np.linalg.solve(R, np.swapaxes(Q, 1, 2)) * sqrt_w[None, None, :]
+    return operators, operators * gage_factors
+
+def _monte_carlo_band_chunk(task):
+    # Loads of every realization for one block of time steps, reduced to the band limits
+    strains, first_row, scaled_operators, noise_factors, quantiles, seed = task
+    n_samples, n_loads, n_gauges = scaled_operators.shape
+    # Systematic part in one matrix multiply: (steps, gauges) @ (gauges, realizations * loads)
+    loads = (strains @ scaled_operators.reshape(-1, n_gauges).T).reshape(len(strains), n_samples, n_loads)
+    if noise_factors is not None:
+        # Signal noise: P_k n ~ N(0, noise^2 P_k P_k^T), drawn through its Cholesky factor in load space
+        rng = np.random.default_rng([seed, 1, first_row])
+        z = rng.standard_normal((n_samples, len(strains), n_loads))
+        loads += np.swapaxes(np.matmul(z, np.swapaxes(noise_factors, 1, 2)), 0, 1)
+    return np.quantile(loads, quantiles, axis=1)
+
+def estimate_load_confidence_bands(
+measured_SG_strain_FEA_file_path,
+sensitivity_matrix_file_path,
+signal_noise_microstrains,
+gage_factor_error_percent,
+positioning_error_percent,
+weighting_errors=(0, 0, 0),
+n_samples=MONTE_CARLO_SAMPLES,
+confidence=MONTE_CARLO_CONFIDENCE,
+seed=MONTE_CARLO_SEED):
+    # Propagates the measurement errors to the estimated loads: n_samples realizations of the
+    # perturbed sensitivity matrix, gage factors and signal noise are evaluated as batched tensors,
+    # and the lower and upper confidence limits of every load at every time step are saved.
+    # weighting_errors are the error parameters of the estimate itself (they set the gauge weights),
+    # so the bands belong to the same estimator as estimate_loads_from_strains_with_errors_per_gauge
+    # in its default "wls" mode.
+    # The strain history is read in blocks that worker threads process in parallel, so memory stays
+    # bounded for any length of history. The noise is seeded per block of time steps, so the bands
+    # are reproducible for a given seed and MONTE_CARLO_TENSOR_MB, whatever the number of workers.
+    A_matrix = pd.read_csv(sensitivity_matrix_file_path, header=None).values
+    n_gauges, n_loads = A_matrix.shape
+
+    if weighting_errors[1] or weighting_errors[2]:
+        rms_strain_per_gauge = accumulate_rms_per_gauge(measured_SG_strain_FEA_file_path)
+    else:
+        rms_strain_per_gauge = np.zeros(n_gauges)
+    weights = compute_gauge_weights(rms_strain_per_gauge, *weighting_errors)
+
+    operators, scaled_operators = sample_perturbed_operators(
+        A_matrix, weights, gage_factor_error_percent, positioning_error_percent, n_samples, seed)
+    noise_factors = None
+    if signal_noise_microstrains:
+        noise_covariance = (signal_noise_microstrains * 1e-6) ** 2 * np.matmul(operators, np.swapaxes(operators, 1, 2))
+        noise_factors = np.linalg.cholesky(noise_covariance)
+
+    alpha = (1 - confidence) / 2
+    quantiles = [alpha, 1 - alpha]
+    rows_per_task = max(1, int(MONTE_CARLO_TENSOR_MB * 1024 * 1024 / (8 * n_samples * n_loads)))
+    load_columns = [f'Load {i+1}' for i in range(n_loads)]
+    band_columns = [f'{column} lower' for column in load_columns] + [f'{column} upper' for column in load_columns]
+
+    bands_csv_file_name = 'estimated_loads_confidence_bands.csv'
+    bands_csv_file_path = os.path.join('""" + solution_directory_path + """', bands_csv_file_name)
+
+    first_row = 0
+    with ThreadPoolExecutor(max_workers=MONTE_CARLO_WORKERS) as executor:
+        reader = pd.read_csv(measured_SG_strain_FEA_file_path, chunksize=rows_per_task * MONTE_CARLO_WORKERS)
+        for i, chunk in enumerate(reader):
+            strains = chunk.iloc[:, 1:].values
+            tasks = []
+            for start in range(0, len(strains), rows_per_task):
+                tasks.append((strains[start:start + rows_per_task], first_row + start,
+                              scaled_operators, noise_factors, quantiles, seed))
+            limits = np.concatenate(list(executor.map(_monte_carlo_band_chunk, tasks)), axis=1)
+            bands_chunk = pd.DataFrame(np.hstack((limits[0], limits[1])), columns=band_columns)
+            bands_chunk.insert(0, 'Time [s]', chunk.iloc[:, 0].values)
+            bands_chunk.to_csv(bands_csv_file_path, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+            first_row += len(strains)
+
+    print(f"Monte Carlo: {n_samples} realizations over {first_row} time steps, "
+          f"{confidence:.0%} confidence bands saved at: {bands_csv_file_path}")
+    return bands_csv_file_path
+
+def confidence_bands_skip_reason():
+    if not MONTE_CARLO_ENABLED:
+        return "MONTE_CARLO_ENABLED is False"
+    if SIGNAL_NOISE_MICROSTRAINS is None:
+        return "the parameter form was cancelled"
+    if RECONSTRUCTION_MODE != "wls":
+        return f"the bands describe the 'wls' estimator, not the '{RECONSTRUCTION_MODE}' mode"
+    return None
+
+def compute_confidence_bands():
+    return estimate_load_confidence_bands(
+        r'""" + measured_SG_strain_FEA_file_path + """',
+        strain_sensitivity_matrix_file_path,
+        SIGNAL_NOISE_MICROSTRAINS, GAGE_FACTOR_ERROR_PERCENT, POSITIONING_ERROR_PERCENT
+    )
+
+# Run by the plot window in the background, after the estimated loads are shown
+bands_skip_reason = confidence_bands_skip_reason()
+if bands_skip_reason is not None:
+    print("Monte Carlo confidence bands skipped: " + bands_skip_reason + ".")
+    compute_confidence_bands = None
+# endregion
+
 # region Show the estimated loads
 try:
     if __name__ == '__main__':
         QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)  # Enable high-DPI scaling
         app = QApplication(sys.argv)
-        mainWindow = PlotWindow('""" + solution_directory_path + """', estimated_loads_csv_file_path)
+        mainWindow = PlotWindow('""" + solution_directory_path + """', estimated_loads_csv_file_path, compute_confidence_bands)
         mainWindow.show()
         sys.exit(app.exec_())
         os.remove(cpython_script_path)
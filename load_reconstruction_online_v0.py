@@ -0,0 +1,278 @@
+# Online Load Reconstruction
+
+"""
+Estimates the loads applied on a system live, while strain samples arrive during a rig test.
+
+The reconstruction operator P (loads = P @ strains) is built once from "strain_sensitivity_matrix.csv"
+by load_reconstruction_engine.py, with the same weighted least squares solution as the batch load
+reconstruction (load_reconstruction_function_with_errors_weighting_function_v1.py), and is shared with it
+through the "load_reconstruction_cache" folder next to the matrix. Every incoming sample or block of samples
+then costs a single small matrix-vector (matrix-matrix) product.
+
+Strain sources:
+    replay  - replays a finished strain CSV (e.g. SG_FEA_strain_data.csv), optionally paced in real time.
+              Stand-in for a live source when testing.
+    tail    - follows a CSV file that a data acquisition system is still appending to.
+    socket  - reads CSV lines ("time,strain_1,...,strain_n") from a TCP connection.
+
+Every source yields the time stamps and strains of each block; the first column is the time, the remaining
+columns are the gauges in the row order of the sensitivity matrix.
+
+Usage:
+    python load_reconstruction_online_v0.py --matrix strain_sensitivity_matrix.csv --replay SG_FEA_strain_data.csv
+    python load_reconstruction_online_v0.py --matrix strain_sensitivity_matrix.csv --tail daq_log.csv --output loads.csv
+    python load_reconstruction_online_v0.py --matrix strain_sensitivity_matrix.csv --socket 192.168.0.10:5025
+"""
+
+# region Import necessary libraries
+import argparse
+import io
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from load_reconstruction_engine import (RECONSTRUCTION_CACHE_FOLDER_NAME, equal_gauge_weights,
+                                         get_reconstruction_operator)
+# endregion
+
+
+# region Reconstruction operator
+def load_reconstruction_operator(sensitivity_matrix_file_path, weights=None, use_cache=True):
+    """
+    Returns the weighted least squares reconstruction operator P (n_loads x n_gauges) of a
+    sensitivity matrix file, from the operator cache when possible.
+
+    Args:
+        sensitivity_matrix_file_path (str): strain_sensitivity_matrix.csv (gauges x load cases, no header).
+        weights (np.ndarray, optional): Weight (inverse variance) of every gauge. Defaults to equal weights,
+            as used by the batch reconstruction without error parameters.
+        use_cache (bool): Read and write the load_reconstruction_cache folder next to the matrix.
+    """
+    A_matrix = pd.read_csv(sensitivity_matrix_file_path, header=None).values.astype(np.float64)
+    if weights is None:
+        weights = equal_gauge_weights(A_matrix.shape[0])
+    weights = np.asarray(weights, dtype=np.float64)
+
+    cache_folder = None
+    if use_cache:
+        cache_folder = os.path.join(os.path.dirname(os.path.abspath(sensitivity_matrix_file_path)),
+                                    RECONSTRUCTION_CACHE_FOLDER_NAME)
+    return get_reconstruction_operator(A_matrix, weights, cache_folder, "qr")
+# endregion
+
+
+# region Online estimator
+class OnlineLoadEstimator:
+    """
+    Applies a precomputed reconstruction operator to single strain samples or small blocks.
+
+    The operator is stored contiguously and the output buffer of single samples is preallocated,
+    so update() costs one matrix-vector product (about a microsecond for tens of gauges) and
+    allocates nothing. Latency statistics are kept for every processed sample.
+    """
+
+    def __init__(self, operator):
+        self.operator = np.ascontiguousarray(operator, dtype=np.float64)
+        self.operator_T = np.ascontiguousarray(self.operator.T)
+        self.n_loads, self.n_gauges = self.operator.shape
+        self._loads = np.empty(self.n_loads)
+        self.samples_processed = 0
+        self.compute_time_s = 0.0
+
+    @classmethod
+    def from_sensitivity_matrix(cls, sensitivity_matrix_file_path, weights=None, use_cache=True):
+        return cls(load_reconstruction_operator(sensitivity_matrix_file_path, weights, use_cache))
+
+    def update(self, strains):
+        """
+        Estimates the loads of one strain sample (n_gauges,). Returns a view of an internal buffer that
+        the next call overwrites; copy it to keep it.
+        """
+        start = time.perf_counter()
+        np.dot(self.operator, strains, out=self._loads)
+        self.compute_time_s += time.perf_counter() - start
+        self.samples_processed += 1
+        return self._loads
+
+    def update_block(self, strains):
+        """Estimates the loads of a block of strain samples (n_samples, n_gauges). Returns (n_samples, n_loads)."""
+        strains = np.asarray(strains, dtype=np.float64)
+        if strains.ndim != 2 or strains.shape[1] != self.n_gauges:
+            raise ValueError(f"Expected strain blocks with {self.n_gauges} gauge columns, got shape {strains.shape}.")
+        start = time.perf_counter()
+        loads = strains @ self.operator_T
+        self.compute_time_s += time.perf_counter() - start
+        self.samples_processed += len(strains)
+        return loads
+
+    @property
+    def latency_us_per_sample(self):
+        return 1e6 * self.compute_time_s / self.samples_processed if self.samples_processed else 0.0
+# endregion
+
+
+# region Strain sources
+def _parse_csv_lines(lines):
+    """Parses complete CSV lines (time, strain_1, ..., strain_n) into (times, strains)."""
+    block = np.loadtxt(io.StringIO("".join(lines)), delimiter=",", ndmin=2)
+    return block[:, 0], block[:, 1:]
+
+
+def _is_header(line):
+    try:
+        float(line.split(",")[0])
+        return False
+    except ValueError:
+        return True
+
+
+def replay_source(file_path, block_size=1, speed=None):
+    """
+    Replays a finished strain CSV block by block.
+
+    Args:
+        file_path (str): CSV with a header, time in the first column and one column per gauge.
+        block_size (int): Samples per block.
+        speed (float, optional): Pace the replay at this multiple of real time (1.0 = real time).
+            None replays as fast as possible.
+    """
+    data = pd.read_csv(file_path).values.astype(np.float64)
+    wall_start = time.perf_counter()
+    for start in range(0, len(data), block_size):
+        block = data[start:start + block_size]
+        if speed:
+            # Wait until the block's last time stamp is due
+            due = (block[-1, 0] - data[0, 0]) / speed
+            delay = due - (time.perf_counter() - wall_start)
+            if delay > 0:
+                time.sleep(delay)
+        yield block[:, 0], block[:, 1:]
+
+
+def tail_source(file_path, poll_interval=0.05, idle_timeout=None, max_block_lines=1000):
+    """
+    Follows a CSV file that is still being written (like "tail -f") and yields every block of newly
+    completed lines. A partial last line is kept until its line end arrives.
+
+    Args:
+        file_path (str): The growing CSV file. A header line is skipped.
+        poll_interval (float): Seconds between checks for new data.
+        idle_timeout (float, optional): Stop after this many seconds without new data.
+        max_block_lines (int): Largest block yielded at once (bounds latency after a burst).
+    """
+    pending = ""
+    last_data = time.perf_counter()
+    with open(file_path, "r") as f:
+        while True:
+            text = f.read()
+            if not text:
+                if idle_timeout is not None and time.perf_counter() - last_data > idle_timeout:
+                    return
+                time.sleep(poll_interval)
+                continue
+            last_data = time.perf_counter()
+            lines = (pending + text).splitlines(keepends=True)
+            pending = lines.pop() if not lines[-1].endswith(("\n", "\r")) else ""
+            lines = [line for line in lines if line.strip() and not _is_header(line)]
+            for start in range(0, len(lines), max_block_lines):
+                yield _parse_csv_lines(lines[start:start + max_block_lines])
+
+
+def socket_source(host, port, max_block_lines=1000, timeout=None):
+    """
+    Reads CSV lines (time, strain_1, ..., strain_n) from a TCP connection until it is closed, yielding
+    every block of complete lines as it arrives.
+    """
+    pending = b""
+    with socket.create_connection((host, port), timeout=timeout) as connection:
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            lines = [line.decode("ascii") + "\n" for line in lines if line.strip()]
+            lines = [line for line in lines if not _is_header(line)]
+            for start in range(0, len(lines), max_block_lines):
+                yield _parse_csv_lines(lines[start:start + max_block_lines])
+# endregion
+
+
+# region Run loop
+def run_online_estimation(estimator, source, output_file_path=None, print_every_s=1.0):
+    """
+    Feeds every block of a strain source through the estimator, appends the loads to output_file_path
+    and prints the latest loads and the compute latency about once per print_every_s.
+
+    Returns:
+        int: Number of samples processed.
+    """
+    columns = ["Time [s]"] + [f"Load {i + 1}" for i in range(estimator.n_loads)]
+    output = open(output_file_path, "w") if output_file_path else None
+    if output:
+        output.write(",".join(columns) + "\n")
+    last_print = time.perf_counter()
+    try:
+        for times, strains in source:
+            if len(times) == 1:
+                loads = estimator.update(strains[0])[np.newaxis, :].copy()
+            else:
+                loads = estimator.update_block(strains)
+            if output:
+                np.savetxt(output, np.column_stack((times, loads)), delimiter=",", fmt="%.10g")
+                output.flush()
+            if time.perf_counter() - last_print >= print_every_s:
+                last_print = time.perf_counter()
+                latest = ", ".join(f"{value:.4g}" for value in loads[-1])
+                print(f"t = {times[-1]:.4f} s | loads: {latest} | "
+                      f"{estimator.latency_us_per_sample:.2f} us/sample over {estimator.samples_processed} samples")
+    except KeyboardInterrupt:
+        print("Stopped.")
+    finally:
+        if output:
+            output.close()
+    return estimator.samples_processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live load reconstruction from a strain stream.")
+    parser.add_argument("--matrix", required=True, help="strain_sensitivity_matrix.csv")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--replay", metavar="CSV", help="Replay a finished strain CSV.")
+    source_group.add_argument("--tail", metavar="CSV", help="Follow a CSV file that is being written.")
+    source_group.add_argument("--socket", metavar="HOST:PORT", help="Read CSV lines from a TCP connection.")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="Replay speed as a multiple of real time (default: as fast as possible).")
+    parser.add_argument("--block-size", type=int, default=1, help="Samples per block when replaying (default: 1).")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="Stop following a file after this many seconds without new data.")
+    parser.add_argument("--output", default=None, help="Append the estimated loads to this CSV file.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the operator cache.")
+    args = parser.parse_args(argv)
+
+    estimator = OnlineLoadEstimator.from_sensitivity_matrix(args.matrix, use_cache=not args.no_cache)
+    print(f"Reconstruction operator: {estimator.n_gauges} gauges -> {estimator.n_loads} loads")
+
+    if args.replay:
+        source = replay_source(args.replay, args.block_size, args.speed)
+    elif args.tail:
+        source = tail_source(args.tail, idle_timeout=args.idle_timeout)
+    else:
+        host, port = args.socket.rsplit(":", 1)
+        source = socket_source(host, int(port))
+
+    start = time.perf_counter()
+    n_samples = run_online_estimation(estimator, source, args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Processed {n_samples} samples in {elapsed:.2f} s; "
+          f"reconstruction {estimator.latency_us_per_sample:.2f} us/sample.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+# endregion
@@ -0,0 +1,117 @@
+# Strain Sensitivity Matrix Assembler
+
+"""
+Builds the strain sensitivity matrix [A] ("strain_sensitivity_matrix.csv") from the unit load results exported
+by get_strain_sensitivity_matrix_from_unit_load_cases_in_mechanical_v0.py ("unit_load_results_export.csv").
+
+The export holds one row per SG result object, unit load case and state:
+    Load Case   - index of the unit load analysis environment (top to bottom in the Mechanical tree)
+    Environment - name of the analysis environment
+    Result      - name of the StrainX_SG result object
+    State       - "initial" (end of the initial load step: bolt preload, shrink/rabbet fits etc.)
+                  or "unit" (end of the unit load step)
+    Time [s]    - display time of the result
+    Average     - average strain of the result object
+
+Column j of [A] is the response of every strain gauge to unit load case j: the unit state strains minus the
+initial state strains (when the initial state is exported). Within each load case, the gauges keep the order of
+their result objects in the tree, which must be the same in every load case, as in the strain files written by
+the "SG Strain" command.
+
+Usage:
+    python strain_sensitivity_matrix_assembler.py unit_load_results_export.csv
+    python strain_sensitivity_matrix_assembler.py unit_load_results_export.csv --output strain_sensitivity_matrix.csv
+"""
+
+# region Import necessary libraries
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+# endregion
+
+EXPORT_COLUMNS = ['Load Case', 'Environment', 'Result', 'State', 'Time [s]', 'Average']
+
+
+# region Assemble the matrix
+def read_unit_load_export(export_file_path):
+    export_df = pd.read_csv(export_file_path, float_precision="round_trip")
+    missing = [column for column in EXPORT_COLUMNS if column not in export_df.columns]
+    if missing:
+        raise ValueError(f"{export_file_path} is not a unit load results export (missing columns: {missing}).")
+    return export_df
+
+
+def _state_matrix(export_df, state):
+    # (n_gauges x n_load_cases) matrix of one state, gauges in the order of their result objects
+    state_df = export_df[export_df['State'] == state]
+    if state_df.empty:
+        return None, None
+    state_df = state_df.assign(Gauge=state_df.groupby('Load Case').cumcount())
+
+    counts = state_df.groupby('Load Case').size()
+    if counts.min() != counts.max():
+        raise ValueError(f"The number of extracted values are different for the {state} load results of each unit "
+                         f"load case ({dict(counts)}). Please check whether all the analyses have the same number "
+                         f"of SGs with name StrainX_SG and they are all evaluated and their results are correct.")
+
+    matrix = state_df.pivot(index='Gauge', columns='Load Case', values='Average').sort_index(axis=1)
+    names = state_df.pivot(index='Gauge', columns='Load Case', values='Result').sort_index(axis=1)
+    return matrix, names
+
+
+def assemble_strain_sensitivity_matrix(export_df):
+    """
+    Returns:
+        tuple: (A_matrix (n_gauges x n_load_cases), gauge names, load case names)
+    """
+    unit, names = _state_matrix(export_df, 'unit')
+    if unit is None:
+        raise ValueError("The export contains no unit load results.")
+    initial, _ = _state_matrix(export_df, 'initial')
+
+    # The same result object must sit at the same position in every load case
+    mismatched = (names.values != names.values[:, :1]).any(axis=1)
+    if mismatched.any():
+        print(f"Warning: {int(mismatched.sum())} gauge position(s) have different result names across the load "
+              f"cases, e.g. {list(names.values[np.flatnonzero(mismatched)[0]])}. Rows are matched by position.")
+
+    A_matrix = unit.values.astype(np.float64)
+    if initial is not None:
+        if initial.shape != unit.shape or not initial.columns.equals(unit.columns):
+            raise ValueError("The initial and unit load results do not cover the same gauges and load cases.")
+        # Subtract the effect of the initial strains from the unit load results
+        A_matrix = A_matrix - initial.values.astype(np.float64)
+
+    environments = export_df.drop_duplicates('Load Case').set_index('Load Case')['Environment']
+    return A_matrix, list(names.iloc[:, 0]), [environments[case] for case in unit.columns]
+
+
+def write_strain_sensitivity_matrix(A_matrix, csv_file_path):
+    # Same layout as before: one row per gauge, one column per unit load case, no header
+    np.savetxt(csv_file_path, A_matrix, delimiter=",", fmt="%.17g")
+# endregion
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build strain_sensitivity_matrix.csv from exported unit load results.")
+    parser.add_argument("export", help="unit_load_results_export.csv written by the Mechanical exporter")
+    parser.add_argument("--output", default=None,
+                        help="Matrix file (default: strain_sensitivity_matrix.csv next to the export).")
+    args = parser.parse_args(argv)
+
+    output_file_path = args.output or os.path.join(os.path.dirname(os.path.abspath(args.export)),
+                                                   'strain_sensitivity_matrix.csv')
+    A_matrix, gauge_names, load_cases = assemble_strain_sensitivity_matrix(read_unit_load_export(args.export))
+    write_strain_sensitivity_matrix(A_matrix, output_file_path)
+
+    print(f"Strain sensitivity matrix [A]: {len(gauge_names)} gauges x {len(load_cases)} unit load cases")
+    print("Load cases: " + ", ".join(load_cases))
+    print("Saved at: " + output_file_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())